@@ -0,0 +1,134 @@
+"""
+Batch conversion of whole model directories.
+
+Usage (from the repository root):
+    python -m main_code_function.batch_convert CPN_models --output batch_results.jsonl --workers 8
+"""
+import argparse
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+from main_code_function.functions_for_parsing import collect_all_data, load_cpn_file, get_page_block, get_globbox_block
+from main_code_function.snakes_engine_main import create_snakes_net, create_colset_functions
+
+
+def find_cpn_files(directory):
+    """
+    Returns all .cpn files below the directory, sorted for a stable order.
+    Raises NotADirectoryError when directory does not exist (os.walk would yield nothing).
+    """
+    if not os.path.isdir(directory):
+        raise NotADirectoryError(f"Model directory not found: {directory}")
+    cpn_files = []
+    for dir_path, _, file_names in os.walk(directory):
+        for file_name in file_names:
+            if file_name.lower().endswith('.cpn'):
+                cpn_files.append(os.path.join(dir_path, file_name))
+    return sorted(cpn_files)
+
+
+def convert_model_file(file_path):
+    """
+    Runs one model through the whole pipeline and returns a JSON-serializable record.
+    Errors are caught and reported in the record, so one broken model does not stop the batch.
+    """
+    record = {'file': file_path, 'ok': False, 'error': None, 'stage': None, 'timings': {}}
+    started = time.perf_counter()
+    stage_started = started
+
+    def finish_stage(name):
+        nonlocal stage_started
+        now = time.perf_counter()
+        record['timings'][name] = round(now - stage_started, 6)
+        stage_started = now
+
+    try:
+        record['stage'] = 'load_cpn_file'
+        root = load_cpn_file(file_path)
+        finish_stage('load_cpn_file')
+
+        record['stage'] = 'collect_all_data'
+        data = collect_all_data(get_page_block(root), get_globbox_block(root))
+        finish_stage('collect_all_data')
+
+        record['stage'] = 'create_colset_functions'
+        colset_functions = create_colset_functions(data["colsets"])
+        finish_stage('create_colset_functions')
+
+        record['stage'] = 'create_snakes_net'
+        net, places_info, variables = create_snakes_net(data, colset_functions)
+        finish_stage('create_snakes_net')
+
+        record['stage'] = None
+        record['ok'] = True
+        record['places'] = len(places_info)
+        record['transitions'] = len(list(net.transition()))
+        record['variables'] = len(variables)
+    except Exception as e:
+        record['error'] = f"{type(e).__name__}: {e}"
+        record['traceback'] = traceback.format_exc()
+
+    record['seconds'] = round(time.perf_counter() - started, 6)
+    return record
+
+
+def summarize(records, wall_seconds, slowest=10):
+    """
+    Builds the throughput summary of a finished batch.
+    """
+    converted = sum(1 for record in records if record['ok'])
+    return {
+        'models': len(records),
+        'converted': converted,
+        'failed': len(records) - converted,
+        'wall_seconds': round(wall_seconds, 3),
+        'models_per_second': round(len(records) / wall_seconds, 3) if wall_seconds > 0 else None,
+        'slowest': [
+            {'file': record['file'], 'seconds': record['seconds']}
+            for record in sorted(records, key=lambda record: record['seconds'], reverse=True)[:slowest]
+        ],
+    }
+
+
+def batch_convert(directory, output_path, workers=None, chunksize=4, slowest=10):
+    """
+    Converts every .cpn file below directory across a process pool.
+    Writes one JSON line per model to output_path and returns the summary.
+    """
+    cpn_files = find_cpn_files(directory)
+    records = []
+    started = time.perf_counter()
+    with open(output_path, 'w', encoding='utf-8') as output, ProcessPoolExecutor(max_workers=workers) as pool:
+        for record in pool.map(convert_model_file, cpn_files, chunksize=chunksize):
+            output.write(json.dumps(record, ensure_ascii=False) + '\n')
+            records.append(record)
+    return summarize(records, time.perf_counter() - started, slowest)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert every .cpn model in a directory tree to SNAKES nets.")
+    parser.add_argument('directory', help="Directory searched recursively for .cpn files")
+    parser.add_argument('--output', default='batch_results.jsonl', help="Per-model result/error records (JSON lines)")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes (default: CPU count)")
+    parser.add_argument('--chunksize', type=int, default=4, help="Models handed to a worker at once")
+    parser.add_argument('--slowest', type=int, default=10, help="How many of the slowest models to report")
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.directory):
+        parser.error(f"directory not found: {args.directory}")
+
+    summary = batch_convert(args.directory, args.output, args.workers, args.chunksize, args.slowest)
+
+    print(f"Converted {summary['converted']}/{summary['models']} models "
+          f"in {summary['wall_seconds']} s ({summary['models_per_second']} models/sec), "
+          f"{summary['failed']} failed. Records written to {args.output}")
+    print("Slowest models:")
+    for entry in summary['slowest']:
+        print(f"  {entry['seconds']:.4f} s  {entry['file']}")
+    return summary
+
+
+if __name__ == "__main__":
+    main()
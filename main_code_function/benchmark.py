@@ -0,0 +1,255 @@
+"""
+Benchmarks of the bundled models.
+
+Every .cpn file below a directory (CPN_models by default) is run through the workloads
+    parse        stream_all_data (the cache is bypassed)
+    build        create_colset_functions + create_snakes_net
+    simulate     --steps seeded random steps from the initial marking
+    state_space  breadth-first exploration up to --max-states states
+with warm-up runs and repeated trials. Wall times are reported per trial together
+with steps/sec or states/sec; the peak of traced memory is measured in one extra
+run, so tracing does not slow down the timed trials. A model failing in one stage
+is reported with the error, and its later stages are skipped.
+
+The results (including the Python, SNAKES and git versions) are written as JSON; a
+previous result file can be compared against with --compare.
+
+Usage (from the repository root):
+    python -m main_code_function.benchmark CPN_models --steps 1000 --trials 5 --output benchmark.json
+    python -m main_code_function.benchmark CPN_models --compare benchmark.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import snakes
+
+from main_code_function.batch_convert import find_cpn_files
+from main_code_function.functions_for_parsing import stream_all_data
+from main_code_function.simulator import Simulator
+from main_code_function.snakes_engine_main import (
+    CONVERTER_VERSION, create_colset_functions, create_snakes_net, multiset_counts, multiset_from_counts
+)
+from main_code_function.state_space import explore
+
+WORKLOADS = ("parse", "build", "simulate", "state_space")
+
+
+def measure(function, setup=None, trials=5, warmup=1, memory=True):
+    """
+    Calls function(setup()) warmup times untimed, then trials times timed (setup is
+    never timed). Returns the statistics of the trial times, the result of the last
+    call and, with memory=True, the peak of traced memory of one more call.
+    """
+    def call(timed):
+        argument = setup() if setup is not None else None
+        gc.collect()
+        if not timed:
+            return function(argument), None
+        started = time.perf_counter()
+        result = function(argument)
+        return result, time.perf_counter() - started
+
+    for _ in range(warmup):
+        call(False)
+    times = []
+    result = None
+    for _ in range(trials):
+        result, seconds = call(True)
+        times.append(seconds)
+
+    record = {
+        'times': [round(seconds, 6) for seconds in times],
+        'min': min(times),
+        'median': statistics.median(times),
+        'mean': statistics.fmean(times),
+        'stdev': statistics.stdev(times) if len(times) > 1 else 0.0,
+    }
+    if memory:
+        argument = setup() if setup is not None else None
+        gc.collect()
+        tracemalloc.start()
+        try:
+            function(argument)
+            record['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return record, result
+
+
+def benchmark_model(file_path, workloads=WORKLOADS, steps=1000, max_states=10000, trials=5, warmup=1, seed=0,
+                    compiled=False, memory=True):
+    """
+    Runs the workloads on one model and returns a JSON-serializable record.
+    """
+    record = {'file': file_path, 'ok': False, 'error': None, 'stage': None, 'workloads': {}}
+    results = record['workloads']
+    try:
+        # Parsing and building also run (once, untimed) when they are not benchmarked
+        record['stage'] = 'parse'
+        if 'parse' in workloads:
+            results['parse'], data = measure(lambda _: stream_all_data(file_path), None, trials, warmup, memory)
+        else:
+            data = stream_all_data(file_path)
+
+        record['stage'] = 'build'
+
+        def build(_):
+            return create_snakes_net(data, create_colset_functions(data["colsets"]), compiled=compiled)
+
+        if 'build' in workloads:
+            results['build'], (net, places_info, _) = measure(build, None, trials, warmup, memory)
+        else:
+            net, places_info, _ = build(None)
+        record['places'] = len(places_info)
+        record['transitions'] = len(list(net.transition()))
+
+        initial = {place.name: multiset_counts(place.tokens) for place in net.place()}
+
+        if 'simulate' in workloads:
+            record['stage'] = 'simulate'
+
+            def new_simulator():
+                for place in net.place():
+                    place.tokens = multiset_from_counts(initial[place.name])
+                return Simulator(net, random.Random(seed))
+
+            result, performed = measure(lambda simulator: simulator.run(steps), new_simulator, trials, warmup, memory)
+            result['steps'] = performed
+            result['steps_per_second'] = performed / result['median'] if result['median'] > 0 else None
+            results['simulate'] = result
+            for place in net.place():
+                place.tokens = multiset_from_counts(initial[place.name])
+
+        if 'state_space' in workloads:
+            record['stage'] = 'state_space'
+            result, space = measure(lambda _: explore(net, max_states=max_states), trials=trials, warmup=warmup,
+                                    memory=memory)
+            result.update(space.statistics())
+            result['states_per_second'] = space.num_states / result['median'] if result['median'] > 0 else None
+            results['state_space'] = result
+
+        record['stage'] = None
+        record['ok'] = True
+    except Exception as e:
+        record['error'] = f"{type(e).__name__}: {e}"
+    return record
+
+
+def environment():
+    """
+    Versions the results depend on.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'python': sys.version.split()[0],
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'snakes': getattr(snakes, 'version', None),
+        'converter_version': CONVERTER_VERSION,
+        'commit': commit,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def run_benchmarks(directory, workloads=WORKLOADS, steps=1000, max_states=10000, trials=5, warmup=1, seed=0,
+                   compiled=False, memory=True, on_record=None):
+    """
+    Benchmarks every .cpn file below directory, one after the other.
+    on_record(record) is called after each model. Returns the result document.
+    """
+    settings = {'workloads': list(workloads), 'steps': steps, 'max_states': max_states, 'trials': trials,
+                'warmup': warmup, 'seed': seed, 'compiled': compiled}
+    records = []
+    for file_path in find_cpn_files(directory):
+        record = benchmark_model(file_path, workloads, steps, max_states, trials, warmup, seed, compiled, memory)
+        if on_record is not None:
+            on_record(record)
+        records.append(record)
+    return {'environment': environment(), 'settings': settings, 'models': records}
+
+
+def compare(results, baseline, tolerance=0.05):
+    """
+    Ratios of the median times of results to those of baseline, per model and workload:
+    [(file, workload, baseline median, median, ratio, verdict)].
+    """
+    previous = {record['file']: record['workloads'] for record in baseline['models']}
+    rows = []
+    for record in results['models']:
+        for workload, result in record['workloads'].items():
+            old = previous.get(record['file'], {}).get(workload)
+            if old is None or not old['median']:
+                continue
+            ratio = result['median'] / old['median']
+            verdict = 'slower' if ratio > 1 + tolerance else 'faster' if ratio < 1 - tolerance else 'same'
+            rows.append((record['file'], workload, old['median'], result['median'], ratio, verdict))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark parsing, conversion, simulation and state-space exploration.")
+    parser.add_argument('directory', nargs='?', default='CPN_models', help="Directory searched recursively for .cpn files")
+    parser.add_argument('--workloads', nargs='+', choices=WORKLOADS, default=list(WORKLOADS), help="Workloads to run")
+    parser.add_argument('--steps', type=int, default=1000, help="Simulation steps per trial")
+    parser.add_argument('--max-states', type=int, default=10000, help="State limit of the exploration")
+    parser.add_argument('--trials', type=int, default=5, help="Timed trials per workload")
+    parser.add_argument('--warmup', type=int, default=1, help="Untimed runs before the trials")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the simulations")
+    parser.add_argument('--compiled', action='store_true', help="Compile guards and arc expressions")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the peak memory measurement")
+    parser.add_argument('--output', default='benchmark.json', help="Result file (JSON)")
+    parser.add_argument('--compare', default=None, metavar="BASELINE", help="Previous result file to compare with")
+    parser.add_argument('--tolerance', type=float, default=0.05, help="Relative change reported as same")
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.directory):
+        parser.error(f"directory not found: {args.directory}")
+
+    def report(record):
+        for workload, result in record['workloads'].items():
+            rate = ""
+            if 'steps_per_second' in result:
+                rate = f", {result['steps']} steps, {result['steps_per_second']:.0f} steps/sec"
+            elif 'states_per_second' in result:
+                rate = f", {result['states']} states, {result['states_per_second']:.0f} states/sec"
+            memory = f", peak {result['peak_bytes'] / 1e6:.1f} MB" if 'peak_bytes' in result else ""
+            print(f"{record['file']}: {workload} median {result['median'] * 1000:.2f} ms "
+                  f"(min {result['min'] * 1000:.2f}, stdev {result['stdev'] * 1000:.2f}){rate}{memory}")
+        if not record['ok']:
+            print(f"{record['file']}: failed in {record['stage']} ({record['error']})")
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    results = run_benchmarks(args.directory, args.workloads, args.steps, args.max_states, args.trials, args.warmup,
+                             args.seed, args.compiled, not args.no_memory, report)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"Results written to {args.output}")
+
+    if baseline is not None:
+        settings = baseline.get('settings', {})
+        changed = [key for key, value in results['settings'].items() if key != 'workloads' and settings.get(key) != value]
+        if changed:
+            print(f"Warning: settings differ from the baseline ({', '.join(changed)})")
+        print(f"Compared with {args.compare}:")
+        for file_path, workload, old, new, ratio, verdict in compare(results, baseline, args.tolerance):
+            print(f"  {ratio:6.2f}x {verdict:>6}  {workload:<12} {old * 1000:10.2f} -> {new * 1000:10.2f} ms  {file_path}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+"""
+Distributed state-space exploration over TCP.
+
+A coordinator accepts a fixed number of workers, sends them the model and the
+addresses of all other workers, and then drives the same level-synchronous BFS as
+parallel_state_space.py. Every worker builds the net itself with create_snakes_net,
+owns the markings with crc32(marking) % workers == its number, and sends successors
+straight to their owners over worker-to-worker connections, in zlib-compressed batches.
+
+Every message is a frame: 4-byte big-endian payload length, 1-byte kind, payload.
+Control payloads are JSON, batches are length-prefixed markings compressed with zlib.
+
+Usage:
+    python -m main_code_function.distributed_state_space coordinator MODEL.cpn --workers 3 --port 5555
+    python -m main_code_function.distributed_state_space worker --host COORDINATOR --port 5555
+    python -m main_code_function.distributed_state_space local MODEL.cpn --workers 3
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import socket
+import struct
+import tempfile
+import threading
+import time
+import traceback
+import zlib
+
+from main_code_function.functions_for_parsing import stream_all_data
+from main_code_function.parallel_state_space import DEFAULT_BATCH_SIZE, expand_frontier, owner
+from main_code_function.snakes_engine_main import create_colset_functions, create_snakes_net
+from main_code_function.state_space import MarkingCodec, SuccessorGenerator, decode_varint, encode_varint
+
+FRAME_HEADER = struct.Struct(">IB")
+
+HELLO = 1      # worker -> coordinator: address of the worker's data listener
+CONFIG = 2     # coordinator -> worker: number, peers and options
+MODEL = 3      # coordinator -> worker: compressed .cpn file
+READY = 4      # worker -> coordinator: connected to all peers
+EXPAND = 5     # coordinator -> worker: expand the frontier
+EXPANDED = 6   # worker -> coordinator: batches sent per worker, edges, dead markings
+RECEIVE = 7    # coordinator -> worker: number of batches to receive
+RECEIVED = 8   # worker -> coordinator: new frontier size, states owned
+BATCH = 9      # any -> worker: compressed markings
+STOP = 10      # coordinator -> worker: exploration finished
+ERROR = 11     # worker -> coordinator: traceback of the exception that ended the worker
+
+
+def send_frame(sock, kind, payload=b""):
+    sock.sendall(FRAME_HEADER.pack(len(payload), kind) + payload)
+
+
+def recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("Connection closed in the middle of a frame.")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def recv_frame(sock):
+    """
+    Returns (kind, payload), or (None, None) when the peer closed the connection.
+    """
+    header = b""
+    while len(header) < FRAME_HEADER.size:
+        chunk = sock.recv(FRAME_HEADER.size - len(header))
+        if not chunk:
+            if header:
+                raise ConnectionError("Connection closed in the middle of a frame header.")
+            return None, None
+        header += chunk
+    size, kind = FRAME_HEADER.unpack(header)
+    return kind, recv_exact(sock, size)
+
+
+def send_json(sock, kind, message):
+    send_frame(sock, kind, json.dumps(message).encode("utf-8"))
+
+
+def recv_json(sock, expected_kind):
+    kind, payload = recv_frame(sock)
+    if kind == ERROR:
+        raise RuntimeError(f"Worker {peer_name(sock)} failed:\n{payload.decode('utf-8')}")
+    if kind != expected_kind:
+        raise ConnectionError(f"Expected message {expected_kind}, got {kind}.")
+    return json.loads(payload)
+
+
+def peer_name(sock):
+    try:
+        host, port = sock.getpeername()[:2]
+        return f"{host}:{port}"
+    except OSError:
+        return "(disconnected)"
+
+
+def encode_batch(markings):
+    out = bytearray()
+    for marking in markings:
+        encode_varint(len(marking), out)
+        out += marking
+    return zlib.compress(bytes(out), 1)
+
+
+def decode_batch(payload):
+    data = zlib.decompress(payload)
+    markings = []
+    offset = 0
+    while offset < len(data):
+        length, offset = decode_varint(data, offset)
+        markings.append(data[offset:offset + length])
+        offset += length
+    return markings
+
+
+def build_net(model, load_options):
+    """
+    Builds the net of a .cpn file received as bytes, through create_snakes_net.
+    """
+    with tempfile.NamedTemporaryFile(suffix=".cpn", delete=False) as f:
+        f.write(model)
+        path = f.name
+    try:
+        data = stream_all_data(path)
+    finally:
+        os.remove(path)
+    net, _, _ = create_snakes_net(data, create_colset_functions(data["colsets"]), **load_options)
+    return net
+
+
+def run_worker(coordinator_host, coordinator_port, data_host="127.0.0.1"):
+    """
+    Worker: connects to the coordinator and serves until it sends STOP.
+    """
+    inbox = queue.Queue()
+    listener = socket.create_server((data_host, 0))
+
+    def read_batches(connection):
+        with connection:
+            while True:
+                kind, payload = recv_frame(connection)
+                if kind is None:
+                    return
+                inbox.put(decode_batch(payload))
+
+    def accept_peers():
+        while True:
+            try:
+                connection, _ = listener.accept()
+            except OSError:
+                return  # Listener closed on shutdown
+            threading.Thread(target=read_batches, args=(connection,), daemon=True).start()
+
+    threading.Thread(target=accept_peers, daemon=True).start()
+
+    control = socket.create_connection((coordinator_host, coordinator_port))
+    peers = {}
+    try:
+        send_json(control, HELLO, {'host': data_host, 'port': listener.getsockname()[1]})
+        config = recv_json(control, CONFIG)
+        kind, model = recv_frame(control)
+        if kind != MODEL:
+            raise ConnectionError(f"Expected the model, got message {kind}.")
+        number, workers = config['number'], config['workers']
+        generator = SuccessorGenerator(build_net(zlib.decompress(model), config['load_options']))
+
+        for peer, (host, port) in enumerate(config['peers']):
+            if peer != number:
+                peers[peer] = socket.create_connection((host, port))
+        send_json(control, READY, {})
+
+        def send(destination, batch):
+            if destination == number:
+                inbox.put(batch)
+            else:
+                send_frame(peers[destination], BATCH, encode_batch(batch))
+
+        seen = set()
+        frontier = []
+        while True:
+            kind, payload = recv_frame(control)
+            if kind is None or kind == STOP:
+                break
+            if kind == BATCH:
+                inbox.put(decode_batch(payload))
+            elif kind == EXPAND:
+                sent, edges, deadlocks = expand_frontier(generator, frontier, workers, config['batch_size'], send)
+                frontier = []
+                send_json(control, EXPANDED, {'sent': sent, 'edges': edges, 'deadlocks': deadlocks})
+            elif kind == RECEIVE:
+                for _ in range(json.loads(payload)['expected']):
+                    for marking in inbox.get():
+                        if marking not in seen:
+                            seen.add(marking)
+                            frontier.append(marking)
+                send_json(control, RECEIVED, {'frontier': len(frontier), 'states': len(seen)})
+    except Exception:
+        # The coordinator raises the traceback instead of a framing error
+        try:
+            send_frame(control, ERROR, traceback.format_exc().encode('utf-8'))
+        except OSError:
+            pass
+        raise
+    finally:
+        for connection in peers.values():
+            connection.close()
+        control.close()
+        listener.close()
+
+
+class Coordinator:
+    """
+    Accepts workers on (host, port); port 0 picks a free port, see self.address.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.server = socket.create_server((host, port))
+        self.address = self.server.getsockname()[:2]
+
+    def close(self):
+        self.server.close()
+
+    def run(self, file_path, workers, load_options=None, max_states=None, progress=None, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Waits for the workers and explores the model. Returns the same statistics
+        as parallel_state_space.explore_parallel().
+        """
+        load_options = load_options or {}
+        with open(file_path, "rb") as f:
+            model = f.read()
+
+        connections = []
+        try:
+            peers = []
+            for _ in range(workers):
+                connection, _ = self.server.accept()
+                connections.append(connection)
+                hello = recv_json(connection, HELLO)
+                peers.append((hello['host'], hello['port']))
+
+            compressed_model = zlib.compress(model)
+            for number, connection in enumerate(connections):
+                send_json(connection, CONFIG, {'number': number, 'workers': workers, 'peers': peers,
+                                               'load_options': load_options, 'batch_size': batch_size})
+                send_frame(connection, MODEL, compressed_model)
+            for connection in connections:
+                recv_json(connection, READY)
+
+            net = build_net(model, load_options)
+            initial = MarkingCodec(net).encode(net)
+            send_frame(connections[owner(initial, workers)], BATCH, encode_batch([initial]))
+            expected = [0] * workers
+            expected[owner(initial, workers)] = 1
+
+            states = edges = deadlocks = levels = 0
+            complete = True
+            while True:
+                for number, connection in enumerate(connections):
+                    send_json(connection, RECEIVE, {'expected': expected[number]})
+                received = [recv_json(connection, RECEIVED) for connection in connections]
+                frontier = sum(reply['frontier'] for reply in received)
+                states = sum(reply['states'] for reply in received)
+                if progress is not None:
+                    progress(states, edges, frontier)
+                if not frontier:
+                    break
+                if max_states is not None and states >= max_states:
+                    complete = False
+                    break
+
+                for connection in connections:
+                    send_frame(connection, EXPAND)
+                expanded = [recv_json(connection, EXPANDED) for connection in connections]
+                expected = [sum(reply['sent'][number] for reply in expanded) for number in range(workers)]
+                edges += sum(reply['edges'] for reply in expanded)
+                deadlocks += sum(reply['deadlocks'] for reply in expanded)
+                levels += 1
+        finally:
+            for connection in connections:
+                try:
+                    send_frame(connection, STOP)
+                except OSError:
+                    pass
+                connection.close()
+
+        return {'states': states, 'edges': edges, 'deadlocks': deadlocks, 'complete': complete, 'levels': levels}
+
+
+def explore_local(file_path, workers=2, load_options=None, max_states=None, progress=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Runs a coordinator and workers on localhost, mainly for testing the distributed mode.
+    """
+    coordinator = Coordinator()
+    context = multiprocessing.get_context()
+    processes = [context.Process(target=run_worker, args=coordinator.address, daemon=True) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    failed = True
+    try:
+        statistics = coordinator.run(file_path, workers, load_options, max_states, progress, batch_size)
+        failed = False
+        return statistics
+    finally:
+        for process in processes:
+            if failed:
+                process.terminate()  # Others may wait for batches of the failed worker
+            process.join()
+        coordinator.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Distributed state-space exploration of a .cpn model.")
+    subparsers = parser.add_subparsers(dest='role', required=True)
+
+    coordinator_parser = subparsers.add_parser('coordinator', help="Distribute the model and drive the exploration")
+    local_parser = subparsers.add_parser('local', help="Coordinator and workers on this machine")
+    for role_parser in (coordinator_parser, local_parser):
+        role_parser.add_argument('model', help="Path to the .cpn file")
+        role_parser.add_argument('--workers', type=int, required=True, help="Number of workers")
+        role_parser.add_argument('--max-states', type=int, default=None, help="Stop after the level reaching this many states")
+        role_parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Markings per batch")
+        role_parser.add_argument('--remove-names', action='store_true', help="Drop the auxiliary 'Names' place")
+    coordinator_parser.add_argument('--host', default="0.0.0.0", help="Interface to listen on")
+    coordinator_parser.add_argument('--port', type=int, default=5555, help="Port to listen on")
+
+    worker_parser = subparsers.add_parser('worker', help="Serve one hash partition")
+    worker_parser.add_argument('--host', required=True, help="Coordinator host")
+    worker_parser.add_argument('--port', type=int, default=5555, help="Coordinator port")
+    worker_parser.add_argument('--data-host', default=socket.gethostname(), help="Address other workers connect to")
+    args = parser.parse_args(argv)
+
+    if args.role == 'worker':
+        run_worker(args.host, args.port, args.data_host)
+        return None
+
+    started = time.perf_counter()
+
+    def report(states, edges, frontier):
+        print(f"  {states} states, {edges} edges, {frontier} waiting ({time.perf_counter() - started:.1f} s)")
+
+    load_options = {"remove_names": args.remove_names}
+    if args.role == 'local':
+        statistics = explore_local(args.model, args.workers, load_options, args.max_states, report, args.batch_size)
+    else:
+        coordinator = Coordinator(args.host, args.port)
+        print(f"Waiting for {args.workers} workers on {args.host}:{args.port}...")
+        try:
+            statistics = coordinator.run(args.model, args.workers, load_options, args.max_states, report, args.batch_size)
+        finally:
+            coordinator.close()
+    print(f"{statistics['states']} states, {statistics['edges']} edges, {statistics['deadlocks']} dead markings "
+          f"in {time.perf_counter() - started:.2f} s" + ("" if statistics['complete'] else " (limit reached, incomplete)"))
+    return statistics
+
+
+if __name__ == "__main__":
+    main()
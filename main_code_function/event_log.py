@@ -0,0 +1,172 @@
+"""
+Structured, non-blocking simulation logging.
+
+Simulation events go through the standard logging module with %-style arguments, so
+nothing is formatted when their level is disabled. Each event record also carries its
+name and fields (record.event, record.fields), which can be written as JSON lines.
+
+start_log_writer() connects a logger to a queue: the simulation thread only puts the
+unformatted records into it, and a background thread formats them and writes them in
+batches (one write and flush per batch and output) to a log file and, optionally, to
+the console. Since records are formatted later, logged arguments must not be changed
+after the call (log copies of markings, not the live MultiSets).
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+
+TEXT_FORMAT = '%(asctime)s - %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def log_event(logger, level, event, message, *args, **fields):
+    """
+    Logs a structured event if level is enabled: message % args is only formatted by
+    the handlers, fields are attached to the record for JSON output.
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, message, *args, extra={"event": event, "fields": fields})
+
+
+def plain(value):
+    """
+    JSON-ready form of an event field (bindings and multisets become dicts, tuples lists,
+    other objects their repr).
+    """
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if hasattr(value, "items"):
+        return {str(key): plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [plain(item) for item in value]
+    return repr(value)
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per record: time, level, event, message and the event fields.
+    """
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "event": getattr(record, "event", None),
+            "message": record.getMessage(),
+        }
+        entry.update(plain(getattr(record, "fields", None) or {}))
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves formatting to the writer thread (the queue never leaves
+    the process, so records do not have to be made picklable).
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class BatchWriter:
+    """
+    Background thread writing queued records to a list of (stream, formatter) outputs.
+    Whatever is waiting in the queue (up to batch_size records) is written at once.
+    """
+
+    _STOP = object()
+
+    def __init__(self, outputs, batch_size=512):
+        self.outputs = outputs
+        self.batch_size = batch_size
+        self.queue = queue.SimpleQueue()
+        self.written = 0
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._stopped = False
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            records = [item for item in batch if isinstance(item, logging.LogRecord)]
+            if records:
+                self._write(records)
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()  # flush() marker: everything queued before it is written
+            if any(item is self._STOP for item in batch):
+                return
+
+    def _write(self, records):
+        for stream, formatter in self.outputs:
+            lines = []
+            for record in records:
+                try:
+                    lines.append(formatter.format(record))
+                except Exception as e:
+                    lines.append(f"<unformattable log record {record.msg!r}: {e}>")
+            try:
+                stream.write("\n".join(lines) + "\n")
+                stream.flush()
+            except (OSError, ValueError):
+                pass  # Closed console or file, the simulation goes on
+        self.written += len(records)
+
+    def flush(self, timeout=None):
+        """
+        Waits until every record queued so far has been written (e.g. before input()).
+        """
+        if self._stopped:
+            return
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait(timeout)
+
+    def stop(self):
+        """
+        Writes the remaining records, ends the thread and closes the owned files.
+        """
+        if self._stopped:
+            return
+        self._stopped = True
+        self.queue.put(self._STOP)
+        self._thread.join()
+        for stream, _ in self.outputs:
+            if stream not in (sys.stdout, sys.stderr):
+                stream.close()
+
+
+def start_log_writer(logger, path=None, console=True, json_lines=False, batch_size=512, fmt=TEXT_FORMAT,
+                     datefmt=DATE_FORMAT):
+    """
+    Replaces the handlers of logger by a queue feeding a BatchWriter that writes to
+    path (overwritten) and, with console=True, to stderr. With json_lines=True the
+    file gets one JSON object per record (the console stays text).
+    The writer is stopped at interpreter exit; call writer.stop() to finish earlier.
+    """
+    text = logging.Formatter(fmt, datefmt)
+    outputs = []
+    if path is not None:
+        outputs.append((open(path, "w", encoding="utf-8"), JsonFormatter(datefmt=datefmt) if json_lines else text))
+    if console:
+        outputs.append((sys.stderr, text))
+
+    writer = BatchWriter(outputs, batch_size).start()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(DeferredQueueHandler(writer.queue))
+    logger.propagate = False
+    atexit.register(writer.stop)
+    return writer
@@ -1,6 +1,7 @@
 import pandas as pd
 from xml.etree import ElementTree as ET
 import re
+from main_code_function.profiling import profiled
 
 def clean(text):
     return re.sub(r'\s+', ' ', text).strip() if text else None
@@ -21,6 +22,7 @@ def find_equal_outside_brackets(s):
     return -1
 
 
+@profiled
 def load_cpn_file(file_path):
     """
     Reads and returns the root element of the XML file.
@@ -35,6 +37,7 @@ def load_cpn_file(file_path):
         raise ValueError("File not found, check path.")  # Error handling if file does not exist
 
 
+@profiled
 def get_page_block(root):
     """
     Finds the <page> block inside <cpnet>.
@@ -50,6 +53,7 @@ def get_page_block(root):
     return page_block
 
 
+@profiled
 def get_globbox_block(root):
     """
     Finds the <globbox> block inside <cpnet>.
@@ -66,275 +70,260 @@ def get_globbox_block(root):
     return globbox_block  # Return found block
 
 
-def get_colsets(globbox_block):
+def child_text(element, path):
     """
-    Get information about colsets from <globbox> block.
+    Returns the raw text of the child found by path, or None (single find() per child).
     """
-    colsets = []  # List initialization for colored sets
-    for color in globbox_block.findall('.//color'):  # Find all elements <color>
-        # Getting color set ID from <color id="..."> attribute
-        colset_id = color.attrib.get('id')  
-
-        # Getting the color set name from the child <id>
-        colset_name = color.find('id').text if color.find('id') is not None else None
-
-        # Getting layout from child <layout>
-        layout_element = color.find('layout')
-        layout_text = clean(layout_element.text) if layout_element is not None else None
-
-        # Determine the type (subtype) based on the first element between <id> and <layout>
-        subtype = None  # Initialize the subtype variable as None
-        subtype_contents = None  # Initializing a list for content
-        index_values = None  # Initialize index_values as None
-
-        for child in color:  # Iteration over all child elements within <color>
-            if child.tag not in ['id', 'layout']:  # Ignore <id> and <layout> elements because they do not specify the type
-                subtype = child.tag  # We use the tag name of the current item as a type (e.g. unit, bool, enum)
-
-                # Special handling for 'index' subtype
-                if subtype == "index":
-                    # Extract <ml> and <id> values
-                    ml_values = [int(ml.text) for ml in child.findall('ml') if ml.text.isdigit()]
-                    id_value = child.find('id').text if child.find('id') is not None else None
-                    index_values = {'idx': ml_values, 'name_of_object': id_value}
-                # If not 'index', gather other contents
-                else:
-                    # If there are <id> elements inside the current child element, we get their content
-                    subtype_contents= [elem.text for elem in child.findall('id') if elem.text]
-                    subtype_contents = subtype_contents if subtype_contents else None  # If the list is empty, set None
-                break  # Break the loop because the type has been found
+    child = element.find(path) if element is not None else None
+    return child.text if child is not None else None
 
-        # Adding color set data to the list
-        colsets.append({
-            'id': colset_id,         # Color set ID, unique identifier for a specific set
-            'name': colset_name,    # Color set name from <id> element
-            'layout': layout_text,   # Text representation of the set from the <layout> element
-            'subtype': subtype,      # Color set type, determined by child elements (e.g. unit, enum, product)
-            'subtype_contents': subtype_contents,     # Content of child elements, e.g. list of values (['A', 'B']) or None if there is no content
-            'index_values': index_values  # Values specific to 'index'
-        })
 
-
-    return colsets  # Return list of color sets
+def parse_colset(color):
+    """
+    Parses one <color> element into a colset dictionary.
+    """
+    # Getting color set ID from <color id="..."> attribute
+    colset_id = color.attrib.get('id')
+
+    # Getting the color set name from the child <id>
+    colset_name = child_text(color, 'id')
+
+    # Getting layout from child <layout>
+    layout_element = color.find('layout')
+    layout_text = clean(layout_element.text) if layout_element is not None else None
+
+    # Determine the type (subtype) based on the first element between <id> and <layout>
+    subtype = None  # Initialize the subtype variable as None
+    subtype_contents = None  # Initializing a list for content
+    index_values = None  # Initialize index_values as None
+    # Timed color sets ("colset T = int timed;") carry an extra <timed/> element
+    timed = color.find('timed') is not None or bool(layout_text and layout_text.rstrip('; ').endswith('timed'))
+
+    for child in color:  # Iteration over all child elements within <color>
+        if child.tag not in ['id', 'layout', 'timed']:  # Ignore <id>, <layout> and <timed>, they do not specify the type
+            subtype = child.tag  # We use the tag name of the current item as a type (e.g. unit, bool, enum)
+
+            # Special handling for 'index' subtype
+            if subtype == "index":
+                # Extract <ml> and <id> values
+                ml_values = [int(ml.text) for ml in child.findall('ml') if ml.text.isdigit()]
+                id_value = child_text(child, 'id')
+                index_values = {'idx': ml_values, 'name_of_object': id_value}
+            # If not 'index', gather other contents
+            else:
+                # If there are <id> elements inside the current child element, we get their content
+                subtype_contents= [elem.text for elem in child.findall('id') if elem.text]
+                subtype_contents = subtype_contents if subtype_contents else None  # If the list is empty, set None
+            break  # Break the loop because the type has been found
+
+    return {
+        'id': colset_id,         # Color set ID, unique identifier for a specific set
+        'name': colset_name,    # Color set name from <id> element
+        'layout': layout_text,   # Text representation of the set from the <layout> element
+        'subtype': subtype,      # Color set type, determined by child elements (e.g. unit, enum, product)
+        'subtype_contents': subtype_contents,     # Content of child elements, e.g. list of values (['A', 'B']) or None if there is no content
+        'index_values': index_values,  # Values specific to 'index'
+        'timed': timed  # Tokens of this color set carry time stamps
+    }
 
 
-def get_values(globbox_block):
+def parse_value(ml):
     """
-    Extracts values defined inside <ml> tags in the <globbox> block.
+    Parses one <ml> element of the form "val name = value;".
+    Returns None if the element is not a value declaration.
     """
-    values = []  # List to store variable values
+    # Get the text inside the <ml> element (for example, "val n = 5;")
+    ml_text = ml.text.strip() if ml.text else None
+
+    # Extract only those lines that match the pattern “val variable_name = value;”
+    if not (ml_text and ml_text.startswith('val') and '=' in ml_text):
+        return None
+
+    try:
+        # Parse the string "val n = 5;" -> variable and value
+        parts = ml_text.split('=')
+        var_name = parts[0].replace('val', '').strip()  # Variable name
+        raw_value = parts[1].replace(';', '')
+        var_value = clean(raw_value)
+    except IndexError:
+        return None  # Skip invalid lines
+
+    #Skip the standard priorities
+    if var_name in ['P_HIGH', 'P_NORMAL', 'P_LOW']:
+        return None
+
+    # Extract <layout> (if it is inside <ml>)
+    layout_element = ml.find('layout')
+    layout_text = clean(layout_element.text) if layout_element is not None else None
+
+    return {
+        'id': ml.attrib.get('id'),  # The 'id' attribute from the <ml> element
+        'name': var_name,
+        'value': var_value,
+        'layout': layout_text,
+    }
+
 
-    for ml in globbox_block.findall('.//ml'):  # Find all <ml> elements
-        # Get the text inside the <ml> element (for example, "val n = 5;")
-        ml_text = ml.text.strip() if ml.text else None
+def parse_function(ml):
+    """
+    Parses one <ml> element of the form "fun name(args) = body;".
+    Returns None if the element is not a function definition.
+    """
+    # Retrieve the text content of the <ml> element (e.g., "fun Chopstick(ph(i)) = ...")
+    ml_text = ml.text.strip() if ml.text else None
 
-        # Retrieve the 'id' attribute from the <ml> element
-        ml_id = ml.attrib.get('id')
+    # Check if the line starts with "fun", indicating a function definition
+    if not (ml_text and ml_text.startswith('fun')):
+        return None
 
-        # Extract only those lines that match the pattern “val variable_name = value;”
-        if ml_text and ml_text.startswith('val') and '=' in ml_text:
-            try:
-                # Parse the string "val n = 5;" -> variable and value
-                parts = ml_text.split('=')
-                var_name = parts[0].replace('val', '').strip()  # Variable name
-                raw_value = parts[1].replace(';', '') 
-                var_value = clean(raw_value)
+    # # Split the text into the function name and function value
+    # # Example: "fun Chopstick(ph(i)) = 1`cs(i) ++ 1`cs(if i = n then 1 else i+1);"
+    function_body = ml_text.replace('fun', '', 1).strip()
 
-                #Skip the standard priorities
-                if var_name in ['P_HIGH', 'P_NORMAL', 'P_LOW']:
-                    continue
+    eq_index = find_equal_outside_brackets(function_body)
+    if eq_index == -1:
+        return None
 
-                # Extract <layout> (if it is inside <ml>)
-                layout_element = ml.find('layout')
-                layout_text = clean(layout_element.text) if layout_element is not None else None
+    name_part = clean(function_body[:eq_index])
+    value_part = clean(function_body[eq_index+1:].rstrip(';'))
 
-                # Append the result to the list
-                values.append({
-                    'id': ml_id,
-                    'name': var_name,
-                    'value': var_value,
-                    'layout': layout_text,
-                })
-            except IndexError:
-                continue  # Skip invalid lines
+    # Retrieve the <layout> element if it exists
+    layout_element = ml.find('layout')
+    layout_text = clean(layout_element.text) if layout_element is not None and layout_element.text else None
 
-    return values
+    return {
+        'id': ml.attrib.get('id'),
+        'name': name_part,    # The name of the function
+        'value': value_part,  # The body of the function
+        'layout': layout_text,           # Layout text if available
+    }
 
 
-def get_vars(globbox_block):
+def parse_var(var):
     """
-    Getting information about variables from the <globbox> block.
+    Parses one <var> element into a variable dictionary.
     """
-    vars = []  # List initialization for variables
-    for var in globbox_block.findall('.//var'):  # Find all <var> elements
-        # Getting variable ID from attribute <var id="...">
-        var_id = var.attrib.get('id')
+    # Getting the variable type from the <type><id>...</id></type> element
+    var_type = child_text(var, 'type/id')
 
-        # Getting the variable type from the <type><id>...</id></type> element
-        type_element = var.find('type')
-        var_type = type_element.find('id').text if type_element is not None and type_element.find('id') is not None else None
+    # Getting variable names from <id> elements
+    var_names = [name.text for name in var.findall('id') if name.text]
 
-        # Getting variable names from <id> elements
-        var_names = [name.text for name in var.findall('id') if name.text]
+    # Getting layout from child <layout>
+    layout_element = var.find('layout')
+    layout_text = clean(layout_element.text) if layout_element is not None else None
 
-        # Getting layout from child <layout>
-        layout_element = var.find('layout')
-        layout_text = clean(layout_element.text) if layout_element is not None else None
+    return {
+        'id': var.attrib.get('id'),  # Variable ID, unique identifier
+        'type': var_type,      # Variable type (e.g. IN)
+        'names': var_names,    # List of variable names
+        'layout': layout_text  # Text representation from <layout> element
+    }
 
-        # Adding variable data to the list
-        vars.append({
-            'id': var_id,          # Variable ID, unique identifier
-            'type': var_type,      # Variable type (e.g. IN)
-            'names': var_names,    # List of variable names
-            'layout': layout_text  # Text representation from <layout> element
-        })
 
-    return vars  # Return list of variables
+def parse_place(place):
+    """
+    Parses one <place> element.
+    """
+    return {
+        'place_id': place.attrib.get('id'),  # Getting a place ID
+        'text': clean(child_text(place, 'text')),
+        'type': child_text(place, 'type/text'),  # Getting the place type
+        'initmark': clean(child_text(place, 'initmark/text'))  # Getting the initial mark
+    }
 
 
-def get_functions(globbox_block):
+def parse_transition(transition):
     """
-    Extracts function definitions from <ml> tags in the <globbox> block.
+    Parses one <trans> element.
     """
-    functions = []  # List to store the extracted function definitions
-
-    for ml in globbox_block.findall('.//ml'):  # Find all <ml> elements in the <globbox> block
-        # Retrieve the text content of the <ml> element (e.g., "fun Chopstick(ph(i)) = ...")
-        ml_text = ml.text.strip() if ml.text else None
-
-        # Retrieve the 'id' attribute from the <ml> element
-        ml_id = ml.attrib.get('id')
-
-        # Check if the line starts with "fun", indicating a function definition
-        if ml_text and ml_text.startswith('fun'):
-            try:
-                # # Split the text into the function name and function value
-                # # Example: "fun Chopstick(ph(i)) = 1`cs(i) ++ 1`cs(if i = n then 1 else i+1);"
-                function_body = ml_text.replace('fun', '', 1).strip()
-
-                eq_index = find_equal_outside_brackets(function_body)
-                if eq_index == -1:
-                    continue  
-
-                name_part = clean(function_body[:eq_index])
-                value_part = clean(function_body[eq_index+1:].rstrip(';'))
-
-                # Retrieve the <layout> element if it exists
-                layout_element = ml.find('layout')
-                layout_text = clean(layout_element.text) if layout_element is not None and layout_element.text else None
-
-                # Append the function information to the list as a dictionary
-                functions.append({
-                    'id': ml_id,
-                    'name': name_part,    # The name of the function
-                    'value': value_part,  # The body of the function
-                    'layout': layout_text,           # Layout text if available
-                })
-            except IndexError:
-                # Skip any invalid <ml> entries that do not match the expected format
-                continue
-
-    return functions  
+    return {
+        'transition_id': transition.attrib.get('id'),  # Getting the transition ID
+        'text': clean(child_text(transition, 'text')),
+        'condition': clean(child_text(transition, 'cond/text')),  # Finding conditions (cond)
+        'time': clean(child_text(transition, 'time/text')),  # Time constraint (time)
+        'code': clean(child_text(transition, 'code/text')),  # Code segment
+        'priority': clean(child_text(transition, 'priority/text'))  # Priority
+    }
 
 
+def parse_arc(arc):
+    """
+    Parses one <arc> element.
+    """
+    # Getting the ID of the transition and the place that the edge connects
+    transend_element = arc.find('transend')
+    placeend_element = arc.find('placeend')
+
+    return {
+        'arc_id': arc.attrib.get('id'),          # Arcs ID
+        'orientation': arc.attrib.get('orientation'),  # Direction (e.g. "PtoT" or "TtoP")
+        'order': arc.attrib.get('order'),            # Arcs order
+        'transend': transend_element.attrib.get('idref') if transend_element is not None else None,  # Transition ID
+        'placeend': placeend_element.attrib.get('idref') if placeend_element is not None else None,  # Place ID
+        'expression': clean(child_text(arc, 'annot/text'))   # Expression (e.g. "1`in2")
+    }
 
 
-def get_places(page_block):
+@profiled
+def get_colsets(globbox_block):
     """
-    Getting information about places (<place>).
+    Get information about colsets from <globbox> block.
     """
-    places = []
-    for place in page_block.findall('place'):
-        place_id = place.attrib.get('id')  # Getting a place ID
-        text = clean(place.find('text').text) if place.find('text') is not None else None
-        type_element = place.find('type')  # Getting the place type
-        place_type = (
-            type_element.find('text').text
-            if type_element is not None and type_element.find('text') is not None
-            else None
-        )
-        initmark_element = place.find('initmark')  # Getting the initial mark
-        initmark_text_element = initmark_element.find('text') if initmark_element is not None else None
-        initmark = clean(initmark_text_element.text) if initmark_text_element is not None else None
+    return [parse_colset(color) for color in globbox_block.findall('.//color')]
 
-        # Adding location data to the list
-        places.append({
-            'place_id': place_id,
-            'text': text,
-            'type': place_type,
-            'initmark': initmark
-        })
-    return places
 
+@profiled
+def get_values(globbox_block):
+    """
+    Extracts values defined inside <ml> tags in the <globbox> block.
+    """
+    values = (parse_value(ml) for ml in globbox_block.findall('.//ml'))
+    return [value for value in values if value is not None]
 
-def get_transitions(page_block):
+
+@profiled
+def get_vars(globbox_block):
     """
-    Get information about transitions (<trans>).
+    Getting information about variables from the <globbox> block.
     """
-    transitions = []
-    for transition in page_block.findall('trans'):
-        transition_id = transition.attrib.get('id')  # Getting the transition ID
-        #text = transition.find('text').text.replace('\n', '') if transition.find('text') is not None else None  # Getting the name of the transition
-        text = clean(transition.find('text').text) if transition.find('text') is not None else None
+    return [parse_var(var) for var in globbox_block.findall('.//var')]
 
-        # Finding conditions (cond)
-        cond_element = transition.find('cond')
-        condition = clean(cond_element.find('text').text) if cond_element is not None and cond_element.find('text') is not None else None
 
-        # Finding the time constraint (time) and its extraction
-        time_element = transition.find('time')
-        time_text = clean(time_element.find('text').text) if time_element is not None and time_element.find('text') is not None else None
+@profiled
+def get_functions(globbox_block):
+    """
+    Extracts function definitions from <ml> tags in the <globbox> block.
+    """
+    functions = (parse_function(ml) for ml in globbox_block.findall('.//ml'))
+    return [function for function in functions if function is not None]
+
 
-        # Finding the code and extracting it
-        code_element = transition.find('code')
-        code_text = clean(code_element.find('text').text) if code_element is not None and code_element.find('text') is not None else None
+@profiled
+def get_places(page_block):
+    """
+    Getting information about places (<place>).
+    """
+    return [parse_place(place) for place in page_block.findall('place')]
 
-        # Finding priority and extracting it
-        priority_element = transition.find('priority')
-        priority_text = clean(priority_element.find('text').text) if priority_element is not None and priority_element.find('text') is not None else None
 
-        # Adding transition dates to the list
-        transitions.append({
-            'transition_id': transition_id,
-            'text': text,
-            'condition': condition,
-            'time': time_text,             
-            'code': code_text,              
-            'priority': priority_text
-        })
-    return transitions
+@profiled
+def get_transitions(page_block):
+    """
+    Get information about transitions (<trans>).
+    """
+    return [parse_transition(transition) for transition in page_block.findall('trans')]
 
 
+@profiled
 def get_arcs(page_block):
     """
     Getting edge information (<arc>).
     """
-    arcs = []
-    for arc in page_block.findall('arc'):
-        arc_id = arc.attrib.get('id')  # Getting arcs ID
-        orientation = arc.attrib.get('orientation')  # Getting arc direction (e.g. "PtoT")
-        order = arc.attrib.get('order')  # Getting the arc order (e.g. "1")
-
-        # Getting the ID of the transition and the place that the edge connects
-        transend = arc.find('transend').attrib.get('idref') if arc.find('transend') is not None else None
-        placeend = arc.find('placeend').attrib.get('idref') if arc.find('placeend') is not None else None
-
-        # Getting the edge expression
-        expression_element = arc.find('annot/text')  # Search for expression annotation
-        expression = clean(expression_element.text) if expression_element is not None else None
-
-        # Adding arc data to the list
-        arcs.append({
-            'arc_id': arc_id,          # Arcs ID
-            'orientation': orientation,  # Direction (e.g. "PtoT" or "TtoP")
-            'order': order,            # Arcs order
-            'transend': transend,      # Transition ID
-            'placeend': placeend,      # Place ID
-            'expression': expression   # Expression (e.g. "1`in2")
-        })
-    return arcs
+    return [parse_arc(arc) for arc in page_block.findall('arc')]
 
 
+@profiled
 def collect_all_data(page_block, globbox_block):
     """
     It collects all data (places, transitions, arcs) and combines them into one dictionary.
@@ -350,3 +339,182 @@ def collect_all_data(page_block, globbox_block):
     }
 
     return parsed_data
+
+
+
+@profiled
+def stream_all_data(file_path):
+    """
+    Single-pass alternative to load_cpn_file + collect_all_data.
+    Parses the file with iterparse, extracts every declaration and net element
+    as soon as it is complete and then drops it, so the whole DOM is never built.
+    Returns the same dictionary as collect_all_data.
+    """
+    parsed_data = {
+        "places": [],
+        "transitions": [],
+        "arcs": [],
+        "colsets": [],
+        "values": [],
+        "variables": [],
+        "functions": []
+    }
+    page_handlers = {
+        'place': (parsed_data["places"], parse_place),
+        'trans': (parsed_data["transitions"], parse_transition),
+        'arc': (parsed_data["arcs"], parse_arc),
+    }
+
+    # Every open element is kept on the stack together with its role:
+    # 'root', 'cpnet', 'globbox' (also nested <block>), 'page' (the first one only),
+    # 'other_page', 'item' (direct child of one of those) or 'inner' (anything deeper).
+    stack = []
+    seen_cpnet = seen_page = seen_globbox = False
+
+    try:
+        for event, element in ET.iterparse(file_path, events=('start', 'end')):
+            if event == 'start':
+                parent_kind = stack[-1][1] if stack else None
+                if parent_kind is None:
+                    kind = 'root'
+                elif parent_kind == 'root' and element.tag == 'cpnet' and not seen_cpnet:
+                    kind, seen_cpnet = 'cpnet', True
+                elif parent_kind == 'cpnet' and element.tag == 'globbox' and not seen_globbox:
+                    kind, seen_globbox = 'globbox', True
+                elif parent_kind == 'globbox' and element.tag == 'block':
+                    kind = 'globbox'
+                elif parent_kind == 'cpnet' and element.tag == 'page':
+                    kind = 'other_page' if seen_page else 'page'
+                    seen_page = True
+                elif parent_kind in ('root', 'cpnet', 'globbox', 'page', 'other_page'):
+                    kind = 'item'
+                else:
+                    kind = 'inner'
+                stack.append((element, kind))
+                continue
+
+            _, kind = stack.pop()
+            if kind == 'inner' or kind == 'root':
+                continue
+
+            parent, parent_kind = stack[-1]
+            if kind == 'item':
+                if parent_kind == 'globbox':
+                    # Same semantics as the './/' searches of the get_* functions
+                    for child in element.iter():
+                        if child.tag == 'color':
+                            parsed_data["colsets"].append(parse_colset(child))
+                        elif child.tag == 'var':
+                            parsed_data["variables"].append(parse_var(child))
+                        elif child.tag == 'ml':
+                            value = parse_value(child)
+                            if value is not None:
+                                parsed_data["values"].append(value)
+                            function = parse_function(child)
+                            if function is not None:
+                                parsed_data["functions"].append(function)
+                elif parent_kind == 'page' and element.tag in page_handlers:
+                    target, parse = page_handlers[element.tag]
+                    target.append(parse(element))
+
+            # The element has been fully processed, release it
+            element.clear()
+            parent.remove(element)
+    except ET.ParseError as e:
+        raise ValueError(f"Error during XML processing: {e}")  # Parsing error handling
+    except FileNotFoundError:
+        raise ValueError("File not found, check path.")  # Error handling if file does not exist
+
+    if not seen_cpnet:
+        raise ValueError("The file does not contain the <cpnet> block.")
+    if not seen_page:
+        raise ValueError("The <cpnet> block does not contain <page>.")
+    if not seen_globbox:
+        raise ValueError("The file does not contain a <globbox> block.")
+
+    return parsed_data
+
+
+# Columns stored as pandas categoricals by build_dataframes (IDs, types and orientation)
+CATEGORICAL_COLUMNS = {
+    "places": ["place_id", "type"],
+    "transitions": ["transition_id"],
+    "arcs": ["arc_id", "orientation", "transend", "placeend"],
+    "colsets": ["id", "name", "subtype"],
+    "values": ["id"],
+    "variables": ["id", "type"],
+    "functions": ["id"],
+}
+
+# Column order of the frames, so that empty lists still give frames with the expected columns
+FRAME_COLUMNS = {
+    "places": ["place_id", "text", "type", "initmark"],
+    "transitions": ["transition_id", "text", "condition", "time", "code", "priority"],
+    "arcs": ["arc_id", "orientation", "order", "transend", "placeend", "expression"],
+    "colsets": ["id", "name", "layout", "subtype", "subtype_contents", "index_values", "timed"],
+    "values": ["id", "name", "value", "layout"],
+    "variables": ["id", "type", "names", "layout"],
+    "functions": ["id", "name", "value", "layout"],
+}
+
+
+def build_dataframes(parsed_data):
+    """
+    Builds the seven DataFrames of a parsed model directly in columnar form.
+    ID, type and orientation columns are categorical. The arc placeend/transend columns
+    share the categories of places.place_id/transitions.transition_id, and the integer
+    join keys arcs.place_row/arcs.transition_row point at the matching rows (-1 if none).
+    """
+    frames = {}
+    for name, columns in FRAME_COLUMNS.items():
+        rows = parsed_data.get(name, [])
+        # One list per column instead of a list of dictionaries per row
+        frame = pd.DataFrame(
+            {column: [row.get(column) for row in rows] for column in columns},
+            dtype=None if rows else object
+        )
+        for column in CATEGORICAL_COLUMNS[name]:
+            if column not in ("transend", "placeend"):
+                frame[column] = frame[column].astype("category")
+        frames[name] = frame
+
+    arcs = frames["arcs"]
+    place_dtype = pd.CategoricalDtype(frames["places"]["place_id"].tolist())
+    transition_dtype = pd.CategoricalDtype(frames["transitions"]["transition_id"].tolist())
+    frames["places"]["place_id"] = frames["places"]["place_id"].astype(place_dtype)
+    frames["transitions"]["transition_id"] = frames["transitions"]["transition_id"].astype(transition_dtype)
+    arcs["placeend"] = arcs["placeend"].astype(place_dtype)
+    arcs["transend"] = arcs["transend"].astype(transition_dtype)
+    # With the categories in row order, the category code is the row position
+    arcs["place_row"] = arcs["placeend"].cat.codes.astype("int32")
+    arcs["transition_row"] = arcs["transend"].cat.codes.astype("int32")
+
+    return frames
+
+
+def join_arcs(frames):
+    """
+    Returns the arcs frame joined with the names and types of their places and transitions,
+    using the precomputed row keys instead of a hash merge.
+    """
+    arcs = frames["arcs"]
+    places = frames["places"]
+    transitions = frames["transitions"]
+    joined = arcs.copy()
+    has_place = (arcs["place_row"] >= 0).to_numpy()
+    has_transition = (arcs["transition_row"] >= 0).to_numpy()
+
+    place_rows = arcs["place_row"].to_numpy()[has_place]
+    place_text = pd.Series(None, index=arcs.index, dtype=object)
+    place_text[has_place] = places["text"].to_numpy()[place_rows]
+    place_type = pd.Series(None, index=arcs.index, dtype=places["type"].dtype)
+    place_type[has_place] = places["type"].to_numpy()[place_rows]
+
+    transition_rows = arcs["transition_row"].to_numpy()[has_transition]
+    transition_text = pd.Series(None, index=arcs.index, dtype=object)
+    transition_text[has_transition] = transitions["text"].to_numpy()[transition_rows]
+
+    joined["place_text"] = place_text
+    joined["place_type"] = place_type
+    joined["transition_text"] = transition_text
+    return joined
@@ -0,0 +1,236 @@
+"""
+Hierarchical (multi-page) CPN models.
+
+Substitution transitions, port/socket assignments and fusion places are flattened
+into a single net. Every page is parsed and converted only once, into a template,
+and only when some instance actually refers to it; each substitution-transition
+instance then just re-uses the template with prefixed names.
+"""
+from main_code_function.functions_for_parsing import get_places, get_transitions, get_arcs
+from main_code_function.snakes_engine_main import (
+    build_snakes_net, convert_condition, convert_place_tokens, create_variables, parse_arc_expression, resolve_priority
+)
+
+
+def get_cpnet_block(root):
+    cpnet_block = root.find('cpnet')
+    if cpnet_block is None:
+        raise ValueError("The file does not contain the <cpnet> block.")
+    return cpnet_block
+
+
+def get_pages(root):
+    """
+    Indexes all <page> blocks by their ID without parsing their contents.
+    """
+    pages = {page.attrib.get('id'): page for page in get_cpnet_block(root).findall('page')}
+    if not pages:
+        raise ValueError("The <cpnet> block does not contain <page>.")
+    return pages
+
+
+def get_top_pages(root, pages):
+    """
+    Returns the IDs of the top-level pages in document order.
+    Taken from the <instances> block; without it, every page that is not a subpage is top-level.
+    """
+    instances_block = get_cpnet_block(root).find('instances')
+    if instances_block is not None:
+        top_pages = [instance.attrib.get('page') for instance in instances_block.findall('instance')]
+        top_pages = [page_id for page_id in top_pages if page_id in pages]
+        if top_pages:
+            return top_pages
+
+    subpages = {subst.attrib.get('subpage') for page in pages.values() for subst in page.findall('trans/subst')}
+    return [page_id for page_id in pages if page_id not in subpages]
+
+
+def get_fusion_sets(root):
+    """
+    Maps the ID of every fusion place to the name of its fusion set.
+    """
+    fusion_sets = {}
+    for fusion in get_cpnet_block(root).findall('fusion'):
+        fusion_name = fusion.attrib.get('name') or fusion.attrib.get('id')
+        for member in fusion.findall('fusion_elm'):
+            fusion_sets[member.attrib.get('idref')] = fusion_name
+    return fusion_sets
+
+
+def parse_portsock(portsock):
+    """
+    Splits a portsock attribute "(ID1,ID2)(ID3,ID4)" into ID pairs.
+    """
+    pairs = []
+    for chunk in (portsock or '').split(')'):
+        chunk = chunk.strip().lstrip('(')
+        if chunk:
+            first, _, second = chunk.partition(',')
+            pairs.append((first.strip(), second.strip()))
+    return pairs
+
+
+def compile_page_template(page_block, values_dict, fusion_sets):
+    """
+    Parses one page and converts its markings, guards and arc expressions.
+    The result is shared by all instances of the page.
+    """
+    places = []
+    for place_element, place in zip(page_block.findall('place'), get_places(page_block)):
+        port_element = place_element.find('port')
+        fusioninfo_element = place_element.find('fusioninfo')
+        fusion_name = fusion_sets.get(place['place_id']) or (
+            fusioninfo_element.attrib.get('name') if fusioninfo_element is not None else None
+        )
+        places.append({
+            'place_id': place['place_id'],
+            'name': str(place['text']),
+            'type': place['type'],
+            'tokens': convert_place_tokens(place, values_dict),
+            'port': port_element.attrib.get('type') if port_element is not None else None,
+            'fusion': fusion_name,
+            'record': place,
+        })
+
+    transitions = []
+    substitutions = []
+    for trans_element, transition in zip(page_block.findall('trans'), get_transitions(page_block)):
+        subst_element = trans_element.find('subst')
+        if subst_element is not None:
+            substitutions.append({
+                'transition_id': transition['transition_id'],
+                'name': str(transition['text']),
+                'subpage': subst_element.attrib.get('subpage'),
+                'portsock': parse_portsock(subst_element.attrib.get('portsock')),
+            })
+        else:
+            transitions.append({
+                'transition_id': transition['transition_id'],
+                'name': str(transition['text']),
+                'condition': convert_condition(transition['condition']),
+                'priority': resolve_priority(transition.get('priority'), values_dict),
+                'record': transition,
+            })
+
+    # Arcs connected to substitution transitions are replaced by the subpage port arcs
+    ordinary_transitions = {t['transition_id'] for t in transitions}
+    arcs = [
+        (arc['placeend'], arc['transend'], arc['orientation'], parse_arc_expression(arc['expression'], arc['orientation']), arc)
+        for arc in get_arcs(page_block)
+        if arc['transend'] in ordinary_transitions
+    ]
+
+    pageattr_element = page_block.find('pageattr')
+    return {
+        'page_id': page_block.attrib.get('id'),
+        'name': pageattr_element.attrib.get('name') if pageattr_element is not None else None,
+        'places': places,
+        'transitions': transitions,
+        'substitutions': substitutions,
+        'arcs': arcs,
+    }
+
+
+def flatten_hierarchy(root, values_dict=None, remove_names=False):
+    """
+    Flattens all instances reachable from the top-level pages into the converted form
+    used by build_snakes_net. Returns (converted, templates); templates only contains
+    the pages that were actually instantiated. converted["records"] holds the places,
+    transitions and arcs of the flat net as parsed records (see flat_data).
+
+    Names of nodes on subpages are prefixed with the path of substitution transitions,
+    e.g. "Sender/Send Packet". Port places are merged with their sockets and all members
+    of a fusion set with the first one found.
+    """
+    values_dict = values_dict or {}
+    pages = get_pages(root)
+    fusion_sets = get_fusion_sets(root)
+    templates = {}
+
+    places = []
+    transitions = []
+    arcs = []
+    records = {"places": [], "transitions": [], "arcs": []}
+    fusion_places = {}  # Fusion set name -> name of the merged place
+
+    def get_template(page_id):
+        if page_id not in templates:
+            if page_id not in pages:
+                raise ValueError(f"Substitution transition refers to an unknown page '{page_id}'.")
+            templates[page_id] = compile_page_template(pages[page_id], values_dict, fusion_sets)
+        return templates[page_id]
+
+    def instantiate(page_id, prefix, port_binding, active_pages):
+        if page_id in active_pages:
+            raise ValueError(f"Recursive substitution of page '{page_id}'.")
+        template = get_template(page_id)
+
+        local_places = {}  # Place ID on this page -> place name in the flat net
+        for place in template['places']:
+            if remove_names and place['name'] == "Names":
+                continue
+            if place['place_id'] in port_binding:
+                local_places[place['place_id']] = port_binding[place['place_id']]
+                continue
+            if place['fusion'] and place['fusion'] in fusion_places:
+                local_places[place['place_id']] = fusion_places[place['fusion']]
+                continue
+            place_name = prefix + place['name']
+            if place['fusion']:
+                fusion_places[place['fusion']] = place_name
+            local_places[place['place_id']] = place_name
+            places.append((place_name, place['type'], place['tokens']))
+            records["places"].append(dict(place['record'], place_id=place_name, text=place_name))
+
+        local_transitions = {}
+        for transition in template['transitions']:
+            transition_name = prefix + transition['name']
+            local_transitions[transition['transition_id']] = transition_name
+            transitions.append((transition_name, transition['condition'], transition['priority']))
+            records["transitions"].append(dict(transition['record'], transition_id=transition_name, text=transition_name))
+
+        for place_id, transition_id, arc_type, arc_label, arc in template['arcs']:
+            place_name = local_places.get(place_id)
+            if place_name:
+                arcs.append((place_name, local_transitions[transition_id], arc_type, arc_label))
+                records["arcs"].append(dict(arc, arc_id=prefix + arc['arc_id'], placeend=place_name,
+                                            transend=local_transitions[transition_id]))
+
+        for subst in template['substitutions']:
+            subpage = get_template(subst['subpage'])
+            subpage_places = {place['place_id'] for place in subpage['places']}
+            child_binding = {}
+            for first, second in subst['portsock']:
+                # The order inside the pair is resolved by which ID belongs to which page
+                port, socket = (first, second) if first in subpage_places else (second, first)
+                if socket in local_places:
+                    child_binding[port] = local_places[socket]
+            instantiate(subst['subpage'], prefix + subst['name'] + "/", child_binding, active_pages | {page_id})
+
+    top_pages = get_top_pages(root, pages)
+    for page_id in top_pages:
+        # A single top-level page keeps the original names, exactly like the flat converter
+        prefix = "" if len(top_pages) == 1 else f"{get_template(page_id)['name']}/"
+        instantiate(page_id, prefix, {}, frozenset())
+
+    return {"places": places, "transitions": transitions, "arcs": arcs, "records": records}, templates
+
+
+def flat_data(data, converted):
+    """
+    Parsed model data (collect_all_data) describing the flattened net: the declarations
+    of data with the places, transitions and arcs of all instances. Node IDs are the
+    flat node names, so timed.py and unfolding.py see the nodes of the flat net.
+    """
+    return dict(data, **converted["records"])
+
+
+def create_hierarchical_snakes_net(root, data, colset_functions, remove_names=False, compiled=False):
+    """
+    Hierarchical counterpart of create_snakes_net. Declarations (values, variables)
+    are taken from data, net structure from all instantiated pages of root.
+    """
+    values_dict = {val["name"]: val["value"] for val in data.get("values", [])}
+    converted, _ = flatten_hierarchy(root, values_dict, remove_names)
+    net, places_info = build_snakes_net(converted, colset_functions, compiled)
+    return net, places_info, create_variables(data)
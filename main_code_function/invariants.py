@@ -0,0 +1,372 @@
+"""
+Structural analysis: incidence matrices and place/transition invariants.
+
+The incidence matrix of a net built by create_snakes_net counts tokens without their
+colors: every arc label of the converter moves a fixed number of tokens (variables,
+tuples and expressions one, multi-arcs and constant multisets their size), so
+C[p, t] = tokens produced in p by t - tokens consumed from p by t. For unfolded nets
+(unfolding.py) the incidence matrix of the P/T net is used, which distinguishes colors.
+
+A place invariant is a weight vector y with y.C = 0, i.e. y.M is the same in every
+reachable marking M. Semi-positive invariants bound every place they cover, and a net
+covered by them is conservative, without generating its state space. Transition
+invariants (C.x = 0) are firing counts that reproduce a marking.
+
+Matrices are kept sparse (one dict per row) and all arithmetic is exact integer
+arithmetic, so both algorithms handle nets with thousands of places:
+    integer_basis() - fraction-free Gaussian elimination, a basis of all invariants;
+    farkas()        - Farkas algorithm with minimal-support pruning, all minimal
+                      semi-positive invariants (can grow exponentially on some nets).
+
+Usage (from the repository root):
+    python -m main_code_function.invariants CPN_models/1/2-1DeterministicProtocol.cpn
+"""
+import argparse
+import math
+import time
+
+import numpy as np
+from snakes.nets import MultiArc, MultiSet
+
+from main_code_function.model_cache import load_snakes_net
+from main_code_function.unfolding import parse_domain, unfold
+
+DEFAULT_MAX_ROWS = 100000
+
+
+def label_weight(label):
+    """
+    Number of tokens moved by an arc label.
+    """
+    if isinstance(label, MultiArc):
+        return sum(label_weight(component) for component in label)
+    if isinstance(label, MultiSet):
+        return len(label)
+    return 1
+
+
+class Incidence:
+    """
+    Sparse incidence matrix: rows[i] maps column indices to the non-zero entries of
+    row i. Rows are places and columns transitions, or the other way round after transposed().
+    """
+
+    def __init__(self, row_names, column_names, rows):
+        self.row_names = row_names
+        self.column_names = column_names
+        self.rows = rows
+
+    @property
+    def shape(self):
+        return len(self.row_names), len(self.column_names)
+
+    def toarray(self):
+        dense = np.zeros(self.shape, dtype=np.int64)
+        for row, entries in enumerate(self.rows):
+            for column, value in entries.items():
+                dense[row, column] = value
+        return dense
+
+    def transposed(self):
+        rows = [{} for _ in self.column_names]
+        for row, entries in enumerate(self.rows):
+            for column, value in entries.items():
+                rows[column][row] = value
+        return Incidence(self.column_names, self.row_names, rows)
+
+
+def net_incidence(net):
+    """
+    Color-blind incidence matrix (places x transitions) of a net built by create_snakes_net.
+    """
+    place_names = sorted(place.name for place in net.place())
+    place_index = {name: index for index, name in enumerate(place_names)}
+    transition_names = [transition.name for transition in net.transition()]
+    rows = [{} for _ in place_names]
+    for column, transition in enumerate(net.transition()):
+        for sign, arcs in ((-1, transition.input()), (1, transition.output())):
+            for place, label in arcs:
+                entries = rows[place_index[place.name]]
+                entries[column] = entries.get(column, 0) + sign * label_weight(label)
+    for entries in rows:
+        for column in [column for column, value in entries.items() if not value]:
+            del entries[column]  # Test arcs (BOTHDIR) cancel out
+    return Incidence(place_names, transition_names, rows)
+
+
+def net_marking(net, place_names):
+    """
+    Token count of every place, in place_names order.
+    """
+    return [len(net.place(name).tokens) for name in place_names]
+
+
+def pt_incidence(pt_net):
+    """
+    Incidence matrix (places x transitions) of an unfolded net (unfolding.PTNet).
+    """
+    matrix = pt_net.incidence
+    rows = [{} for _ in pt_net.places]
+    for transition, place, value in zip(matrix.entry_rows.tolist(), matrix.indices.tolist(), matrix.data.tolist()):
+        rows[place][transition] = value
+    place_names = [f"{place}[{color!r}]" for place, color in pt_net.places]
+    transition_names = [f"{name}{dict(items)}" for name, items in pt_net.transitions]
+    return Incidence(place_names, transition_names, rows)
+
+
+def _nonzero(entries):
+    return {key: value for key, value in entries.items() if value}
+
+
+def _normalize(vector):
+    divisor = 0
+    for value in vector.values():
+        divisor = math.gcd(divisor, value)
+    if divisor > 1:
+        for key in vector:
+            vector[key] //= divisor
+    return vector
+
+
+def _combine(first, first_factor, second, second_factor):
+    """
+    first * first_factor + second * second_factor, without zero entries.
+    """
+    result = {key: value * first_factor for key, value in first.items()}
+    for key, value in second.items():
+        total = result.get(key, 0) + value * second_factor
+        if total:
+            result[key] = total
+        else:
+            result.pop(key, None)
+    return result
+
+
+def integer_basis(incidence):
+    """
+    Integer basis of all vectors y with y.C = 0 (place invariants for a places x
+    transitions matrix, transition invariants for the transposed one). Each basis
+    vector is a dict {row index: weight}; weights may be negative.
+    """
+    # Each working row is (remaining matrix entries, combination of original rows)
+    rows = [(_nonzero(entries), {index: 1}) for index, entries in enumerate(incidence.rows)]
+    by_column = {}
+    for number, (entries, _) in enumerate(rows):
+        for column in entries:
+            by_column.setdefault(column, set()).add(number)
+    alive = set(range(len(rows)))
+
+    while by_column:
+        # Markowitz-style choice: the column touching fewest rows, pivot on its shortest row
+        column = min(by_column, key=lambda key: len(by_column[key]))
+        touching = by_column.pop(column)
+        pivot = min(touching, key=lambda number: len(rows[number][0]) + len(rows[number][1]))
+        pivot_entries, pivot_combination = rows[pivot]
+        pivot_value = pivot_entries[column]
+        for number in touching:
+            if number == pivot:
+                continue
+            entries, combination = rows[number]
+            value = entries[column]
+            divisor = math.gcd(pivot_value, value)
+            factor, pivot_factor = pivot_value // divisor, -value // divisor
+            new_entries = _combine(entries, factor, pivot_entries, pivot_factor)
+            for key in set(entries) | set(new_entries):
+                if key != column and key in by_column:
+                    if key in new_entries:
+                        by_column[key].add(number)
+                    else:
+                        by_column[key].discard(number)
+            rows[number] = (new_entries, _combine(combination, factor, pivot_combination, pivot_factor))
+        # The pivot row cannot take part in an invariant any more
+        alive.discard(pivot)
+        for key in pivot_entries:
+            if key in by_column:
+                by_column[key].discard(pivot)
+        for key in [key for key, numbers in by_column.items() if not numbers]:
+            del by_column[key]
+
+    basis = []
+    for number in sorted(alive):
+        _, combination = rows[number]
+        vector = _normalize(dict(combination))
+        if next(iter(sorted(vector.items())))[1] < 0:
+            vector = {key: -value for key, value in vector.items()}
+        basis.append(vector)
+    return basis
+
+
+def farkas(incidence, max_rows=DEFAULT_MAX_ROWS):
+    """
+    All minimal-support semi-positive vectors y >= 0 with y.C = 0 (Farkas algorithm).
+    Non-minimal rows are dropped after every column. Raises RuntimeError when more than
+    max_rows intermediate rows would be needed (use integer_basis() instead).
+    """
+    # Each row is (remaining matrix entries, weights, support bit mask)
+    rows = [(_nonzero(entries), {index: 1}, 1 << index) for index, entries in enumerate(incidence.rows)]
+    columns = {column for entries, _, _ in rows for column in entries}
+    # Number of rows with a positive/negative entry in each column
+    positive_count = dict.fromkeys(columns, 0)
+    negative_count = dict.fromkeys(columns, 0)
+
+    def count(changed_rows, step):
+        for entries, _, _ in changed_rows:
+            for key, value in entries.items():
+                if value > 0:
+                    positive_count[key] += step
+                else:
+                    negative_count[key] += step
+
+    count(rows, 1)
+    while columns:
+        # Columns are eliminated in the order producing the fewest new rows
+        column = min(columns, key=lambda key: positive_count[key] * negative_count[key]
+                                              - positive_count[key] - negative_count[key])
+        columns.discard(column)
+        kept, positive, negative = [], [], []
+        for row in rows:
+            value = row[0].get(column, 0)
+            (kept if not value else positive if value > 0 else negative).append(row)
+
+        supports = [row[2] for row in kept]
+        added = []
+        for plus_entries, plus_weights, plus_support in positive:
+            for minus_entries, minus_weights, minus_support in negative:
+                support = plus_support | minus_support
+                # A combination whose support contains another row's support is not minimal
+                outside = ~support
+                if any(not other & outside for other in supports):
+                    continue
+                plus_value, minus_value = plus_entries[column], -minus_entries[column]
+                divisor = math.gcd(plus_value, minus_value)
+                plus_factor, minus_factor = minus_value // divisor, plus_value // divisor
+                weights = _combine(plus_weights, plus_factor, minus_weights, minus_factor)
+                entries = _combine(plus_entries, plus_factor, minus_entries, minus_factor)
+                divisor = 0
+                for value in weights.values():
+                    divisor = math.gcd(divisor, value)
+                if divisor > 1:  # Entries are y.C, so they are divisible as well
+                    weights = {key: value // divisor for key, value in weights.items()}
+                    entries = {key: value // divisor for key, value in entries.items()}
+                added.append((entries, weights, support))
+                supports.append(support)
+                if len(kept) + len(added) > max_rows:
+                    raise RuntimeError(f"Farkas algorithm needs more than {max_rows} rows, the net has too many "
+                                       f"minimal invariants (integer_basis() still works).")
+        count(positive, -1)
+        count(negative, -1)
+        if added:
+            # Kept rows are minimal among themselves; a new row with a smaller support (or
+            # a later new row) can still make a kept or earlier new row non-minimal
+            dominated = set()
+            for new_support in (row[2] for row in added):
+                for number, (_, _, support) in enumerate(kept):
+                    if not new_support & ~support and new_support != support:
+                        dominated.add(number)
+            if dominated:
+                count([kept[number] for number in dominated], -1)
+                kept = [row for number, row in enumerate(kept) if number not in dominated]
+            new_supports = [row[2] for row in added]
+            added = [row for row in added
+                     if not any(not other & ~row[2] and other != row[2] for other in new_supports)]
+            count(added, 1)
+        rows = kept + added
+
+    return sorted((weights for entries, weights, _ in rows if not entries), key=lambda weights: sorted(weights))
+
+
+def place_bounds(invariants, marking):
+    """
+    Upper bound of every place covered by a semi-positive invariant: min over those
+    invariants of floor(y.M0 / y[p]). Uncovered places are missing from the result.
+    """
+    bounds = {}
+    for invariant in invariants:
+        if any(weight < 0 for weight in invariant.values()):
+            continue
+        total = sum(weight * marking[place] for place, weight in invariant.items())
+        for place, weight in invariant.items():
+            bound = total // weight
+            if place not in bounds or bound < bounds[place]:
+                bounds[place] = bound
+    return bounds
+
+
+def format_invariant(invariant, names, marking=None):
+    """
+    Human-readable form, e.g. "A + 2*B = 3" (the right-hand side only with a marking).
+    """
+    terms = ""
+    for index, weight in sorted(invariant.items()):
+        term = names[index] if abs(weight) == 1 else f"{abs(weight)}*{names[index]}"
+        if not terms:
+            terms = term if weight > 0 else f"-{term}"
+        else:
+            terms += f" + {term}" if weight > 0 else f" - {term}"
+    if marking is None:
+        return terms
+    return f"{terms} = {sum(weight * marking[index] for index, weight in invariant.items())}"
+
+
+def analyse(incidence, marking, max_rows=DEFAULT_MAX_ROWS):
+    """
+    Place and transition invariants of an incidence matrix (places x transitions)
+    and what they prove about the initial marking.
+    """
+    place_invariants = farkas(incidence, max_rows)
+    transposed = incidence.transposed()
+    transition_invariants = farkas(transposed, max_rows)
+    bounds = place_bounds(place_invariants, marking)
+    covered_transitions = {index for invariant in transition_invariants for index in invariant}
+    return {
+        'place_invariants': place_invariants,
+        'place_basis_size': len(integer_basis(incidence)),
+        'transition_invariants': transition_invariants,
+        'bounds': bounds,
+        'conservative': len(bounds) == len(incidence.row_names),
+        'unbounded_candidates': [incidence.row_names[index] for index in range(len(incidence.row_names)) if index not in bounds],
+        'covered_by_transition_invariants': len(covered_transitions) == len(incidence.column_names),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Place/transition invariants of a .cpn model.")
+    parser.add_argument('model', help="Path to the .cpn file")
+    parser.add_argument('--unfold', action='store_true', help="Analyse the unfolded P/T net (finite color sets)")
+    parser.add_argument('--domain', action='append', default=[], metavar="COLSET=VALUES",
+                        help="Values of a color set that is not finite, see unfolding.py")
+    parser.add_argument('--remove-names', action='store_true', help="Drop the auxiliary 'Names' place")
+    parser.add_argument('--max-rows', type=int, default=DEFAULT_MAX_ROWS, help="Row limit of the Farkas algorithm")
+    args = parser.parse_args(argv)
+
+    data, net, _, _ = load_snakes_net(args.model, remove_names=args.remove_names)
+    started = time.perf_counter()
+    if args.unfold:
+        pt_net = unfold(data, net, dict(parse_domain(text) for text in args.domain))
+        incidence = pt_incidence(pt_net)
+        marking = pt_net.initial.tolist()
+    else:
+        incidence = net_incidence(net)
+        marking = net_marking(net, incidence.row_names)
+
+    result = analyse(incidence, marking, args.max_rows)
+    places, transitions = incidence.shape
+    print(f"{places} places, {transitions} transitions ({time.perf_counter() - started:.2f} s)")
+    print(f"Place invariants ({len(result['place_invariants'])} minimal semi-positive, "
+          f"basis of {result['place_basis_size']}):")
+    for invariant in result['place_invariants']:
+        print("  " + format_invariant(invariant, incidence.row_names, marking))
+    print(f"Transition invariants ({len(result['transition_invariants'])}):")
+    for invariant in result['transition_invariants']:
+        print("  " + format_invariant(invariant, incidence.column_names))
+    if result['conservative']:
+        print("Every place is covered by a place invariant: the net is conservative and bounded.")
+    else:
+        print(f"Places not covered by a place invariant: {', '.join(result['unbounded_candidates'])}")
+    for index, bound in sorted(result['bounds'].items()):
+        print(f"  {incidence.row_names[index]} <= {bound}")
+    return result
+
+
+if __name__ == "__main__":
+    main()
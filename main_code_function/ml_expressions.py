@@ -0,0 +1,588 @@
+"""
+Tokenizer, parser and translator for the CPN ML subset used in guards and arc inscriptions.
+
+parse_ml() turns an inscription into an AST made of plain tuples ("tag", ...).
+From the AST, ml_to_python() emits Python source (guards, SNAKES expressions) and
+arc_label_form() a small description of the SNAKES arc label that build_arc_label()
+turns into the actual object. All translations are memoized in bounded LRU caches
+keyed by the source text, because the same inscriptions recur across arcs and models.
+"""
+import re
+from functools import lru_cache
+
+from snakes.nets import MultiSet, Expression, Variable, Tuple, Value, MultiArc
+
+# Size of each translation cache (number of distinct inscriptions kept)
+ML_CACHE_SIZE = 4096
+
+TOKEN_PATTERN = re.compile(r'''
+    (?P<space>\s+)
+  | (?P<string>"(?:[^"\\]|\\.)*")
+  | (?P<real>\d+\.\d+)
+  | (?P<int>\d+)
+  | (?P<field>\#[A-Za-z][A-Za-z0-9_']*)
+  | (?P<name>[A-Za-z][A-Za-z0-9_']*(?:\.[A-Za-z][A-Za-z0-9_']*)*)
+  | (?P<op>\+\+|--|::|\^\^|<>|<=|>=|[`^+\-*/=<>()\[\]{},@~])
+''', re.VERBOSE)
+
+ESCAPE_PATTERN = re.compile(r'\\(.)')
+ESCAPES = {'n': '\n', 't': '\t'}
+
+KEYWORDS = {'if', 'then', 'else', 'andalso', 'orelse', 'not', 'div', 'mod', 'empty', 'true', 'false'}
+
+# Binary operators by ML precedence level (low to high) and associativity
+BINARY_LEVELS = [
+    ({'++', '--'}, 'left'),
+    ({'orelse'}, 'left'),
+    ({'andalso'}, 'left'),
+    ({'=', '<>', '<', '>', '<=', '>='}, 'left'),
+    ({'`'}, 'left'),
+    ({'::', '@', '^^'}, 'right'),
+    ({'+', '-', '^'}, 'left'),
+    ({'*', '/', 'div', 'mod'}, 'left'),
+]
+
+# Python operators and their precedence for emitting minimal parentheses
+PYTHON_BINARY = {
+    'orelse': ('or', 2), 'andalso': ('and', 3),
+    '=': ('==', 5), '<>': ('!=', 5), '<': ('<', 5), '>': ('>', 5), '<=': ('<=', 5), '>=': ('>=', 5),
+    '+': ('+', 10), '-': ('-', 10), '^': ('+', 10),
+    '*': ('*', 11), '/': ('/', 11), 'div': ('//', 11), 'mod': ('%', 11),
+}
+PYTHON_ATOM = 14
+
+# ML library functions with a direct Python equivalent
+PYTHON_FUNCTIONS = {
+    'List.hd': lambda arg: f"{arg}[0]",
+    'List.tl': lambda arg: f"tuple({arg})[1:]",
+    'length': lambda arg: f"len({arg})",
+    'List.length': lambda arg: f"len({arg})",
+}
+
+
+def tokenize(text):
+    tokens = []
+    position = 0
+    while position < len(text):
+        match = TOKEN_PATTERN.match(text, position)
+        if match is None:
+            raise ValueError(f"Cannot parse ML expression '{text}': unexpected character '{text[position]}'")
+        kind = match.lastgroup
+        value = match.group()
+        position = match.end()
+        if kind == 'space':
+            continue
+        if kind == 'name' and value in KEYWORDS:
+            kind = 'keyword'
+        tokens.append((kind, value))
+    return tokens
+
+
+class _Parser:
+    """
+    Recursive-descent parser producing tuple-based AST nodes.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.position = 0
+
+    def error(self, message):
+        raise ValueError(f"Cannot parse ML expression '{self.text}': {message}")
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def take(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def expect(self, value):
+        kind, token = self.take()
+        if token != value:
+            self.error(f"expected '{value}', found '{token}'")
+
+    def parse(self):
+        node = self.expression()
+        if self.position != len(self.tokens):
+            self.error(f"unexpected '{self.peek()[1]}'")
+        return node
+
+    def expression(self):
+        if self.peek() == ('keyword', 'if'):
+            self.take()
+            condition = self.expression()
+            self.expect('then')
+            then_branch = self.expression()
+            self.expect('else')
+            return ('if', condition, then_branch, self.expression())
+        return self.binary(0)
+
+    def binary(self, level):
+        if level == len(BINARY_LEVELS):
+            return self.unary()
+        operators, associativity = BINARY_LEVELS[level]
+        left = self.binary(level + 1)
+        while self.peek()[1] in operators and self.peek()[0] in ('op', 'keyword'):
+            operator = self.take()[1]
+            if self.peek() == ('keyword', 'if'):
+                right = self.expression()  # "a ^^ if ..." - the conditional extends to the right
+            elif associativity == 'right':
+                right = self.binary(level)
+            else:
+                right = self.binary(level + 1)
+            left = ('binop', operator, left, right)
+        return left
+
+    def unary(self):
+        kind, value = self.peek()
+        if value == '~' or value == 'not':
+            self.take()
+            return ('unop', value, self.unary())
+        if kind == 'field':
+            self.take()
+            return ('field', value[1:], self.unary())
+        return self.application()
+
+    def application(self):
+        node = self.atom()
+        while self.starts_atom():
+            node = ('app', node, self.atom())
+        return node
+
+    def starts_atom(self):
+        kind, value = self.peek()
+        return kind in ('name', 'int', 'real', 'string') or value in ('(', '[', '{', 'true', 'false', 'empty')
+
+    def atom(self):
+        kind, value = self.take()
+        if kind == 'int':
+            return ('const', int(value))
+        if kind == 'real':
+            return ('const', float(value))
+        if kind == 'string':
+            return ('const', ESCAPE_PATTERN.sub(lambda m: ESCAPES.get(m.group(1), m.group(1)), value[1:-1]))
+        if kind == 'name':
+            return ('var', value)
+        if value in ('true', 'false'):
+            return ('const', value == 'true')
+        if value == 'empty':
+            return ('empty',)
+        if value == '(':
+            items = self.sequence(')')
+            if not items:
+                return ('unit',)
+            return items[0] if len(items) == 1 else ('tuple', tuple(items))
+        if value == '[':
+            return ('list', tuple(self.sequence(']')))
+        if value == '{':
+            return ('record', tuple(self.record_fields()))
+        if value is None:
+            self.error("unexpected end of expression")
+        self.error(f"unexpected '{value}'")
+
+    def sequence(self, closing):
+        items = []
+        if self.peek()[1] == closing:
+            self.take()
+            return items
+        while True:
+            items.append(self.expression())
+            kind, value = self.take()
+            if value == closing:
+                return items
+            if value != ',':
+                self.error(f"expected ',' or '{closing}', found '{value}'")
+
+    def record_fields(self):
+        fields = []
+        if self.peek()[1] == '}':
+            self.take()
+            return fields
+        while True:
+            kind, label = self.take()
+            if kind != 'name':
+                self.error(f"expected a record label, found '{label}'")
+            self.expect('=')
+            fields.append((label, self.expression()))
+            kind, value = self.take()
+            if value == '}':
+                return fields
+            if value != ',':
+                self.error(f"expected ',' or '}}', found '{value}'")
+
+
+@lru_cache(maxsize=ML_CACHE_SIZE)
+def parse_ml(text):
+    """
+    Parses an ML inscription into an AST of nested tuples.
+    """
+    return _Parser(text).parse()
+
+
+# --- Python emission ---
+
+def _wrap(source, precedence, required):
+    return f"({source})" if precedence < required else source
+
+def _as_tuple(node, source):
+    # List literals are already emitted as tuples
+    return source if node[0] == 'list' else f"tuple({source})"
+
+def _emit(node):
+    """
+    Returns (python_source, python_precedence) for an AST node.
+    """
+    tag = node[0]
+    if tag == 'var':
+        return node[1], PYTHON_ATOM
+    if tag == 'const':
+        return repr(node[1]), PYTHON_ATOM
+    if tag == 'unit':
+        return "()", PYTHON_ATOM
+    if tag == 'empty':
+        return "[]", PYTHON_ATOM
+    if tag == 'tuple':
+        return "(" + ", ".join(_emit(item)[0] for item in node[1]) + ")", PYTHON_ATOM
+    if tag == 'list':
+        # Lists are represented as tuples, like list tokens of initial markings
+        items = [_emit(item)[0] for item in node[1]]
+        return "(" + ", ".join(items) + ("," if len(items) == 1 else "") + ")", PYTHON_ATOM
+    if tag == 'record':
+        items = ", ".join(f"({label!r}, {_emit(value)[0]})" for label, value in node[1])
+        return f"frozenset([{items}])", PYTHON_ATOM
+    if tag == 'field':
+        return f"dict({_emit(node[2])[0]})[{node[1]!r}]", PYTHON_ATOM
+    if tag == 'app':
+        function = node[1]
+        argument = node[2]
+        arguments = [_emit(item)[0] for item in argument[1]] if argument[0] == 'tuple' else [_emit(argument)[0]]
+        if function[0] == 'var' and function[1] in PYTHON_FUNCTIONS and len(arguments) == 1:
+            return PYTHON_FUNCTIONS[function[1]](arguments[0]), PYTHON_ATOM
+        return f"{_wrap(*_emit(function), PYTHON_ATOM)}({', '.join(arguments)})", PYTHON_ATOM
+    if tag == 'unop':
+        operand, precedence = _emit(node[2])
+        if node[1] == 'not':
+            return f"not {_wrap(operand, precedence, 4)}", 4
+        return f"-{_wrap(operand, precedence, 12)}", 12
+    if tag == 'if':
+        condition, then_branch, else_branch = (_emit(part)[0] for part in node[1:])
+        return f"({then_branch} if {condition} else {else_branch})", PYTHON_ATOM
+    if tag == 'binop':
+        operator, left, right = node[1:]
+        left_source, left_precedence = _emit(left)
+        right_source, right_precedence = _emit(right)
+        if operator == '`':
+            # Multiset notation inside Python code: n`x -> [x]*n
+            return f"[{right_source}]*{_wrap(left_source, left_precedence, 11)}", 11
+        if operator in ('++', '--'):
+            python_operator = '+' if operator == '++' else '-'
+            return f"{_wrap(left_source, left_precedence, 10)} {python_operator} {_wrap(right_source, right_precedence, 11)}", 10
+        if operator == '::':
+            return f"(({left_source},) + {_as_tuple(right, right_source)})", PYTHON_ATOM
+        if operator in ('@', '^^'):
+            return f"({_as_tuple(left, left_source)} + {_as_tuple(right, right_source)})", PYTHON_ATOM
+        python_operator, precedence = PYTHON_BINARY[operator]
+        return (f"{_wrap(left_source, left_precedence, precedence)} {python_operator} "
+                f"{_wrap(right_source, right_precedence, precedence + 1)}"), precedence
+    raise ValueError(f"Unsupported ML construct: {tag}")
+
+
+@lru_cache(maxsize=ML_CACHE_SIZE)
+def split_time_delay(text):
+    """
+    Splits a timed inscription "expr @+ delay" into (expr, delay).
+    delay is None when there is no top-level "@+"; a bare "@+delay" gives ("", delay).
+    """
+    depth = 0
+    previous = None  # Text of the previous non-space token, None when it was not at depth 0
+    position = 0
+    while position < len(text):
+        match = TOKEN_PATTERN.match(text, position)
+        if match is None:
+            break  # Let the parser report the error
+        value = match.group()
+        if match.lastgroup == 'name' and value == 'if' and depth == 0:
+            break  # A delay inside the branches is not a delay of the whole inscription
+        if match.lastgroup == 'op':
+            if value in '([{':
+                depth += 1
+            elif value in ')]}':
+                depth -= 1
+            elif depth == 0 and value == '+' and previous == '@':
+                return text[:at_position].strip(), text[match.end():].strip()
+            if depth == 0 and value == '@':
+                at_position = match.start()
+        if match.lastgroup != 'space':
+            previous = value if depth == 0 else None
+        position = match.end()
+    return text.strip(), None
+
+
+@lru_cache(maxsize=ML_CACHE_SIZE)
+def split_time_delays(text):
+    """
+    Splits a timed multiset inscription into its top-level "++" terms, each with its
+    own delay: "1`x@+5 ++ 1`y" gives (("1`x", "5"), ("1`y", None)). A parenthesized
+    "(1`x ++ 1`y)@+5" stays one term.
+    """
+    terms = []
+    depth = 0
+    start = 0
+    position = 0
+    while position < len(text):
+        match = TOKEN_PATTERN.match(text, position)
+        if match is None:
+            break  # Let the parser report the error
+        value = match.group()
+        if match.lastgroup == 'name' and value == 'if' and depth == 0:
+            break  # The branches extend to the end, so the rest is one term
+        if match.lastgroup == 'op':
+            if value in '([{':
+                depth += 1
+            elif value in ')]}':
+                depth -= 1
+            elif depth == 0 and value == '++':
+                terms.append(text[start:match.start()])
+                start = match.end()
+        position = match.end()
+    terms.append(text[start:])
+
+    split = tuple(split_time_delay(term.strip()) for term in terms)
+    if len(split) > 1 and any(not term for term, _ in split):
+        raise ValueError(f"Cannot parse timed multiset '{text}': empty term")
+    return split
+
+
+@lru_cache(maxsize=ML_CACHE_SIZE)
+def ml_to_python(text):
+    """
+    Translates an ML expression into Python source.
+    """
+    return _emit(parse_ml(text))[0]
+
+
+@lru_cache(maxsize=ML_CACHE_SIZE)
+def guard_to_python(text):
+    """
+    Translates a guard. A guard list "[g1, g2]" is the conjunction of its elements.
+    Returns None for an empty guard.
+    """
+    node = parse_ml(text)
+    conditions = list(node[1]) if node[0] == 'list' else [node]
+    if not conditions:
+        return None
+    if len(conditions) == 1:
+        return _emit(conditions[0])[0]
+    return " and ".join(_wrap(*_emit(condition), 4) for condition in conditions)
+
+
+# --- Arc labels ---
+
+def _is_single_token(node):
+    """
+    True if the inscription denotes exactly one token (no multiset operators).
+    """
+    tag = node[0]
+    if tag == 'empty':
+        return False
+    if tag == 'binop' and node[1] in ('++', '--'):
+        return False
+    if tag == 'binop' and node[1] == '`':
+        return node[2] == ('const', 1) and _is_single_token(node[3])
+    if tag == 'if':
+        return _is_single_token(node[2]) and _is_single_token(node[3])
+    return True
+
+def _strip_single(node):
+    # 1`x is just x; conditionals keep their branches
+    if node[0] == 'binop' and node[1] == '`' and node[2] == ('const', 1):
+        return _strip_single(node[3])
+    if node[0] == 'if':
+        return ('if', node[1], _strip_single(node[2]), _strip_single(node[3]))
+    return node
+
+def _pattern_form(node):
+    """
+    Returns the label form of a pattern (variable, constant or tuple of patterns), or None.
+    """
+    tag = node[0]
+    if tag == 'var':
+        return ('var', node[1])
+    if tag == 'const':
+        return ('value', node[1])
+    if tag == 'unit':
+        return ('value', ())
+    if tag == 'list' and not node[1]:
+        return ('value', ())
+    if tag == 'tuple':
+        components = [_pattern_form(item) for item in node[1]]
+        return None if None in components else ('tuple', tuple(components))
+    return None
+
+def _token_forms(node, arc_type):
+    """
+    Label forms of the tokens of a multiset inscription ("a ++ 2`b").
+    """
+    tag = node[0]
+    if tag == 'empty':
+        return []
+    if tag == 'binop' and node[1] == '++':
+        return _token_forms(node[2], arc_type) + _token_forms(node[3], arc_type)
+    if tag == 'binop' and node[1] == '`':
+        if node[2][0] != 'const' or not isinstance(node[2][1], int):
+            raise ValueError("Multiplicities on arcs must be integer constants.")
+        return _token_forms(node[3], arc_type) * node[2][1]
+    if tag == 'if':
+        # A conditional multiset cannot be expressed by a SNAKES arc label,
+        # the 'then' branch is used (same as the previous converter)
+        return _token_forms(node[2], arc_type)
+    return [_single_form(node, arc_type)]
+
+def _single_form(node, arc_type):
+    pattern = _pattern_form(node)
+    if pattern is not None:
+        return pattern
+    if node[0] == 'binop' and node[1] == '::' and arc_type == 'PtoT':
+        # Input arcs cannot match head::tail, the list is matched as a pair of its parts
+        parts = []
+        while node[0] == 'binop' and node[1] == '::':
+            parts.append(node[2])
+            node = node[3]
+        parts.append(node)
+        parts = [part[2] if part[0] == 'field' else part for part in parts]
+        components = [_pattern_form(part) or ('expr', _emit(part)[0]) for part in parts]
+        return ('tuple', tuple(components))
+    return ('expr', _emit(node)[0])
+
+@lru_cache(maxsize=ML_CACHE_SIZE)
+def arc_label_form(text, arc_type):
+    """
+    Translates an arc inscription into a label form (see build_arc_label).
+    """
+    node = parse_ml(text)
+    if node[0] == 'empty':
+        return ('ms', ())
+    if _is_single_token(node):
+        return _single_form(_strip_single(node), arc_type)
+    forms = _token_forms(node, arc_type)
+    if not forms:
+        return ('ms', ())
+    return forms[0] if len(forms) == 1 else ('multi', tuple(forms))
+
+
+def build_arc_label(form):
+    """
+    Creates a fresh SNAKES arc label from a label form:
+    ('var', name), ('value', v), ('tuple', forms), ('expr', source), ('ms', items), ('multi', forms).
+    """
+    if form is None:
+        return None
+    kind, value = form
+    if kind == 'var':
+        return Variable(value)
+    if kind == 'value':
+        return Value(value)
+    if kind == 'tuple':
+        return Tuple([build_arc_label(component) for component in value])
+    if kind == 'expr':
+        return Expression(value)
+    if kind == 'ms':
+        return MultiSet(value)
+    if kind == 'multi':
+        return MultiArc([build_arc_label(component) for component in value])
+    raise ValueError(f"Unknown arc label kind: {kind!r}")
+
+
+# --- Constant evaluation (initial markings) ---
+
+CONSTANT_OPERATORS = {
+    '+': lambda a, b: a + b, '-': lambda a, b: a - b, '*': lambda a, b: a * b, '/': lambda a, b: a / b,
+    'div': lambda a, b: a // b, 'mod': lambda a, b: a % b, '^': lambda a, b: a + b,
+    '=': lambda a, b: a == b, '<>': lambda a, b: a != b, '<': lambda a, b: a < b, '>': lambda a, b: a > b,
+    '<=': lambda a, b: a <= b, '>=': lambda a, b: a >= b,
+    'andalso': lambda a, b: a and b, 'orelse': lambda a, b: a or b,
+    '::': lambda a, b: (a,) + tuple(b), '@': lambda a, b: tuple(a) + tuple(b), '^^': lambda a, b: tuple(a) + tuple(b),
+}
+
+def _resolve_value(name, values_dict, resolving):
+    # Returns the parsed declaration of "val name = ..." or None
+    if values_dict and name in values_dict and name not in resolving:
+        return parse_ml(values_dict[name])
+    return None
+
+def evaluate_constant(node, values_dict=None, resolving=()):
+    """
+    Evaluates a closed ML expression (a token of an initial marking) to a Python value.
+    Names declared with "val" are resolved; other names (enum constants) stay strings.
+    """
+    tag = node[0]
+    if tag == 'const':
+        return node[1]
+    if tag == 'unit':
+        return ()
+    if tag == 'var':
+        declaration = _resolve_value(node[1], values_dict, resolving)
+        if declaration is None:
+            return node[1]
+        return evaluate_constant(declaration, values_dict, resolving + (node[1],))
+    if tag in ('tuple', 'list'):
+        return tuple(evaluate_constant(item, values_dict, resolving) for item in node[1])
+    if tag == 'record':
+        return frozenset((label, evaluate_constant(value, values_dict, resolving)) for label, value in node[1])
+    if tag == 'unop':
+        operand = evaluate_constant(node[2], values_dict, resolving)
+        return (not operand) if node[1] == 'not' else -operand
+    if tag == 'if':
+        condition = evaluate_constant(node[1], values_dict, resolving)
+        return evaluate_constant(node[2] if condition else node[3], values_dict, resolving)
+    if tag == 'binop' and node[1] in CONSTANT_OPERATORS:
+        left = evaluate_constant(node[2], values_dict, resolving)
+        right = evaluate_constant(node[3], values_dict, resolving)
+        return CONSTANT_OPERATORS[node[1]](left, right)
+    raise ValueError(f"Cannot evaluate ML constant: {_emit(node)[0]}")
+
+def _add_marking(node, counts, values_dict, resolving, times):
+    tag = node[0]
+    if tag == 'empty':
+        return
+    if tag == 'binop' and node[1] == '++':
+        # Long markings are left-deep chains of '++', walked without recursion
+        operands = []
+        while node[0] == 'binop' and node[1] == '++':
+            operands.append(node[3])
+            node = node[2]
+        operands.append(node)
+        for operand in reversed(operands):
+            _add_marking(operand, counts, values_dict, resolving, times)
+        return
+    if tag == 'binop' and node[1] == '`':
+        count = evaluate_constant(node[2], values_dict, resolving)
+        if not isinstance(count, int) or isinstance(count, bool) or count < 0:
+            raise ValueError(f"Invalid multiplicity in initial marking: {count!r}")
+        _add_marking(node[3], counts, values_dict, resolving, times * count)
+        return
+    if tag == 'if':
+        branch = node[2] if evaluate_constant(node[1], values_dict, resolving) else node[3]
+        _add_marking(branch, counts, values_dict, resolving, times)
+        return
+    if tag == 'var':
+        # A declared value may itself be a whole multiset (e.g. val AllPackets = 1`... ++ ...)
+        declaration = _resolve_value(node[1], values_dict, resolving)
+        if declaration is not None:
+            _add_marking(declaration, counts, values_dict, resolving + (node[1],), times)
+            return
+    if times:
+        token = evaluate_constant(node, values_dict, resolving)
+        counts[token] = counts.get(token, 0) + times
+
+def marking_counts(text, values_dict=None):
+    """
+    Evaluates an initial marking into a {token: count} dictionary without
+    expanding multiplicities (100000`() is a single entry).
+    """
+    counts = {}
+    _add_marking(parse_ml(text), counts, values_dict, (), 1)
+    return counts
@@ -0,0 +1,194 @@
+import hashlib
+import os
+import pickle
+import zlib
+
+from snakes.nets import MultiSet, Expression, Variable, Tuple, Value, MultiArc
+
+from main_code_function.functions_for_parsing import collect_all_data, load_cpn_file, get_page_block, get_globbox_block, stream_all_data
+from main_code_function.hierarchy import flat_data, flatten_hierarchy
+from main_code_function.ml_expressions import build_arc_label
+from main_code_function.profiling import profiled
+from main_code_function.snakes_engine_main import (
+    CONVERTER_VERSION, build_snakes_net, convert_model, create_colset_functions, create_variables,
+    multiset_counts, multiset_from_counts
+)
+
+# Cache location can be overridden with the PS_CPN_CACHE_DIR environment variable.
+DEFAULT_CACHE_DIR = os.environ.get("PS_CPN_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "ps-cpn"))
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Every cache file starts with this header, followed by a zlib-compressed pickle.
+CACHE_MAGIC = b"PSCPN\x01"
+CACHE_SUFFIX = ".pcache"
+
+
+# SNAKES expressions hold compiled code and cannot be pickled, so arc labels are
+# stored as the label forms of ml_expressions (rebuilt with build_arc_label).
+def encode_arc_label(label):
+    if label is None:
+        return None
+    if isinstance(label, Variable):
+        return ("var", label.name)
+    if isinstance(label, Value):
+        return ("value", label.value)
+    if isinstance(label, Tuple):
+        return ("tuple", [encode_arc_label(component) for component in label])
+    if isinstance(label, Expression):
+        return ("expr", str(label))
+    if isinstance(label, MultiSet):
+        return ("ms", list(label))
+    if isinstance(label, MultiArc):
+        return ("multi", [encode_arc_label(component) for component in label])
+    raise TypeError(f"Unsupported arc label for caching: {label!r}")
+
+def encode_converted(converted):
+    """
+    Turns the output of convert_model into plain, picklable data.
+    """
+    return {
+        "places": [(name, place_type, multiset_counts(tokens)) for name, place_type, tokens in converted["places"]],
+        "transitions": converted["transitions"],
+        "arcs": [(p, t, arc_type, encode_arc_label(label)) for p, t, arc_type, label in converted["arcs"]],
+    }
+
+def decode_converted(encoded):
+    return {
+        "places": [(name, place_type, multiset_from_counts(tokens)) for name, place_type, tokens in encoded["places"]],
+        "transitions": encoded["transitions"],
+        "arcs": [(p, t, arc_type, build_arc_label(label)) for p, t, arc_type, label in encoded["arcs"]],
+    }
+
+
+class ModelCache:
+    """
+    Content-addressed on-disk cache of parsed and converted models.
+    Entries are keyed by a hash of the .cpn contents and CONVERTER_VERSION.
+    The directory is kept under max_bytes by evicting the least recently used entries.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def key(self, file_path, remove_names=False, hierarchical=False):
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        digest.update(f"|converter={CONVERTER_VERSION}|remove_names={bool(remove_names)}|hierarchical={bool(hierarchical)}".encode())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + CACHE_SUFFIX)
+
+    def get(self, key):
+        """
+        Returns the cached payload or None on a miss (corrupted entries are dropped).
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                blob = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            if not blob.startswith(CACHE_MAGIC):
+                raise ValueError("bad header")
+            payload = pickle.loads(zlib.decompress(blob[len(CACHE_MAGIC):]))
+        except Exception:
+            self._remove(path)
+            return None
+        os.utime(path)  # Mark as recently used for eviction
+        return payload
+
+    def put(self, key, payload):
+        os.makedirs(self.directory, exist_ok=True)
+        blob = CACHE_MAGIC + zlib.compress(pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL))
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(blob)
+        os.replace(tmp_path, path)  # Atomic, concurrent readers never see a partial file
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache fits into max_bytes.
+        """
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(CACHE_SUFFIX):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith(CACHE_SUFFIX):
+                self._remove(os.path.join(self.directory, name))
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+@profiled
+def load_model_payload(file_path, remove_names=False, cache=None, hierarchical=False):
+    """
+    Returns the picklable {"data", "converted"} payload of a .cpn model, from the
+    cache when possible. The converted part is encoded, see decode_converted.
+    """
+    cache = cache if cache is not None else ModelCache()
+    key = cache.key(file_path, remove_names, hierarchical)
+    payload = cache.get(key)
+    if payload is not None:
+        return payload
+    if hierarchical:
+        root = load_cpn_file(file_path)
+        data = collect_all_data(get_page_block(root), get_globbox_block(root))
+        values_dict = {val["name"]: val["value"] for val in data["values"]}
+        converted, _ = flatten_hierarchy(root, values_dict, remove_names)
+        data = flat_data(data, converted)
+    else:
+        data = stream_all_data(file_path)
+        converted = convert_model(data, remove_names)
+    payload = {"data": data, "converted": encode_converted(converted)}
+    cache.put(key, payload)
+    return payload
+
+
+@profiled
+def build_from_payload(payload, compiled=False):
+    """
+    Builds the SNAKES net of a load_model_payload() result without touching the .cpn file.
+    Returns (data, net, places_info, variables).
+    """
+    data = payload["data"]
+    colset_functions = create_colset_functions(data["colsets"])
+    net, places_info = build_snakes_net(decode_converted(payload["converted"]), colset_functions, compiled)
+    return data, net, places_info, create_variables(data)
+
+
+def load_snakes_net(file_path, remove_names=False, cache=None, hierarchical=False, compiled=False):
+    """
+    Loads a .cpn model and builds the SNAKES net, going through the cache.
+    A warm start skips both XML parsing and expression conversion.
+    With hierarchical=True all pages are flattened into one net (see hierarchy.py),
+    with compiled=True guards and arc expressions are compiled into Python functions.
+    Returns (data, net, places_info, variables).
+    """
+    return build_from_payload(load_model_payload(file_path, remove_names, cache, hierarchical), compiled)
@@ -0,0 +1,358 @@
+"""
+Synthetic CPN Tools models for stress tests.
+
+Writes .cpn files (CPN Tools XML, format 6) of parameterised net families whose
+number of nodes grows linearly with the size N:
+    philosophers  N dining philosophers, each with its own Think, Eat and Chopstick
+                  place and Take/Put transitions (val n = N is declared)
+    pipeline      a protocol whose packets are relayed through N links and
+                  acknowledged back through N links; acknowledged packets are sent again
+    queues        a closed network of N stations in tandem, each with a queue, an
+                  idle and a busy place; jobs leaving the last station re-enter the first
+The files only use ordinary places, transitions and arc inscriptions, so they are read
+by load_cpn_file/collect_all_data (or stream_all_data) and converted by
+create_snakes_net like the bundled models. Nodes are serialised one at a time, the
+XML tree of a large model is never held in memory.
+
+Usage (from the repository root):
+    python -m main_code_function.model_generator philosophers 10000 --output philosophers_10000.cpn
+    python -m main_code_function.model_generator pipeline 5000 --tokens 20 --output pipeline_5000.cpn
+"""
+import argparse
+import itertools
+from xml.etree import ElementTree as ET
+
+CPN_TOOLS_VERSION = "4.0.1"
+HEADER = ('<?xml version="1.0" encoding="iso-8859-1"?>\n'
+          '<!DOCTYPE workspaceElements PUBLIC "-//CPN//DTD CPNXML 1.0//EN" "http://cpntools.org/DTD/6/cpn.dtd">\n\n')
+STANDARD_PRIORITIES = (("P_HIGH", 100), ("P_NORMAL", 1000), ("P_LOW", 10000))
+COLUMN_WIDTH = 200.0
+ROW_HEIGHT = 120.0
+
+
+class Ids:
+    """
+    Generates the unique element IDs of one file ("ID1", "ID2", ...).
+    """
+
+    def __init__(self):
+        self._counter = itertools.count(1)
+
+    def __call__(self):
+        return f"ID{next(self._counter)}"
+
+
+def _graphics(element, x, y, colour="Black", thick="1", filled_pattern=""):
+    ET.SubElement(element, "posattr", x=f"{x:.6f}", y=f"{y:.6f}")
+    ET.SubElement(element, "fillattr", colour="White", pattern=filled_pattern, filled="false")
+    ET.SubElement(element, "lineattr", colour=colour, thick=thick, type="Solid")
+    ET.SubElement(element, "textattr", colour=colour, bold="false")
+
+
+def _inscription(parent, tag, ids, text, x, y):
+    # Type, initial marking, guard, ... of a node; empty inscriptions are kept like CPN Tools does
+    element = ET.SubElement(parent, tag, id=ids())
+    _graphics(element, x, y, thick="0", filled_pattern="Solid")
+    text_element = ET.SubElement(element, "text", tool="CPN Tools", version=CPN_TOOLS_VERSION)
+    text_element.text = text
+    return element
+
+
+def _declaration_layout(element, text):
+    layout = ET.SubElement(element, "layout")
+    layout.text = text
+
+
+def colset_element(ids, name, kind, components=None):
+    """
+    <color> declaration: kind is "unit", "bool", "int", "string" or "product" (of components).
+    """
+    element = ET.Element("color", id=ids())
+    ET.SubElement(element, "id").text = name
+    if kind == "product":
+        product = ET.SubElement(element, "product")
+        for component in components:
+            ET.SubElement(product, "id").text = component
+        layout = f"colset {name} = product {' * '.join(components)};"
+    else:
+        ET.SubElement(element, kind)
+        layout = f"colset {name} = {kind};"
+    _declaration_layout(element, layout)
+    return element
+
+
+def var_element(ids, names, colset):
+    element = ET.Element("var", id=ids())
+    ET.SubElement(ET.SubElement(element, "type"), "id").text = colset
+    for name in names:
+        ET.SubElement(element, "id").text = name
+    _declaration_layout(element, f"var {','.join(names)} : {colset};")
+    return element
+
+
+def value_element(ids, name, value):
+    element = ET.Element("ml", id=ids())
+    element.text = f"val {name} = {value};"
+    _declaration_layout(element, element.text)
+    return element
+
+
+def place_element(ids, name, colset, initmark, x, y):
+    element = ET.Element("place", id=ids())
+    _graphics(element, x, y)
+    ET.SubElement(element, "text").text = name
+    ET.SubElement(element, "ellipse", w="80.000000", h="40.000000")
+    ET.SubElement(element, "token", x="-10.000000", y="0.000000")
+    marking = ET.SubElement(element, "marking", x="0.000000", y="0.000000", hidden="false")
+    ET.SubElement(marking, "snap", {"snap_id": "0", "anchor.horizontal": "0", "anchor.vertical": "0"})
+    _inscription(element, "type", ids, colset, x + 40, y - 24)
+    _inscription(element, "initmark", ids, initmark, x + 50, y + 24)
+    return element
+
+
+def transition_element(ids, name, x, y, guard=None, priority=None):
+    element = ET.Element("trans", id=ids(), explicit="false")
+    _graphics(element, x, y)
+    ET.SubElement(element, "text").text = name
+    ET.SubElement(element, "box", w="80.000000", h="40.000000")
+    ET.SubElement(element, "binding", x="7.200000", y="-3.000000")
+    _inscription(element, "cond", ids, f"[{guard}]" if guard else None, x - 50, y + 30)
+    _inscription(element, "time", ids, None, x + 50, y + 30)
+    _inscription(element, "code", ids, None, x + 60, y - 50)
+    _inscription(element, "priority", ids, priority, x - 50, y - 30)
+    return element
+
+
+def arc_element(ids, orientation, transition_id, place_id, expression):
+    """
+    Arc between a place and a transition, orientation "PtoT", "TtoP" or "BOTHDIR".
+    """
+    element = ET.Element("arc", id=ids(), orientation=orientation, order="1")
+    _graphics(element, 0.0, 0.0)
+    ET.SubElement(element, "arrowattr", headsize="1.200000", currentcyckle="2")
+    ET.SubElement(element, "transend", idref=transition_id)
+    ET.SubElement(element, "placeend", idref=place_id)
+    _inscription(element, "annot", ids, expression, 0.0, 0.0)
+    return element
+
+
+class NetBuilder:
+    """
+    Yields the page elements of a family while keeping track of node IDs and counts.
+    Nodes are laid out on a grid, one row per repeated unit of the family.
+    """
+
+    def __init__(self, ids):
+        self.ids = ids
+        self.places = {}  # Name -> ID
+        self.transitions = {}
+        self.arcs = 0
+
+    def place(self, name, colset, column, row, initmark=None):
+        element = place_element(self.ids, name, colset, initmark, column * COLUMN_WIDTH, -row * ROW_HEIGHT)
+        self.places[name] = element.get("id")
+        return element
+
+    def transition(self, name, column, row, guard=None):
+        element = transition_element(self.ids, name, column * COLUMN_WIDTH, -row * ROW_HEIGHT, guard)
+        self.transitions[name] = element.get("id")
+        return element
+
+    def arc(self, place, transition, orientation, expression):
+        self.arcs += 1
+        return arc_element(self.ids, orientation, self.transitions[transition], self.places[place], expression)
+
+
+def multiset(tokens):
+    """
+    Initial marking text of the given token texts (1`a++1`b++...), or None.
+    """
+    return "++".join(f"1`{token}" for token in tokens) or None
+
+
+def philosophers(ids, size, tokens=None):
+    """
+    N dining philosophers; philosopher i needs chopsticks i and i mod N + 1 (tokens is not used).
+    Returns (declarations, nodes), nodes(net) yields the page elements.
+    """
+    if size < 2:
+        raise ValueError("The philosophers family needs at least 2 philosophers.")
+    declarations = [value_element(ids, "n", size)]
+
+    def nodes(net):
+        for i in range(1, size + 1):
+            yield net.place(f"Think {i}", "UNIT", 0, i, "1`()")
+            yield net.place(f"Eat {i}", "UNIT", 2, i)
+            yield net.place(f"Chopstick {i}", "UNIT", 4, i, "1`()")
+        for i in range(1, size + 1):
+            right = i % size + 1
+            yield net.transition(f"Take {i}", 1, i)
+            yield net.transition(f"Put {i}", 3, i)
+            yield net.arc(f"Think {i}", f"Take {i}", "PtoT", "()")
+            yield net.arc(f"Chopstick {i}", f"Take {i}", "PtoT", "()")
+            yield net.arc(f"Chopstick {right}", f"Take {i}", "PtoT", "()")
+            yield net.arc(f"Eat {i}", f"Take {i}", "TtoP", "()")
+            yield net.arc(f"Eat {i}", f"Put {i}", "PtoT", "()")
+            yield net.arc(f"Think {i}", f"Put {i}", "TtoP", "()")
+            yield net.arc(f"Chopstick {i}", f"Put {i}", "TtoP", "()")
+            yield net.arc(f"Chopstick {right}", f"Put {i}", "TtoP", "()")
+
+    return declarations, nodes
+
+
+def pipeline(ids, size, tokens=8):
+    """
+    Protocol with N relay links and N acknowledgement links; tokens packets circulate.
+    Returns (declarations, nodes), nodes(net) yields the page elements.
+    """
+    if size < 1:
+        raise ValueError("The pipeline family needs at least 1 link.")
+    declarations = [
+        colset_element(ids, "NO", "int"),
+        colset_element(ids, "DATA", "string"),
+        colset_element(ids, "NOxDATA", "product", ["NO", "DATA"]),
+        var_element(ids, ["n"], "NO"),
+        var_element(ids, ["d"], "DATA"),
+        value_element(ids, "depth", size),
+    ]
+
+    def nodes(net):
+        packets = multiset(f'({number},"p{number}")' for number in range(1, tokens + 1))
+        yield net.place("Packets To Send", "NOxDATA", 0, 0, packets)
+        yield net.place("Sent", "NOxDATA", 0, -1)
+        for i in range(1, size + 1):
+            yield net.place(f"Link {i}", "NOxDATA", 2, i)
+            yield net.place(f"Ack {i}", "NO", 4, i)
+
+        yield net.transition("Send Packet", 1, 0, guard="n > 0")
+        yield net.arc("Packets To Send", "Send Packet", "PtoT", "(n,d)")
+        yield net.arc("Sent", "Send Packet", "TtoP", "(n,d)")
+        yield net.arc("Link 1", "Send Packet", "TtoP", "(n,d)")
+        for i in range(1, size):
+            yield net.transition(f"Relay {i}", 1, i)
+            yield net.arc(f"Link {i}", f"Relay {i}", "PtoT", "(n,d)")
+            yield net.arc(f"Link {i + 1}", f"Relay {i}", "TtoP", "(n,d)")
+            yield net.transition(f"Return {i}", 5, i)
+            yield net.arc(f"Ack {i + 1}", f"Return {i}", "PtoT", "n")
+            yield net.arc(f"Ack {i}", f"Return {i}", "TtoP", "n")
+        yield net.transition("Receive Packet", 3, size)
+        yield net.arc(f"Link {size}", "Receive Packet", "PtoT", "(n,d)")
+        yield net.arc(f"Ack {size}", "Receive Packet", "TtoP", "n")
+        yield net.transition("Receive Ack", 5, 0)
+        yield net.arc("Ack 1", "Receive Ack", "PtoT", "n")
+        yield net.arc("Sent", "Receive Ack", "PtoT", "(n,d)")
+        yield net.arc("Packets To Send", "Receive Ack", "TtoP", "(n,d)")
+
+    return declarations, nodes
+
+
+def queues(ids, size, tokens=8):
+    """
+    Closed tandem network of N single-server stations; tokens jobs start in the first queue.
+    Returns (declarations, nodes), nodes(net) yields the page elements.
+    """
+    if size < 1:
+        raise ValueError("The queues family needs at least 1 station.")
+    declarations = [
+        colset_element(ids, "JOB", "int"),
+        var_element(ids, ["j"], "JOB"),
+        value_element(ids, "stations", size),
+    ]
+
+    def nodes(net):
+        jobs = multiset(str(job) for job in range(1, tokens + 1))
+        for i in range(1, size + 1):
+            yield net.place(f"Queue {i}", "JOB", 0, i, jobs if i == 1 else None)
+            yield net.place(f"Idle {i}", "UNIT", 2, i, "1`()")
+            yield net.place(f"Busy {i}", "JOB", 4, i)
+        for i in range(1, size + 1):
+            yield net.transition(f"Start {i}", 1, i)
+            yield net.arc(f"Queue {i}", f"Start {i}", "PtoT", "j")
+            yield net.arc(f"Idle {i}", f"Start {i}", "PtoT", "()")
+            yield net.arc(f"Busy {i}", f"Start {i}", "TtoP", "j")
+            yield net.transition(f"Finish {i}", 3, i)
+            yield net.arc(f"Busy {i}", f"Finish {i}", "PtoT", "j")
+            yield net.arc(f"Idle {i}", f"Finish {i}", "TtoP", "()")
+            yield net.arc(f"Queue {i % size + 1}", f"Finish {i}", "TtoP", "j")
+
+    return declarations, nodes
+
+
+FAMILIES = {"philosophers": philosophers, "pipeline": pipeline, "queues": queues}
+
+
+def standard_declarations(ids):
+    """
+    The "Standard priorities" and "Standard declarations" blocks of new CPN Tools nets.
+    """
+    priorities = ET.Element("block", id=ids())
+    ET.SubElement(priorities, "id").text = "Standard priorities"
+    for name, value in STANDARD_PRIORITIES:
+        priorities.append(value_element(ids, name, value))
+    standard = ET.Element("block", id=ids())
+    ET.SubElement(standard, "id").text = "Standard declarations"
+    for name, kind in (("UNIT", "unit"), ("BOOL", "bool"), ("INT", "int"), ("STRING", "string")):
+        standard.append(colset_element(ids, name, kind))
+    return [priorities, standard]
+
+
+def _serialize(element, level):
+    ET.indent(element, space="  ", level=level)
+    return "  " * level + ET.tostring(element, encoding="unicode") + "\n"
+
+
+def generate(family, size, output_path, tokens=8):
+    """
+    Writes the model of the given family and size to output_path.
+    Returns {"places", "transitions", "arcs"} counts.
+    """
+    if family not in FAMILIES:
+        raise ValueError(f"Unknown model family '{family}', expected one of {', '.join(FAMILIES)}.")
+    ids = Ids()
+    declarations, nodes = FAMILIES[family](ids, size, tokens)
+    net = NetBuilder(ids)
+    page_id = ids()
+
+    with open(output_path, "w", encoding="iso-8859-1") as f:
+        f.write(HEADER)
+        f.write("<workspaceElements>\n")
+        f.write(_serialize(ET.Element("generator", tool="CPN Tools", version=CPN_TOOLS_VERSION, format="6"), 1))
+        f.write("  <cpnet>\n    <globbox>\n")
+        for element in standard_declarations(ids) + declarations:
+            f.write(_serialize(element, 3))
+        f.write("    </globbox>\n")
+        f.write(f'    <page id="{page_id}">\n')
+        f.write(_serialize(ET.Element("pageattr", name=f"{family} {size}"), 3))
+        for element in nodes(net):
+            f.write(_serialize(element, 3))
+        f.write("    </page>\n")
+        instances = ET.Element("instances")
+        ET.SubElement(instances, "instance", id=ids(), page=page_id)
+        f.write(_serialize(instances, 2))
+        options = ET.Element("options")
+        option = ET.SubElement(options, "option", name="outputdirectory")
+        ET.SubElement(ET.SubElement(option, "value"), "text").text = "<same as model>"
+        f.write(_serialize(options, 2))
+        f.write(_serialize(ET.Element("binders"), 2))
+        f.write(_serialize(ET.Element("monitorblock", name="Monitors"), 2))
+        f.write("  </cpnet>\n</workspaceElements>\n")
+
+    return {"places": len(net.places), "transitions": len(net.transitions), "arcs": net.arcs}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic .cpn model of a parameterised family.")
+    parser.add_argument('family', choices=sorted(FAMILIES), help="Net family")
+    parser.add_argument('size', type=int, help="Number of philosophers, links or stations")
+    parser.add_argument('--tokens', type=int, default=8, help="Circulating packets or jobs (pipeline, queues)")
+    parser.add_argument('--output', default=None, help="Output file (default: FAMILY_SIZE.cpn)")
+    args = parser.parse_args(argv)
+
+    output = args.output or f"{args.family}_{args.size}.cpn"
+    counts = generate(args.family, args.size, output, args.tokens)
+    print(f"{output}: {counts['places']} places, {counts['transitions']} transitions, {counts['arcs']} arcs")
+    return counts
+
+
+if __name__ == "__main__":
+    main()
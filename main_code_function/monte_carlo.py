@@ -0,0 +1,205 @@
+"""
+Batch Monte Carlo simulation.
+
+Runs N independent, seeded random walks of one model in a process pool and
+aggregates firing counts, final markings and the distribution of the time (steps)
+to deadlock. The model is parsed and converted once, in the parent; workers only
+rebuild the SNAKES objects from that picklable payload (once per worker) and reset
+the marking between replications.
+
+Usage (from the repository root):
+    python -m main_code_function.monte_carlo CPN_models/2/2-10NondeterministicProtocol.cpn --runs 1000 --max-steps 600 \\
+        --random-success "Transmit Packet" "Receive Ack" --output monte_carlo.jsonl
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from main_code_function.model_cache import build_from_payload, load_model_payload
+from main_code_function.simulator import Simulator
+from main_code_function.snakes_engine_main import multiset_counts, multiset_from_counts
+
+_worker = {}  # Net of the current worker process, see init_worker
+
+
+class RandomSuccess:
+    """
+    Accept predicate emulating random success decisions (as in run_2_model.py):
+    firings of the listed transitions only take effect with the given probability,
+    otherwise the step is spent without firing.
+    """
+
+    def __init__(self, transition_names, probability=0.5):
+        self.transition_names = set(transition_names)
+        self.probability = probability
+
+    def __call__(self, transition_name, binding, rng):
+        return transition_name not in self.transition_names or rng.random() < self.probability
+
+
+def init_worker(payload, compiled=False, lazy=False):
+    _, net, _, _ = build_from_payload(payload, compiled)
+    _worker['net'] = net
+    _worker['lazy'] = lazy
+    _worker['initial'] = {place.name: multiset_counts(place.tokens) for place in net.place()}
+
+
+def run_replication(task):
+    """
+    One random walk from the initial marking. task is (run, seed, max_steps, stop, accept):
+    stop(net, step) ends the run early when it returns True, accept(transition_name,
+    binding, rng) can veto a chosen firing. Both must be picklable (module-level).
+    """
+    run, seed, max_steps, stop, accept = task
+    net = _worker['net']
+    for place in net.place():
+        place.tokens = multiset_from_counts(_worker['initial'][place.name])
+
+    rng = random.Random(seed)
+    simulator = Simulator(net, rng, lazy=_worker['lazy'])
+    firings = Counter()
+    steps = 0
+    deadlock = False
+    stopped = False
+    while steps < max_steps:
+        chosen = simulator.choose()
+        if chosen is None:
+            deadlock = True
+            break
+        transition, binding = chosen
+        steps += 1
+        if accept is None or accept(transition.name, binding, rng):
+            simulator.fire(transition, binding)
+            firings[transition.name] += 1
+        if stop is not None and stop(net, steps):
+            stopped = True
+            break
+
+    return {
+        'run': run,
+        'seed': seed,
+        'steps': steps,
+        'deadlock': deadlock,
+        'stopped': stopped,
+        'firings': dict(firings),
+        'final_marking': {place.name: multiset_counts(place.tokens) for place in net.place()},
+    }
+
+
+def marking_key(marking):
+    """
+    Hashable, order-independent form of a final marking ({place: [(value, count)]}).
+    """
+    return tuple((place, tuple(sorted(counts, key=repr))) for place, counts in sorted(marking.items()))
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def aggregate(results, top_markings=10):
+    """
+    Aggregated statistics of a batch of run_replication results.
+    """
+    runs = len(results)
+    firings = Counter()
+    for result in results:
+        firings.update(result['firings'])
+    deadlock_steps = sorted(result['steps'] for result in results if result['deadlock'])
+    markings = Counter(marking_key(result['final_marking']) for result in results)
+    place_tokens = Counter()
+    for result in results:
+        for place, counts in result['final_marking'].items():
+            place_tokens[place] += sum(count for _, count in counts)
+
+    return {
+        'runs': runs,
+        'deadlocks': len(deadlock_steps),
+        'deadlock_rate': len(deadlock_steps) / runs if runs else None,
+        'stopped': sum(1 for result in results if result['stopped']),
+        'mean_steps': statistics.fmean(result['steps'] for result in results) if runs else None,
+        'firings': {name: {'total': total, 'mean_per_run': total / runs} for name, total in sorted(firings.items())},
+        'time_to_deadlock': {
+            'min': deadlock_steps[0],
+            'mean': statistics.fmean(deadlock_steps),
+            'median': statistics.median(deadlock_steps),
+            'p90': percentile(deadlock_steps, 0.9),
+            'max': deadlock_steps[-1],
+            'histogram': dict(sorted(Counter(deadlock_steps).items())),
+        } if deadlock_steps else None,
+        'mean_final_tokens': {place: total / runs for place, total in sorted(place_tokens.items())},
+        'final_markings': [
+            {'runs': count, 'marking': {place: [[repr(value), times] for value, times in counts] for place, counts in key}}
+            for key, count in markings.most_common(top_markings)
+        ],
+    }
+
+
+def run_batch(file_path, runs, max_steps=1000, seed=0, workers=None, stop=None, accept=None, load_options=None,
+              compiled=False, chunksize=16, on_result=None, lazy=False):
+    """
+    Runs the replications with seeds seed, seed + 1, ... across a process pool.
+    on_result(result) is called for every finished run (in run order). With lazy=True the
+    workers never list all bindings of a transition (see Simulator).
+    Returns (results, aggregate(results)).
+    """
+    payload = load_model_payload(file_path, **(load_options or {}))
+    tasks = [(run, seed + run, max_steps, stop, accept) for run in range(runs)]
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(payload, compiled, lazy)) as pool:
+        for result in pool.map(run_replication, tasks, chunksize=chunksize):
+            if on_result is not None:
+                on_result(result)
+            results.append(result)
+    return results, aggregate(results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run seeded random simulations of a .cpn model in parallel.")
+    parser.add_argument('model', help="Path to the .cpn file")
+    parser.add_argument('--runs', type=int, default=1000, help="Number of replications")
+    parser.add_argument('--max-steps', type=int, default=1000, help="Step cap of each replication")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the first replication")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes (default: CPU count)")
+    parser.add_argument('--random-success', nargs='*', default=None, metavar="TRANSITION",
+                        help="Transitions whose firings only succeed with --success-probability")
+    parser.add_argument('--success-probability', type=float, default=0.5, help="See --random-success")
+    parser.add_argument('--remove-names', action='store_true', help="Drop the auxiliary 'Names' place")
+    parser.add_argument('--compiled', action='store_true', help="Compile guards and arc expressions")
+    parser.add_argument('--lazy', action='store_true', help="Stream bindings instead of listing them (huge binding sets)")
+    parser.add_argument('--output', default=None, help="Per-run records (JSON lines)")
+    args = parser.parse_args(argv)
+
+    accept = RandomSuccess(args.random_success, args.success_probability) if args.random_success else None
+    output = open(args.output, 'w', encoding='utf-8') if args.output else None
+
+    def write_result(result):
+        if output is not None:
+            record = dict(result, final_marking={
+                place: [[repr(value), count] for value, count in counts] for place, counts in result['final_marking'].items()
+            })
+            output.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    started = time.perf_counter()
+    try:
+        _, summary = run_batch(args.model, args.runs, args.max_steps, args.seed, args.workers, accept=accept,
+                               load_options={"remove_names": args.remove_names}, compiled=args.compiled,
+                               on_result=write_result, lazy=args.lazy)
+    finally:
+        if output is not None:
+            output.close()
+    seconds = time.perf_counter() - started
+
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+    print(f"{summary['runs']} runs in {seconds:.2f} s ({summary['runs'] / seconds:.1f} runs/sec), "
+          f"{summary['deadlocks']} ended in a deadlock")
+    return summary
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Graphviz layout computed once per net and reused for every step snapshot.
+
+The structure of a net never changes during a simulation, only the markings do.
+compute_layout() runs the layout engine once ("-Tplain" output); draw_snapshot() then
+either writes the SVG directly from the stored positions (no Graphviz call at all) or,
+for other formats, hands the fixed positions to "neato -n2", which skips the layout.
+"""
+import os
+import shlex
+import subprocess
+from xml.sax.saxutils import escape
+
+# Longer markings are cut in snapshot labels, so that they do not run over other nodes
+MAX_TOKEN_LABEL = 60
+POINTS_PER_INCH = 72
+
+_layouts = {}  # (structure key, engine) -> layout
+
+
+def structure_key(net):
+    """
+    Hashable description of the net structure (nodes and arcs, not markings).
+    """
+    return tuple(
+        (transition.name,
+         tuple((place.name, str(label)) for place, label in transition.input()),
+         tuple((place.name, str(label)) for place, label in transition.output()))
+        for transition in net.transition()
+    ) + tuple(sorted(place.name for place in net.place()))
+
+
+def parse_plain(text, nodemap):
+    """
+    Parses Graphviz "-Tplain" output. nodemap maps net node names to the Graphviz IDs
+    used by the gv plugin (node_0, node_1, ...). Coordinates are in inches, y grows upwards.
+    """
+    names = {node_id: name for name, node_id in nodemap.items()}
+    layout = {'width': 0.0, 'height': 0.0, 'nodes': {}, 'edges': []}
+    for line in text.splitlines():
+        fields = shlex.split(line)
+        if not fields:
+            continue
+        if fields[0] == 'graph':
+            layout['width'], layout['height'] = float(fields[2]), float(fields[3])
+        elif fields[0] == 'node':
+            _, node_id, x, y, width, height = fields[:6]
+            layout['nodes'][names[node_id]] = {
+                'x': float(x), 'y': float(y), 'width': float(width), 'height': float(height),
+                'shape': fields[8] if len(fields) > 8 else 'ellipse',
+            }
+        elif fields[0] == 'edge':
+            tail, head, count = fields[1], fields[2], int(fields[3])
+            coordinates = [float(value) for value in fields[4:4 + 2 * count]]
+            rest = fields[4 + 2 * count:]
+            edge = {
+                'tail': names[tail],
+                'head': names[head],
+                'points': list(zip(coordinates[0::2], coordinates[1::2])),
+                'label': None,
+            }
+            if len(rest) >= 5:  # label xl yl style color
+                edge['label'] = (rest[0], float(rest[1]), float(rest[2]))
+            layout['edges'].append(edge)
+    return layout
+
+
+def compute_layout(net, engine="dot"):
+    """
+    Runs the layout engine once on the net as drawn by the gv plugin.
+    """
+    graph = net.draw(None, engine)
+    process = subprocess.run([engine, "-Tplain"], input=graph.dot(), capture_output=True, text=True)
+    if process.returncode != 0:
+        raise IOError(f"{engine} exited with status {process.returncode}: {process.stderr.strip()}")
+    return parse_plain(process.stdout, graph.nodemap)
+
+
+def get_layout(net, engine="dot"):
+    """
+    Cached compute_layout(): nets with the same structure share one layout.
+    """
+    key = (structure_key(net), engine)
+    if key not in _layouts:
+        _layouts[key] = compute_layout(net, engine)
+    return _layouts[key]
+
+
+def token_label(place):
+    text = str(place.tokens)
+    if len(text) > MAX_TOKEN_LABEL:
+        text = text[:MAX_TOKEN_LABEL - 3] + "..."
+    return text
+
+
+def render_svg(net, layout):
+    """
+    Emits the SVG of the current marking from the stored layout.
+    """
+    height = layout['height'] * POINTS_PER_INCH
+    width = layout['width'] * POINTS_PER_INCH
+
+    def point(x, y):
+        return f"{x * POINTS_PER_INCH:.2f},{height - y * POINTS_PER_INCH:.2f}"
+
+    lines = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.0f}pt" height="{height:.0f}pt" '
+        f'viewBox="0 0 {width:.2f} {height:.2f}" font-family="Times,serif" font-size="14">',
+        '<defs><marker id="arrow" viewBox="0 0 10 10" refX="1" refY="5" markerWidth="8" markerHeight="8" '
+        'orient="auto"><path d="M0,0 L10,5 L0,10 z"/></marker></defs>',
+        f'<rect width="{width:.2f}" height="{height:.2f}" fill="white"/>',
+    ]
+
+    for edge in layout['edges']:
+        points = [point(x, y) for x, y in edge['points']]
+        path = f"M{points[0]} " + " ".join(
+            "C" + " ".join(points[i:i + 3]) for i in range(1, len(points) - 2, 3)
+        )
+        lines.append(f'<path d="{path}" fill="none" stroke="black" marker-end="url(#arrow)"/>')
+        if edge['label']:
+            text, x, y = edge['label']
+            lines.append(f'<text x="{x * POINTS_PER_INCH:.2f}" y="{height - y * POINTS_PER_INCH:.2f}" '
+                         f'text-anchor="middle">{escape(text)}</text>')
+
+    for place in net.place():
+        node = layout['nodes'][place.name]
+        cx, cy = node['x'] * POINTS_PER_INCH, height - node['y'] * POINTS_PER_INCH
+        lines.append(f'<ellipse cx="{cx:.2f}" cy="{cy:.2f}" rx="{node["width"] * POINTS_PER_INCH / 2:.2f}" '
+                     f'ry="{node["height"] * POINTS_PER_INCH / 2:.2f}" fill="white" stroke="black"/>')
+        lines.append(f'<text x="{cx:.2f}" y="{cy - 4:.2f}" text-anchor="middle">{escape(place.name)}</text>')
+        lines.append(f'<text x="{cx:.2f}" y="{cy + 12:.2f}" text-anchor="middle">{escape(token_label(place))}</text>')
+
+    for transition in net.transition():
+        node = layout['nodes'][transition.name]
+        w, h = node['width'] * POINTS_PER_INCH, node['height'] * POINTS_PER_INCH
+        cx, cy = node['x'] * POINTS_PER_INCH, height - node['y'] * POINTS_PER_INCH
+        lines.append(f'<rect x="{cx - w / 2:.2f}" y="{cy - h / 2:.2f}" width="{w:.2f}" height="{h:.2f}" '
+                     f'fill="white" stroke="black"/>')
+        lines.append(f'<text x="{cx:.2f}" y="{cy - 4:.2f}" text-anchor="middle">{escape(transition.name)}</text>')
+        lines.append(f'<text x="{cx:.2f}" y="{cy + 12:.2f}" text-anchor="middle">{escape(str(transition.guard))}</text>')
+
+    lines.append('</svg>')
+    return "\n".join(lines)
+
+
+def draw_snapshot(net, filename, layout=None, engine="dot"):
+    """
+    Drop-in replacement of net.draw(filename, engine) for step snapshots.
+    SVG files are written directly; other formats go through "neato -n2" with fixed node positions.
+    """
+    layout = layout or get_layout(net, engine)
+    if filename.lower().endswith(".svg"):
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write(render_svg(net, layout))
+        return
+
+    def pin(node, attr):
+        position = layout['nodes'][node.name]
+        attr['pos'] = f"{position['x'] * POINTS_PER_INCH:.2f},{position['y'] * POINTS_PER_INCH:.2f}!"
+
+    graph = net.draw(None, "neato", place_attr=pin, trans_attr=pin)
+    output_format = os.path.splitext(filename)[1].lstrip(".") or "png"
+    process = subprocess.run(["neato", "-n2", "-T" + output_format, "-o" + filename],
+                             input=graph.dot(), capture_output=True, text=True)
+    if process.returncode != 0:
+        raise IOError(f"neato exited with status {process.returncode}: {process.stderr.strip()}")
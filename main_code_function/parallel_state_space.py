@@ -0,0 +1,221 @@
+"""
+Multi-core state-space exploration.
+
+Every worker process builds its own copy of the net (SNAKES nets cannot be pickled)
+and owns one hash partition of the marking space: a marking belongs to worker
+crc32(marking) % workers. Exploration runs breadth-first, level by level:
+
+    1. every worker expands its frontier and sends each successor, in batches,
+       to the inbox of the worker owning it;
+    2. once all workers have reported how many batches they sent, each worker
+       receives exactly its share, deduplicates it and keeps the new markings as
+       its next frontier.
+
+The parent process only coordinates the levels and sums the statistics, which are
+the same as those of a sequential state_space.explore() run.
+
+Usage (from the repository root):
+    python -m main_code_function.parallel_state_space CPN_models/2/2-10NondeterministicProtocol.cpn --workers 8
+"""
+import argparse
+import multiprocessing
+import os
+import queue
+import time
+import traceback
+import zlib
+
+from main_code_function.model_cache import load_snakes_net
+from main_code_function.state_space import MarkingCodec, SuccessorGenerator
+
+DEFAULT_BATCH_SIZE = 1000
+REPLY_POLL_INTERVAL = 0.5  # Seconds between liveness checks while waiting for the workers
+
+
+def owner(marking, workers):
+    return zlib.crc32(marking) % workers
+
+
+def expand_frontier(generator, frontier, workers, batch_size, send):
+    """
+    Expands all markings of the frontier and hands the successors, in batches, to
+    send(destination, batch). Returns (batches sent per destination, edges, dead markings).
+    """
+    buffers = [[] for _ in range(workers)]
+    sent = [0] * workers
+    edges = 0
+    deadlocks = 0
+    for marking in frontier:
+        successors = generator.successors(marking)
+        if not successors:
+            deadlocks += 1
+        edges += len(successors)
+        for _, successor in successors:
+            destination = owner(successor, workers)
+            buffers[destination].append(successor)
+            if len(buffers[destination]) >= batch_size:
+                send(destination, buffers[destination])
+                buffers[destination] = []
+                sent[destination] += 1
+    for destination, buffer in enumerate(buffers):
+        if buffer:
+            send(destination, buffer)
+            sent[destination] += 1
+    return sent, edges, deadlocks
+
+
+def explore_worker(number, workers, file_path, load_options, commands, inboxes, results, batch_size):
+    """
+    Worker process: owns the markings of one hash partition. An exception ends the
+    worker with an ('error', number, traceback) reply.
+    """
+    try:
+        _, net, _, _ = load_snakes_net(file_path, **load_options)
+        generator = SuccessorGenerator(net)
+        seen = set()
+        frontier = []
+        inbox = inboxes[number]
+
+        while True:
+            command = commands.get()
+            if command[0] == 'stop':
+                break
+
+            if command[0] == 'expand':
+                sent, edges, deadlocks = expand_frontier(generator, frontier, workers, batch_size,
+                                                         lambda destination, batch: inboxes[destination].put(batch))
+                frontier = []
+                results.put(('expanded', number, sent, edges, deadlocks))
+
+            elif command[0] == 'receive':
+                _, expected = command
+                for _ in range(expected):
+                    for marking in inbox.get():
+                        if marking not in seen:
+                            seen.add(marking)
+                            frontier.append(marking)
+                results.put(('received', number, len(frontier), len(seen)))
+    except Exception:
+        # Reported instead of dying silently, see collect()
+        results.put(('error', number, traceback.format_exc()))
+
+
+def collect(results, kind, processes):
+    """
+    Waits for one reply of the given kind from every worker. Raises RuntimeError when a
+    worker reports an error and ConnectionError when one exits without replying.
+    """
+    replies = [None] * len(processes)
+    for _ in range(len(processes)):
+        while True:
+            try:
+                reply = results.get(timeout=REPLY_POLL_INTERVAL)
+                break
+            except queue.Empty:
+                for number, process in enumerate(processes):
+                    if replies[number] is None and not process.is_alive():
+                        raise ConnectionError(f"Worker {number} exited with code {process.exitcode} without replying.")
+        if reply[0] == 'error':
+            raise RuntimeError(f"Worker {reply[1]} failed:\n{reply[2]}")
+        if reply[0] != kind:
+            raise RuntimeError(f"Unexpected worker reply {reply[0]!r}, expected {kind!r}.")
+        replies[reply[1]] = reply
+    return replies
+
+
+def explore_parallel(file_path, workers=None, load_options=None, max_states=None, progress=None,
+                     batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Explores the state space of the model at file_path across worker processes.
+    max_states is checked after every BFS level, so a limited run may overshoot it.
+    progress(states, edges, frontier) is called after every level.
+    Returns the statistics dict of state_space.StateSpace.statistics() plus 'levels'.
+    """
+    workers = workers or os.cpu_count() or 1
+    load_options = load_options or {}
+    _, net, _, _ = load_snakes_net(file_path, **load_options)
+    initial = MarkingCodec(net).encode(net)
+
+    context = multiprocessing.get_context()
+    commands = [context.Queue() for _ in range(workers)]
+    inboxes = [context.Queue() for _ in range(workers)]
+    results = context.Queue()
+    processes = [
+        context.Process(target=explore_worker,
+                        args=(number, workers, file_path, load_options, commands[number], inboxes, results, batch_size),
+                        daemon=True)
+        for number in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    states = edges = deadlocks = levels = 0
+    complete = True
+    failed = True
+    try:
+        # The initial marking is delivered like any other successor
+        inboxes[owner(initial, workers)].put([initial])
+        expected = [0] * workers
+        expected[owner(initial, workers)] = 1
+
+        while True:
+            for number in range(workers):
+                commands[number].put(('receive', expected[number]))
+            received = collect(results, 'received', processes)
+            frontier = sum(reply[2] for reply in received)
+            states = sum(reply[3] for reply in received)
+            if progress is not None:
+                progress(states, edges, frontier)
+            if not frontier:
+                break
+            if max_states is not None and states >= max_states:
+                complete = False
+                break
+
+            for command_queue in commands:
+                command_queue.put(('expand',))
+            expanded = collect(results, 'expanded', processes)
+            expected = [sum(reply[2][number] for reply in expanded) for number in range(workers)]
+            edges += sum(reply[3] for reply in expanded)
+            deadlocks += sum(reply[4] for reply in expanded)
+            levels += 1
+        failed = False
+    finally:
+        if failed:
+            # The other workers may wait for batches that will never come
+            for process in processes:
+                process.terminate()
+            for pending in commands + inboxes:
+                pending.cancel_join_thread()
+        else:
+            for command_queue in commands:
+                command_queue.put(('stop',))
+        for process in processes:
+            process.join()
+
+    return {'states': states, 'edges': edges, 'deadlocks': deadlocks, 'complete': complete, 'levels': levels}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Explore the state space of a .cpn model on several cores.")
+    parser.add_argument('model', help="Path to the .cpn file")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes (default: CPU count)")
+    parser.add_argument('--max-states', type=int, default=None, help="Stop after the level reaching this many states")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Markings sent to another worker at once")
+    parser.add_argument('--remove-names', action='store_true', help="Drop the auxiliary 'Names' place")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+
+    def report(states, edges, frontier):
+        print(f"  {states} states, {edges} edges, {frontier} waiting ({time.perf_counter() - started:.1f} s)")
+
+    statistics = explore_parallel(args.model, args.workers, {"remove_names": args.remove_names}, args.max_states,
+                                  report, args.batch_size)
+    print(f"{statistics['states']} states, {statistics['edges']} edges, {statistics['deadlocks']} dead markings "
+          f"in {time.perf_counter() - started:.2f} s" + ("" if statistics['complete'] else " (limit reached, incomplete)"))
+    return statistics
+
+
+if __name__ == "__main__":
+    main()
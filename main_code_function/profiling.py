@@ -0,0 +1,272 @@
+"""
+Built-in profiling of the conversion pipeline and of the simulation loop.
+
+Pipeline phases (load_cpn_file, the get_* extractors, create_colset_functions,
+create_snakes_net, ...) are decorated with @profiled; while no profiler is enabled
+the wrapper only reads one module global before calling the function. A Simulator
+created with a profiler (or while one is enabled) records per transition:
+    modes  evaluations of transition.modes() and their time
+    guard  guard evaluations (while computing modes, drawing or firing)
+    draw   time spent by choose() on the transition, mode evaluation excluded
+    fire   firings and their time
+
+Measurements nest: "time" includes the nested measurements, "own_time" does not.
+The results are exported as JSON (to_dict/dump_json) or as a stats file in the
+format of cProfile, which pstats.Stats (or snakeviz) can read (dump_stats).
+
+Usage (from the repository root):
+    python -m main_code_function.profiling CPN_models/2/2-10NondeterministicProtocol.cpn --steps 1000 \\
+        --json profile.json --stats profile.prof
+"""
+import argparse
+import functools
+import json
+import marshal
+import random
+import time
+
+PIPELINE = "pipeline"  # Label of the pipeline phases
+
+_active = None  # Enabled profiler, see Profiler.enable
+
+
+def active_profiler():
+    return _active
+
+
+def profiled(function):
+    """
+    Decorator recording the calls of a pipeline phase in the enabled profiler.
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        profiler = _active
+        if profiler is None:
+            return function(*args, **kwargs)
+        profiler.start((PIPELINE, function.__name__))
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profiler.stop()
+    return wrapper
+
+
+class Entry:
+    """
+    Statistics of one measured key: calls, total time, own time and the calls per caller.
+    """
+    __slots__ = ("calls", "time", "own_time", "callers")
+
+    def __init__(self):
+        self.calls = 0
+        self.time = 0.0
+        self.own_time = 0.0
+        self.callers = {}  # Caller key -> [calls, time, own time]
+
+    def to_dict(self):
+        return {"calls": self.calls, "time": self.time, "own_time": self.own_time}
+
+
+class Measure:
+    """
+    Context manager form of Profiler.start/stop.
+    """
+    __slots__ = ("profiler", "key")
+
+    def __init__(self, profiler, key):
+        self.profiler = profiler
+        self.key = key
+
+    def __enter__(self):
+        self.profiler.start(self.key)
+
+    def __exit__(self, *exc_info):
+        self.profiler.stop()
+
+
+class CountingGuard:
+    """
+    Stands in for the guard of a transition and measures every evaluation.
+    """
+
+    def __init__(self, guard, profiler, transition_name):
+        self.guard = guard
+        self.profiler = profiler
+        self.key = (transition_name, "guard")
+
+    def __call__(self, binding):
+        self.profiler.start(self.key)
+        try:
+            return self.guard(binding)
+        finally:
+            self.profiler.stop()
+
+    def __getattr__(self, name):
+        return getattr(self.guard, name)
+
+
+class Profiler:
+    """
+    Collects Entry statistics keyed by (label, kind): (PIPELINE, phase name) for the
+    pipeline and (transition name, "modes" | "guard" | "draw" | "fire") for simulations.
+    Used as a context manager it is enabled on entry; on exit it is disabled and the
+    guards of attached nets are restored.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.entries = {}
+        self._stack = []  # [key, start, time of nested measurements]
+        self._guards = []  # (transition, original guard) of attached nets
+
+    def enable(self):
+        global _active
+        _active = self
+        return self
+
+    def disable(self):
+        global _active
+        if _active is self:
+            _active = None
+
+    def __enter__(self):
+        return self.enable()
+
+    def __exit__(self, *exc_info):
+        self.disable()
+        self.detach()
+
+    def start(self, key):
+        self._stack.append([key, self.clock(), 0.0])
+
+    def stop(self):
+        key, started, nested = self._stack.pop()
+        elapsed = self.clock() - started
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = Entry()
+        entry.calls += 1
+        entry.time += elapsed
+        entry.own_time += elapsed - nested
+        if self._stack:
+            parent = self._stack[-1]
+            parent[2] += elapsed
+            caller = entry.callers.get(parent[0])
+            if caller is None:
+                caller = entry.callers[parent[0]] = [0, 0.0, 0.0]
+            caller[0] += 1
+            caller[1] += elapsed
+            caller[2] += elapsed - nested
+
+    def measure(self, label, kind):
+        return Measure(self, (label, kind))
+
+    def attach(self, net):
+        """
+        Replaces the guards of the transitions of net by counting proxies.
+        """
+        for transition in net.transition():
+            if not isinstance(transition.guard, CountingGuard):
+                self._guards.append((transition, transition.guard))
+                transition.guard = CountingGuard(transition.guard, self, transition.name)
+
+    def detach(self):
+        """
+        Restores the original guards of all attached nets.
+        """
+        for transition, guard in reversed(self._guards):
+            transition.guard = guard
+        self._guards = []
+
+    def to_dict(self):
+        """
+        JSON-ready statistics: {"phases": {name: stats}, "transitions": {name: {kind: stats}}}.
+        """
+        phases = {}
+        transitions = {}
+        for (label, kind), entry in sorted(self.entries.items()):
+            if label == PIPELINE:
+                phases[kind] = entry.to_dict()
+            else:
+                transitions.setdefault(label, {})[kind] = entry.to_dict()
+        return {"phases": phases, "transitions": transitions}
+
+    def dump_json(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+
+    def pstats_dict(self):
+        """
+        Statistics in the layout of cProfile.Profile().stats:
+        {(file, line, function): (primitive calls, calls, own time, time, callers)}.
+        """
+        return {
+            stats_key(key): (entry.calls, entry.calls, entry.own_time, entry.time, {
+                stats_key(caller): (calls, calls, own_time, elapsed)
+                for caller, (calls, elapsed, own_time) in entry.callers.items()
+            })
+            for key, entry in self.entries.items()
+        }
+
+    def dump_stats(self, path):
+        """
+        Writes a file readable by pstats.Stats(path).
+        """
+        with open(path, "wb") as f:
+            marshal.dump(self.pstats_dict(), f)
+
+    def summary(self, limit=20):
+        """
+        Text table of the entries with the highest own time.
+        """
+        lines = [f"{'calls':>10} {'time (s)':>10} {'own (s)':>10}  name"]
+        ranked = sorted(self.entries.items(), key=lambda item: item[1].own_time, reverse=True)
+        for (label, kind), entry in ranked[:limit]:
+            lines.append(f"{entry.calls:>10} {entry.time:>10.4f} {entry.own_time:>10.4f}  {label}: {kind}")
+        return "\n".join(lines)
+
+
+def stats_key(key):
+    # pstats prints keys as "file:line(function)"
+    label, kind = key
+    return (f"<{label}>", 0, kind)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile the conversion and a random simulation of a .cpn model.")
+    parser.add_argument('model', help="Path to the .cpn file")
+    parser.add_argument('--steps', type=int, default=1000, help="Number of simulation steps (0 only profiles the conversion)")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the simulation")
+    parser.add_argument('--remove-names', action='store_true', help="Drop the auxiliary 'Names' place")
+    parser.add_argument('--compiled', action='store_true', help="Compile guards and arc expressions")
+    parser.add_argument('--lazy', action='store_true', help="Stream bindings instead of listing them")
+    parser.add_argument('--json', default=None, help="Write the statistics as JSON")
+    parser.add_argument('--stats', default=None, help="Write a pstats-compatible file")
+    parser.add_argument('--limit', type=int, default=20, help="Rows of the printed summary")
+    args = parser.parse_args(argv)
+
+    # The decorators read the globals of the imported module, not those of __main__
+    from main_code_function.profiling import Profiler
+    from main_code_function.functions_for_parsing import collect_all_data, get_globbox_block, get_page_block, load_cpn_file
+    from main_code_function.simulator import Simulator
+    from main_code_function.snakes_engine_main import create_colset_functions, create_snakes_net
+
+    with Profiler() as profiler:
+        root = load_cpn_file(args.model)
+        data = collect_all_data(get_page_block(root), get_globbox_block(root))
+        colset_functions = create_colset_functions(data["colsets"])
+        net, _, _ = create_snakes_net(data, colset_functions, args.remove_names, args.compiled)
+        simulator = Simulator(net, random.Random(args.seed), lazy=args.lazy)
+        steps = simulator.run(args.steps)
+
+    print(profiler.summary(args.limit))
+    print(f"{steps} steps simulated")
+    if args.json:
+        profiler.dump_json(args.json)
+    if args.stats:
+        profiler.dump_stats(args.stats)
+    return profiler
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+"""
+Headless simulation of nets built by create_snakes_net.
+
+The modes of a transition only depend on the marking of its input places, so after
+a firing only the transitions reading from the places touched by that firing have
+to be re-evaluated; the modes of all other transitions are kept.
+
+Transition priorities follow CPN Tools: only the enabled transitions of the highest
+priority level (smallest number) can fire. Transitions are indexed by priority level,
+and the modes of a lower level are only evaluated when no higher level is enabled.
+
+choose() draws one enabled binding without listing all of them: transitions whose
+number of modes is known are skipped as a whole (weighted reservoir sampling over
+blocks), and with lazy=True the modes are never materialised, but streamed by
+iter_modes().
+
+With a profiler (see profiling.py) the time spent per transition on evaluating modes,
+drawing and firing is measured, and guard evaluations are counted.
+
+Firings can be recorded into a compact trace of (transition name, binding items)
+pairs, which replay() fires again on a freshly built net without calling modes(),
+and/or streamed to a binary trace file (see trace_format.py).
+"""
+import itertools
+import logging
+import random
+from functools import reduce
+
+from snakes import DomainError, ModeError
+from snakes.data import Substitution
+
+from main_code_function.event_log import log_event
+from main_code_function.profiling import active_profiler
+from main_code_function.snakes_engine_main import transition_priority
+
+
+class Simulator:
+    """
+    Keeps the modes of every transition cached and recomputes them incrementally.
+    Within a priority level transitions are kept in net.transition() order, so for
+    nets without priorities available() lists the (transition, binding) pairs in the
+    same order as the run scripts used to.
+    With record=True every firing is appended to self.trace, with a trace_writer
+    (trace_format.TraceWriter) it is written to disk.
+    With lazy=True the lists of modes are never built: bindings are streamed and only
+    their number is kept per transition.
+    profiler (profiling.Profiler, by default the enabled one) replaces the guards of net
+    by counting proxies until profiler.detach() is called.
+    With a logger every firing is logged as a structured "fire" event (INFO level, see
+    event_log.py).
+    """
+
+    def __init__(self, net, rng=None, record=False, trace_writer=None, lazy=False, profiler=None, logger=None):
+        self.net = net
+        self.logger = logger
+        self.lazy = lazy
+        self.profiler = profiler if profiler is not None else active_profiler()
+        if self.profiler is not None:
+            self.profiler.attach(net)
+        self.rng = rng if rng is not None else random.Random()
+        self.transitions = list(net.transition())
+        self.steps = 0
+        self.record = record
+        self.trace = []
+        self.trace_writer = trace_writer
+
+        # Priority levels, highest first: [(priority, [transitions])]
+        levels = {}
+        for transition in self.transitions:
+            levels.setdefault(transition_priority(transition), []).append(transition)
+        self.levels = sorted(levels.items(), key=lambda level: level[0])
+
+        # Place name -> transitions having the place as input
+        readers = {}
+        for transition in self.transitions:
+            for place, _ in transition.input():
+                readers.setdefault(place.name, []).append(transition.name)
+
+        # Transition name -> transitions whose modes may change when it fires
+        self._affected = {}
+        for transition in self.transitions:
+            touched = {place.name for place, _ in transition.input()}
+            touched.update(place.name for place, _ in transition.output())
+            self._affected[transition.name] = {name for place in touched for name in readers.get(place, [])}
+
+        self._modes = {}
+        self._counts = {}  # Transition name -> number of modes
+        self._dirty = {transition.name for transition in self.transitions}
+
+    def invalidate(self, place_names=None):
+        """
+        Marks cached modes as stale after the marking was changed outside of fire(),
+        either for the readers of the given places or for the whole net.
+        """
+        if place_names is None:
+            self._dirty = {transition.name for transition in self.transitions}
+            return
+        place_names = set(place_names)
+        for transition in self.transitions:
+            if any(place.name in place_names for place, _ in transition.input()):
+                self._dirty.add(transition.name)
+
+    def _refresh(self, name):
+        # Drops the cached modes and count of a transition whose marking has changed
+        if name in self._dirty:
+            self._dirty.discard(name)
+            self._modes.pop(name, None)
+            self._counts.pop(name, None)
+
+    def modes(self, transition):
+        """
+        Cached equivalent of transition.modes().
+        """
+        self._refresh(transition.name)
+        modes = self._modes.get(transition.name)
+        if modes is None:
+            if self.profiler is None:
+                modes = transition.modes()
+            else:
+                with self.profiler.measure(transition.name, "modes"):
+                    modes = transition.modes()
+            self._modes[transition.name] = modes
+            self._counts[transition.name] = len(modes)
+        return modes
+
+    def bindings(self, transition):
+        """
+        Iterator over the modes of transition: the cached list, or with lazy=True a
+        stream that does not keep them.
+        """
+        self._refresh(transition.name)
+        modes = self._modes.get(transition.name)
+        if modes is None and not self.lazy:
+            modes = self.modes(transition)
+        return iter(modes) if modes is not None else iter_modes(transition)
+
+    def count(self, transition):
+        """
+        Number of modes of transition (streamed once and counted with lazy=True).
+        """
+        self._refresh(transition.name)
+        count = self._counts.get(transition.name)
+        if count is None:
+            if self.lazy and self.profiler is None:
+                count = self._counts[transition.name] = sum(1 for _ in iter_modes(transition))
+            elif self.lazy:
+                with self.profiler.measure(transition.name, "modes"):
+                    count = self._counts[transition.name] = sum(1 for _ in iter_modes(transition))
+            else:
+                count = len(self.modes(transition))
+        return count
+
+    def available(self):
+        """
+        Returns the enabled (transition, binding) pairs of the highest enabled priority level.
+        """
+        for _, transitions in self.levels:
+            available = [(transition, binding) for transition in transitions for binding in self.modes(transition)]
+            if available:
+                return available
+        return []
+
+    def iter_available(self):
+        """
+        Generator version of available(). The marking must not change while it is consumed.
+        """
+        for _, transitions in self.levels:
+            enabled = False
+            for transition in transitions:
+                for binding in self.bindings(transition):
+                    enabled = True
+                    yield transition, binding
+            if enabled:
+                return
+
+    def choose(self, weights=None):
+        """
+        Draws one enabled (transition, binding) pair of the highest enabled priority
+        level, without building the list of all pairs. Returns None in a deadlock.
+        weights is None (uniform over all bindings), a dict {transition name: weight
+        of each of its bindings} or a function weight(transition, binding).
+        """
+        profiler = self.profiler
+        for _, transitions in self.levels:
+            enabled = False
+            reservoir = [0.0, None]  # [total weight, chosen (transition, binding or None)]
+            for transition in transitions:
+                if profiler is None:
+                    number = self._offer(transition, weights, reservoir)
+                else:
+                    with profiler.measure(transition.name, "draw"):
+                        number = self._offer(transition, weights, reservoir)
+                enabled = enabled or number > 0
+
+            chosen = reservoir[1]
+            if chosen is not None and chosen[1] is None:
+                # Only the chosen binding of the chosen block is looked up
+                transition = chosen[0]
+                if profiler is None:
+                    chosen = (transition, self._binding_at(transition))
+                else:
+                    with profiler.measure(transition.name, "draw"):
+                        chosen = (transition, self._binding_at(transition))
+            if enabled:
+                return chosen
+        return None
+
+    def _offer(self, transition, weights, reservoir):
+        """
+        Offers the bindings of transition to the weighted reservoir of choose().
+        Returns the number of modes of the transition.
+        """
+        rng = self.rng
+        if weights is None:
+            weight = 1
+        elif isinstance(weights, dict):
+            weight = weights.get(transition.name, 1)
+        else:
+            weight = None  # Per binding
+        self._refresh(transition.name)
+        count = self._counts.get(transition.name)
+        if count is None and not self.lazy:
+            count = self.count(transition)
+
+        if weight is not None and count is not None:
+            # All bindings weigh the same: the transition is one block of the reservoir
+            if count and weight > 0:
+                reservoir[0] += weight * count
+                if rng.random() * reservoir[0] < weight * count:
+                    reservoir[1] = (transition, None)
+            return count
+
+        number = 0
+        for binding in self.bindings(transition):
+            number += 1
+            binding_weight = weight if weight is not None else weights(transition, binding)
+            if binding_weight > 0:
+                reservoir[0] += binding_weight
+                if rng.random() * reservoir[0] < binding_weight:
+                    reservoir[1] = (transition, binding)
+        self._counts[transition.name] = number
+        return number
+
+    def _binding_at(self, transition):
+        # Uniformly drawn binding of a transition whose number of modes is known
+        index = self.rng.randrange(self._counts[transition.name])
+        return next(itertools.islice(self.bindings(transition), index, None))
+
+    def fire(self, transition, binding):
+        """
+        Fires the transition and invalidates only the modes that may have changed.
+        """
+        if self.profiler is None:
+            self._fire(transition, binding)
+        else:
+            with self.profiler.measure(transition.name, "fire"):
+                self._fire(transition, binding)
+        self._fired(transition, binding)
+
+    def _fire(self, transition, binding):
+        """
+        Moves the tokens of a firing (overridden by TimedSimulator).
+        """
+        transition.fire(binding)
+
+    def _fired(self, transition, binding):
+        """
+        Bookkeeping after a firing: stale modes, step counter, log and trace.
+        """
+        self._dirty.update(self._affected[transition.name])
+        self.steps += 1
+        if self.logger is not None and self.logger.isEnabledFor(logging.INFO):
+            log_event(self.logger, logging.INFO, "fire", "Fired '%s' with binding %s", transition.name, binding,
+                      step=self.steps, transition=transition.name, binding=binding)
+        if self.record or self.trace_writer is not None:
+            items = tuple(binding.items())
+            if self.record:
+                self.trace.append((transition.name, items))
+            if self.trace_writer is not None:
+                self.trace_writer.write_step(self.steps, transition.name, items, self.rng)
+
+    def step(self):
+        """
+        Fires one randomly chosen enabled binding.
+        Returns the fired (transition, binding) pair, or None in a deadlock.
+        """
+        chosen = self.choose()
+        if chosen is None:
+            return None
+        self.fire(*chosen)
+        return chosen
+
+    def run(self, max_steps, on_step=None):
+        """
+        Runs up to max_steps random steps; on_step(step, transition, binding) is called after each firing.
+        Returns the number of steps performed.
+        """
+        for step in range(max_steps):
+            fired = self.step()
+            if fired is None:
+                return step
+            if on_step is not None:
+                on_step(step, *fired)
+        return max_steps
+
+
+def iter_modes(transition):
+    """
+    Generator version of transition.modes(): the same bindings in the same order,
+    produced one at a time. Only the (small) per-arc matches are kept in memory,
+    their cross product is never built.
+    """
+    parts = []
+    try:
+        for place, label in transition.input():
+            parts.append(label.modes(place.tokens))
+    except ModeError:
+        return
+    if not parts:
+        return  # Same as SNAKES: a transition without inputs has no modes
+    for combination in itertools.product(*parts):
+        try:
+            binding = reduce(Substitution.__add__, combination)
+            if transition._check(binding, False, False):
+                yield binding
+        except DomainError:
+            pass
+
+
+def replay(net, trace):
+    """
+    Fires the recorded trace on net, which must be built from the same model as the
+    recorded one and be in its initial marking.
+    Yields (step, transition, binding) after each firing, steps are counted from 1.
+    """
+    for step, (transition_name, items) in enumerate(trace, start=1):
+        transition = net.transition(transition_name)
+        binding = Substitution(dict(items))
+        transition.fire(binding)
+        yield step, transition, binding
@@ -1,9 +1,22 @@
-from snakes.nets import Place, MultiSet, Transition, Expression, Variable, Tuple
+from snakes.nets import Place, MultiSet, Transition, Expression, Variable, Tuple, MultiArc, Token
 from snakes.plugins import *
 import snakes.plugins
 snakes.plugins.load('gv', 'snakes.nets', 'nets')
 from nets import PetriNet
 import re
+import ast
+import builtins
+from main_code_function.ml_expressions import (
+    arc_label_form, build_arc_label, guard_to_python, marking_counts, ml_to_python, split_time_delays
+)
+from main_code_function.profiling import profiled
+
+# Bump whenever the conversion of parsed data into net forms changes (invalidates cached models).
+CONVERTER_VERSION = "6"
+
+# Standard CPN Tools priorities; a smaller number means a higher priority.
+PRIORITIES = {"P_HIGH": 100, "P_NORMAL": 1000, "P_LOW": 10000}
+P_NORMAL = PRIORITIES["P_NORMAL"]
 
 # Universal normalization function subtype_contents.
 def normalize_subtype_contents(contents):
@@ -51,6 +64,7 @@ def check_list(token, base_types):
         return all(isinstance(item, int) for item in token)
     return True
 
+@profiled
 def create_colset_functions(colsets):
     colset_functions = {}
     for colset in colsets:
@@ -58,7 +72,7 @@ def create_colset_functions(colsets):
         colset_type = colset["subtype"]
         subtype_contents = normalize_subtype_contents(colset.get("subtype_contents", ""))
         if colset_type == "unit":
-            colset_functions[colset_name] = lambda x: x == "unit"
+            colset_functions[colset_name] = lambda x: x == "unit" or x == ()
         elif colset_type == "bool":
             colset_functions[colset_name] = lambda x: isinstance(x, bool)
         elif colset_type == "int":
@@ -87,62 +101,29 @@ def create_colset_functions(colsets):
             colset_functions[colset_name] = lambda x: True
     return colset_functions
 
+def multiset_from_counts(counts):
+    """
+    Builds a MultiSet from (token, count) pairs without expanding the counts.
+    """
+    tokens = MultiSet()
+    for token, count in counts:
+        tokens._add(token, count)
+    return tokens
+
+def multiset_counts(tokens):
+    """
+    Returns the (token, count) pairs of a MultiSet.
+    """
+    return list(dict.items(tokens))
+
 def parse_initmark(initmark, values_dict=None):
+    """
+    Parses an initial marking straight into counted form, e.g. 100000`() is one
+    entry with count 100000. Names declared with "val" are resolved.
+    """
     if not initmark:
         return MultiSet()
-    if values_dict and initmark in values_dict:
-        initmark = values_dict[initmark]
-    flattened_tokens = []
-    parts = initmark.split("++")
-    token_pattern = r"(\d+)`(.+)"  # For example: 1`(1, “COL”) or 2`B
-    for part in parts:
-        match = re.match(token_pattern, part.strip())
-        if match:
-            count = int(match.group(1))
-            value = match.group(2).strip()
-            if value.startswith("(") and value.endswith(")"):
-                inner = value[1:-1]
-                items = [v.strip() for v in re.split(r",(?![^()]*\))", inner)]
-                parsed_items = []
-                for item in items:
-                    if item.startswith('"') and item.endswith('"'):
-                        parsed_items.append(item[1:-1])
-                    elif item.isdigit():
-                        parsed_items.append(int(item))
-                    else:
-                        parsed_items.append(item)
-                token = tuple(parsed_items)
-            elif value.startswith("{") and value.endswith("}"):
-                inner = value[1:-1].strip()
-                pairs = [p.strip() for p in inner.split(",")]
-                record = {}
-                for pair in pairs:
-                    if "=" in pair:
-                        key, val = pair.split("=")
-                        key = key.strip()
-                        val = val.strip()
-                        if val.startswith('"') and val.endswith('"'):
-                            val = val[1:-1]
-                        elif val.isdigit():
-                            val = int(val)
-                        record[key] = val
-                token = frozenset(record.items())
-            elif value.startswith("[") and value.endswith("]"):
-                inner = value[1:-1].strip()
-                token = tuple() if inner == "" else tuple([v.strip() for v in re.split(r',(?![^"]*")', inner)])
-            else:
-                if value.startswith('"') and value.endswith('"'):
-                    token = value[1:-1]
-                elif value.isdigit():
-                    token = int(value)
-                else:
-                    token = value
-            flattened_tokens.extend([token] * count)
-        else:
-            val = part.strip()
-            token = tuple() if val == "[]" else val
-            flattened_tokens.append(token)
-    return MultiSet(flattened_tokens)
+    return multiset_from_counts(marking_counts(initmark, values_dict).items())
 
 def create_variables(data):
     variables = {}
@@ -160,132 +141,193 @@ def convert_condition(condition):
     """
     if not condition:
         return None
-    condition = condition.strip("[]").strip()
-    if condition.startswith("#"):
-        parts = condition.split()
-        if len(parts) >= 3:
-            field = parts[0][1:]
-            var = parts[1]
-            rest = " ".join(parts[2:])
-            return f"dict({var})['{field}'] {rest}"
-    condition = condition.replace("<>", "!=")
-    condition = condition.replace("!==", "!=")
-    condition = re.sub(r'(?<![!<>=])=(?![=])', "==", condition)
-    return condition
+    return guard_to_python(condition)
+
+def resolve_priority(priority, values_dict=None):
+    """
+    Resolves a transition priority inscription ("P_HIGH", "P_LOW + 1", "50", ...) to an integer.
+    Transitions without a priority get P_NORMAL.
+    """
+    if not priority:
+        return P_NORMAL
+    env = {}
+    for name, value in (values_dict or {}).items():
+        try:
+            env[name] = int(value)
+        except (TypeError, ValueError):
+            continue
+    env.update(PRIORITIES)
+    try:
+        return int(eval(ml_to_python(priority), {"__builtins__": {}}, env))
+    except Exception as e:
+        raise ValueError(f"Cannot resolve transition priority '{priority}': {e}") from e
+
+def transition_priority(transition):
+    """
+    Priority of a SNAKES transition built by build_snakes_net (P_NORMAL for other nets).
+    """
+    return getattr(transition, "priority", P_NORMAL)
 
 def convert_ml_if_expression(expr):
-    expr = expr.replace("^", "+")
-    if_match = re.match(r"if (.+?) then (.+?) else (.+)", expr)
-    if if_match:
-        condition = if_match.group(1).strip()
-        then_expr = if_match.group(2).strip()
-        else_expr = if_match.group(3).strip()
-        condition = re.sub(r"(?<![=!])=(?!=)", "==", condition)
-        then = parse_token_expression(then_expr)
-        else_ = "[]" if else_expr == "empty" else parse_token_expression(else_expr)
-        return f"({then} if {condition} else {else_})"
-    return expr
+    return ml_to_python(expr)
 
 def parse_token_expression(expr):
-    token_pattern = r"(\d+)`(.+)"
-    match = re.match(token_pattern, expr)
-    if match:
-        count = int(match.group(1))
-        value = match.group(2).strip()
-        return f"[{value}]*{count}"
-    return expr.replace("^", "+")
+    return ml_to_python(expr)
 
 def convert_expression(expr):
-    pattern = r"#(\w+)\s+(\w+)"
-    def repl(match):
-        field = match.group(1)
-        var = match.group(2)
-        return f"dict({var})['{field}']"
-    return re.sub(pattern, repl, expr)
+    return ml_to_python(expr)
 
 def parse_arc_expression(expression, arc_type):
+    """
+    Converts an arc inscription into a SNAKES arc label (the translation is memoized).
+    Time delays ("@+ delay", on the whole inscription or on each "++" term) are not
+    part of the label, see timed.py.
+    """
     if not expression:
         return None
-    expression = expression.strip()
-    if expression.startswith("if") and "then" in expression and "else" in expression:
-        if_match = re.match(r"if .+? then (.+?) else .+", expression)
-        if if_match:
-            then_expr = if_match.group(1).strip()
-            return parse_arc_expression(then_expr, arc_type)
-    if expression == "empty":
-        return MultiSet()
-    if "::" in expression:
-        parts = [p.strip() for p in expression.split("::")]
-        parts = [p.replace("#name", "").strip() for p in parts]
-        return Tuple([Variable(p) for p in parts])
-    token_pattern = r"(\d+)`(.+)"
-    match = re.match(token_pattern, expression)
-    if match:
-        count = int(match.group(1))
-        value = match.group(2).strip()
-    else:
-        value = expression
-    if '^' in value:
-        value = value.replace("^", "+")
-        return Expression(value)
-    # If the string starts with “(” and ends with “)”:
-    if value.startswith("(") and value.endswith(")"):
-        inner = value[1:-1].strip()
-        if "," in inner:
-            items = [i.strip() for i in inner.split(",")]
-            return Tuple([Variable(i) for i in items])
-        else:
-            return Variable(inner)
-    if re.search(r"[+*/-]", value):
-        value = convert_expression(value)
-        return Expression(value)
-    return Variable(value)
+    terms = split_time_delays(expression.strip())
+    if any(delay is not None for _, delay in terms):
+        expression = " ++ ".join(term for term, _ in terms)
+    return build_arc_label(arc_label_form(expression, arc_type))
 
-def create_snakes_net(data, colset_functions, remove_names=False):
-    net = PetriNet("CPN_Model")
-    places_info = []
+class CompiledExpression(Expression):
+    """
+    Expression compiled once into a Python function of its free variables.
+    Evaluating a binding is a plain function call with local variables instead of
+    eval() with the binding as a locals dictionary.
+    """
+
+    def __init__(self, expr):
+        Expression.__init__(self, expr)
+        self._function = None
+        self._function_env = None
+
+    def _compile(self):
+        # Compiled against the net namespace, so this happens lazily, after the net is built
+        env = self.globals._env
+        tree = ast.parse(self._str, mode="eval")
+        loaded = {node.id for node in ast.walk(tree) if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load)}
+        stored = {node.id for node in ast.walk(tree) if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store)}
+        free = loaded - stored  # Names bound inside the expression (comprehensions) are not free
+        names = sorted(name for name in free if name not in env and not hasattr(builtins, name))
+        # Global or builtin names (max, id, len, ...) may still be variables of the transition,
+        # the binding takes precedence as in Expression; the defaults are looked up once here
+        shadowed = sorted(free - set(names))
+        lines = ["def __compiled__(__binding__" + "".join(f", {name}={name}" for name in shadowed) + "):"]
+        lines.extend(f"    {name} = __binding__.get({name!r}, {name})" for name in shadowed)
+        if names:
+            lines.append("    try:")
+            lines.extend(f"        {name} = __binding__[{name!r}]" for name in names)
+            lines.append("    except KeyError as error:")
+            lines.append("        raise NameError(f'name {error.args[0]!r} is not defined')")
+        lines.append(f"    return ({self._str})")
+        namespace = {}
+        exec(compile("\n".join(lines), "<compiled expression>", "exec"), env, namespace)
+        self._function = namespace["__compiled__"]
+        self._function_env = env
+        return self._function
+
+    def __call__(self, binding):
+        if self._true:
+            return True
+        function = self._function if self._function_env is self.globals._env else self._compile()
+        return function(binding._dict)
+
+    def bind(self, binding):
+        return Token(self(binding))
+
+    def substitute(self, binding):
+        Expression.substitute(self, binding)
+        self._function = None
+        self._function_env = None
+
+def compile_arc_label(label):
+    """
+    Returns the arc label with every Expression replaced by a CompiledExpression.
+    """
+    if isinstance(label, CompiledExpression) or label is None:
+        return label
+    if isinstance(label, Expression):
+        return CompiledExpression(str(label))
+    if isinstance(label, Tuple):
+        return Tuple([compile_arc_label(component) for component in label])
+    if isinstance(label, MultiArc):
+        return MultiArc([compile_arc_label(component) for component in label])
+    return label
+
+def convert_place_tokens(place, values_dict):
+    """
+    Converts the initial marking of one parsed place into a MultiSet.
+    """
+    tokens = parse_initmark(place["initmark"], values_dict)
+    if place["type"] == "INTsum":
+        tokens = multiset_from_counts(
+            (int(t) if isinstance(t, str) and t.isdigit() else t, count) for t, count in multiset_counts(tokens)
+        )
+    return tokens
+
+@profiled
+def convert_model(data, remove_names=False):
+    """
+    Converts parsed data into net-ready forms: initial markings, Python guards and arc labels.
+    This is the expensive, purely textual part of create_snakes_net.
+    """
     values_dict = {val["name"]: val["value"] for val in data.get("values", [])}
-    variables = create_variables(data)
-    # Create places (if remove_names=True, the “Names” place is not added)
+    places = []
+    # Convert places (if remove_names=True, the “Names” place is not added)
     for place in data["places"]:
         if remove_names and str(place["text"]) == "Names":
             continue
-        place_name = str(place["text"])
-        place_type = place["type"]
-        initmark = place["initmark"]
-        is_valid_func = colset_functions.get(place_type, lambda x: True)
-        tokens = parse_initmark(initmark, values_dict)
-        if place_type == "INTsum":
-            new_tokens = []
-            for t in tokens:
-                if isinstance(t, str) and t.isdigit():
-                    new_tokens.append(int(t))
-                else:
-                    new_tokens.append(t)
-            tokens = MultiSet(new_tokens)
-        net.add_place(Place(place_name, tokens=tokens, check=is_valid_func))
-        places_info.append((place_name, tokens, place_type))
-    # Create transitions
-    for transition in data["transitions"]:
-        transition_name = str(transition["text"])
-        condition = convert_condition(transition["condition"])
-        if condition:
-            net.add_transition(Transition(transition_name, guard=Expression(condition)))
-        else:
-            net.add_transition(Transition(transition_name))
-    # Create arcs (if remove_names=True, arcs related to “Names” are not added)
+        places.append((str(place["text"]), place["type"], convert_place_tokens(place, values_dict)))
+    # Convert transition guards and priorities
+    transitions = [
+        (str(t["text"]), convert_condition(t["condition"]), resolve_priority(t.get("priority"), values_dict))
+        for t in data["transitions"]
+    ]
+    # Convert arcs (if remove_names=True, arcs related to “Names” are not added)
     places_dict = {p["place_id"]: str(p["text"]) for p in data["places"] if not (remove_names and str(p["text"])=="Names")}
     transitions_dict = {t["transition_id"]: str(t["text"]) for t in data["transitions"]}
+    arcs = []
     for arc in data["arcs"]:
         arc_type = arc["orientation"]
-        place_id = arc["placeend"]
-        transition_id = arc["transend"]
-        expression = arc["expression"]
-        place_name = places_dict.get(place_id)
-        transition_name = transitions_dict.get(transition_id)
+        place_name = places_dict.get(arc["placeend"])
+        transition_name = transitions_dict.get(arc["transend"])
         if not place_name or not transition_name:
             continue
-        arc_label = parse_arc_expression(expression, arc_type)
+        arcs.append((place_name, transition_name, arc_type, parse_arc_expression(arc["expression"], arc_type)))
+    return {"places": places, "transitions": transitions, "arcs": arcs}
+
+@profiled
+def build_snakes_net(converted, colset_functions, compiled=False):
+    """
+    Builds the SNAKES net from the output of convert_model.
+    With compiled=True, guards and arc expressions are CompiledExpression objects.
+    """
+    expression_class = CompiledExpression if compiled else Expression
+    net = PetriNet("CPN_Model")
+    places_info = []
+    # Create places
+    for place_name, place_type, tokens in converted["places"]:
+        is_valid_func = colset_functions.get(place_type, lambda x: True)
+        place = Place(place_name, check=is_valid_func)
+        # Each distinct token is checked once and the counts are copied as they are
+        # (Place(tokens=...) would iterate over every single token)
+        place.check(dict.keys(tokens))
+        place.tokens = multiset_from_counts(multiset_counts(tokens))
+        net.add_place(place)
+        places_info.append((place_name, tokens, place_type))
+    # Create transitions
+    for transition_name, condition, priority in converted["transitions"]:
+        if condition:
+            transition = Transition(transition_name, guard=expression_class(condition))
+        else:
+            transition = Transition(transition_name)
+        transition.priority = priority
+        net.add_transition(transition)
+    # Create arcs
+    for place_name, transition_name, arc_type, arc_label in converted["arcs"]:
+        if compiled:
+            arc_label = compile_arc_label(arc_label)
         if arc_type == "PtoT":
             net.add_input(place_name, transition_name, arc_label)
         elif arc_type == "TtoP":
@@ -293,4 +335,10 @@ def create_snakes_net(data, colset_functions, remove_names=False):
         elif arc_type == "BOTHDIR":
             net.add_input(place_name, transition_name, arc_label)
             net.add_output(place_name, transition_name, arc_label)
-    return net, places_info, variables
\ No newline at end of file
+    return net, places_info
+
+@profiled
+def create_snakes_net(data, colset_functions, remove_names=False, compiled=False):
+    variables = create_variables(data)
+    net, places_info = build_snakes_net(convert_model(data, remove_names), colset_functions, compiled)
+    return net, places_info, variables
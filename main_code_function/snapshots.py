@@ -0,0 +1,147 @@
+"""
+Deferred rendering of simulation snapshots.
+
+The simulation only records a trace (see Simulator(record=True)); the pictures are
+drawn afterwards from that trace, in a process pool, so the speed of a run does not
+depend on Graphviz at all. Every worker rebuilds the net from the (cached) model,
+replays the trace up to its first snapshot and draws its share of the steps.
+With fixed_layout the Graphviz layout is computed once and only the markings are
+re-drawn per step (see net_layout.py); SVG output then needs no Graphviz call at all.
+
+Usage (from the repository root):
+    python -m main_code_function.snapshots run.trace --every 10 --workers 4
+    python -m main_code_function.snapshots run.trace --output "img/step_{step}_{transition}.svg" --fixed-layout
+"""
+import argparse
+import os
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from main_code_function.model_cache import load_snakes_net
+from main_code_function.net_layout import draw_snapshot, get_layout
+from main_code_function.simulator import replay
+from main_code_function.trace_format import TraceWriter, read_trace
+
+DEFAULT_OUTPUT_PATTERN = "img/step_{step}_{transition}.png"
+
+
+def save_trace(path, file_path, trace, load_options=None):
+    """
+    Writes an in-memory trace (Simulator.trace) as a binary trace file, together with
+    what is needed to rebuild the net it was recorded on.
+    """
+    with TraceWriter(path, file_path, load_options) as writer:
+        for step, (transition_name, items) in enumerate(trace, start=1):
+            writer.write_step(step, transition_name, items)
+
+
+def load_trace(path):
+    header, steps = read_trace(path)
+    return {
+        "file_path": header["file_path"],
+        "load_options": header["load_options"],
+        "trace": [(transition_name, items) for _, transition_name, items, _ in steps],
+    }
+
+
+def snapshot_steps(trace_length, every=1):
+    """
+    Steps to draw: every Nth step, the last step is always included.
+    """
+    steps = list(range(every, trace_length + 1, every))
+    if trace_length and (not steps or steps[-1] != trace_length):
+        steps.append(trace_length)
+    return steps
+
+
+def render_chunk(task):
+    """
+    Worker: rebuilds the net, replays the trace and draws the requested steps.
+    Returns the list of written files.
+    """
+    file_path, load_options, trace, steps, output_pattern, engine, layout = task
+    _, net, _, _ = load_snakes_net(file_path, **load_options)
+    wanted = set(steps)
+    written = []
+    for step, transition, _ in replay(net, trace[:steps[-1]]):
+        if step in wanted:
+            output_path = output_pattern.format(step=step, transition=transition.name)
+            if layout is not None:
+                draw_snapshot(net, output_path, layout, engine)
+            else:
+                net.draw(output_path, engine=engine)
+            written.append(output_path)
+    return written
+
+
+def render_trace(file_path, trace, output_pattern=DEFAULT_OUTPUT_PATTERN, every=1, workers=None, engine="dot",
+                 load_options=None, fixed_layout=False):
+    """
+    Draws the snapshots of a recorded trace across a process pool.
+    The steps are split into contiguous chunks, one per worker, so that each worker
+    replays the trace only once. With fixed_layout the layout is computed here, once,
+    and shared by all workers. Returns the list of written files.
+    """
+    steps = snapshot_steps(len(trace), every)
+    if not steps:
+        return []
+    output_dir = os.path.dirname(output_pattern)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    layout = None
+    if fixed_layout:
+        _, net, _, _ = load_snakes_net(file_path, **(load_options or {}))
+        layout = get_layout(net, engine)
+
+    workers = workers or os.cpu_count() or 1
+    chunk_size = -(-len(steps) // workers)
+    tasks = [
+        (file_path, load_options or {}, trace, steps[i:i + chunk_size], output_pattern, engine, layout)
+        for i in range(0, len(steps), chunk_size)
+    ]
+    written = []
+    with ProcessPoolExecutor(max_workers=len(tasks)) as pool:
+        for files in pool.map(render_chunk, tasks):
+            written.extend(files)
+    return written
+
+
+def render_in_subprocess(trace_path, output_pattern=DEFAULT_OUTPUT_PATTERN, every=1, workers=None, fixed_layout=False,
+                         wait=True):
+    """
+    Runs the renderer as "python -m main_code_function.snapshots" in a separate process.
+    Meant for the top-level run scripts, which cannot start a process pool themselves
+    (spawned workers would re-run the whole script on import).
+    """
+    command = [sys.executable, "-m", "main_code_function.snapshots", trace_path,
+               "--output", output_pattern, "--every", str(every)]
+    if workers:
+        command += ["--workers", str(workers)]
+    if fixed_layout:
+        command.append("--fixed-layout")
+    if wait:
+        return subprocess.run(command, check=False).returncode
+    return subprocess.Popen(command)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render snapshots of a recorded simulation trace.")
+    parser.add_argument('trace', help="Binary trace file (trace_format.py)")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT_PATTERN, help="Output path pattern with {step} and {transition}")
+    parser.add_argument('--every', type=int, default=1, help="Draw every Nth step (the last step is always drawn)")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes (default: CPU count)")
+    parser.add_argument('--engine', default="dot", help="Graphviz layout engine")
+    parser.add_argument('--fixed-layout', action='store_true', help="Compute the layout once and re-draw only the markings")
+    args = parser.parse_args(argv)
+
+    saved = load_trace(args.trace)
+    written = render_trace(saved["file_path"], saved["trace"], args.output, args.every, args.workers,
+                           args.engine, saved["load_options"], args.fixed_layout)
+    print(f"Rendered {len(written)} snapshots of {len(saved['trace'])} steps.")
+    return written
+
+
+if __name__ == "__main__":
+    main()
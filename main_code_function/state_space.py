@@ -0,0 +1,426 @@
+"""
+State-space (reachability graph) exploration of nets built by create_snakes_net.
+
+Markings are encoded canonically into byte strings: one length-prefixed segment per
+place (in sorted place order), each holding the sorted encodings of its distinct
+tokens with their multiplicities. The encoding is structural (it does not depend on
+hashing or on object identity), so equal markings give equal bytes in any process.
+
+States are deduplicated in a dict keyed by these bytes; arcs are kept as integer
+edge lists (source state, target state, transition index).
+
+Usage (from the repository root):
+    python -m main_code_function.state_space CPN_models/1/2-1DeterministicProtocol.cpn --order bfs
+"""
+import argparse
+import struct
+import time
+from array import array
+from collections import deque
+
+from snakes.nets import MultiSet
+
+from main_code_function.model_cache import load_snakes_net
+from main_code_function.snakes_engine_main import multiset_from_counts, transition_priority
+
+# Decoded segments and computed modes are memoized; the caches are dropped when they grow over this
+CACHE_LIMIT = 200000
+
+
+def encode_varint(number, out):
+    while number > 0x7F:
+        out.append((number & 0x7F) | 0x80)
+        number >>= 7
+    out.append(number)
+
+
+def decode_varint(data, offset):
+    number = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        number |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return number, offset
+        shift += 7
+
+
+def encode_value(value, out):
+    """
+    Canonical encoding of one token value (ints, strings, booleans, floats, None,
+    tuples and frozensets, i.e. everything the converter produces).
+    """
+    if value is True or value is False:
+        out.append(ord('T') if value else ord('F'))
+    elif value is None:
+        out.append(ord('N'))
+    elif isinstance(value, int):
+        out.append(ord('i'))
+        encode_varint(value << 1 if value >= 0 else ((-value) << 1) - 1, out)  # zigzag
+    elif isinstance(value, str):
+        blob = value.encode("utf-8")
+        out.append(ord('s'))
+        encode_varint(len(blob), out)
+        out.extend(blob)
+    elif isinstance(value, tuple):
+        out.append(ord('t'))
+        encode_varint(len(value), out)
+        for component in value:
+            encode_value(component, out)
+    elif isinstance(value, frozenset):
+        parts = []
+        for component in value:
+            part = bytearray()
+            encode_value(component, part)
+            parts.append(bytes(part))
+        out.append(ord('f'))
+        encode_varint(len(parts), out)
+        for part in sorted(parts):
+            out.extend(part)
+    elif isinstance(value, float):
+        out.append(ord('d'))
+        out.extend(struct.pack('<d', value))
+    else:
+        raise TypeError(f"Cannot encode token value {value!r}")
+
+
+def value_key(value):
+    """
+    Hashable key telling apart values that compare equal but encode differently, at any
+    depth: (1,), (True,) and (1.0,) are equal tuples with different encodings.
+    """
+    if isinstance(value, tuple):
+        return tuple, tuple(value_key(component) for component in value)
+    if isinstance(value, frozenset):
+        return frozenset, frozenset(value_key(component) for component in value)
+    return type(value), value
+
+
+def decode_value(data, offset):
+    tag = chr(data[offset])
+    offset += 1
+    if tag == 'T':
+        return True, offset
+    if tag == 'F':
+        return False, offset
+    if tag == 'N':
+        return None, offset
+    if tag == 'i':
+        number, offset = decode_varint(data, offset)
+        return (number >> 1) if not number & 1 else -((number + 1) >> 1), offset
+    if tag == 's':
+        length, offset = decode_varint(data, offset)
+        return bytes(data[offset:offset + length]).decode("utf-8"), offset + length
+    if tag in ('t', 'f'):
+        length, offset = decode_varint(data, offset)
+        components = []
+        for _ in range(length):
+            component, offset = decode_value(data, offset)
+            components.append(component)
+        return (tuple(components) if tag == 't' else frozenset(components)), offset
+    if tag == 'd':
+        return struct.unpack_from('<d', data, offset)[0], offset + 8
+    raise ValueError(f"Unknown token value tag {tag!r}")
+
+
+class MarkingCodec:
+    """
+    Encodes/decodes markings of one net. Value encodings and decoded segments are cached.
+    """
+
+    def __init__(self, net):
+        self.place_names = sorted(place.name for place in net.place())
+        self.place_index = {name: index for index, name in enumerate(self.place_names)}
+        self._values = {}
+        self._segments = {}
+
+    def encode_value(self, value):
+        key = value_key(value)
+        blob = self._values.get(key)
+        if blob is None:
+            out = bytearray()
+            encode_value(value, out)
+            blob = self._values[key] = bytes(out)
+        return blob
+
+    def encode_tokens(self, tokens):
+        """
+        Segment of one place: length prefix, then (value, count) pairs in canonical order.
+        """
+        body = bytearray()
+        for blob, count in sorted((self.encode_value(value), count) for value, count in dict.items(tokens) if count):
+            body += blob
+            encode_varint(count, body)
+        out = bytearray()
+        encode_varint(len(body), out)
+        out += body
+        return bytes(out)
+
+    def decode_tokens(self, segment):
+        """
+        MultiSet of a segment. Results are shared, so they must not be modified in place.
+        """
+        tokens = self._segments.get(segment)
+        if tokens is None:
+            _, offset = decode_varint(segment, 0)
+            counts = []
+            while offset < len(segment):
+                value, offset = decode_value(segment, offset)
+                count, offset = decode_varint(segment, offset)
+                counts.append((value, count))
+            if len(self._segments) >= CACHE_LIMIT:
+                self._segments.clear()
+            tokens = self._segments[segment] = multiset_from_counts(counts)
+        return tokens
+
+    def split(self, marking):
+        """
+        Splits an encoded marking into per-place segments (in place_names order).
+        """
+        segments = []
+        offset = 0
+        while offset < len(marking):
+            length, body = decode_varint(marking, offset)
+            segments.append(marking[offset:body + length])
+            offset = body + length
+        return segments
+
+    def encode(self, net):
+        return b"".join(self.encode_tokens(net.place(name).tokens) for name in self.place_names)
+
+    def decode(self, marking):
+        """
+        Returns {place name: MultiSet} of an encoded marking.
+        """
+        return {name: MultiSet(self.decode_tokens(segment)) for name, segment in zip(self.place_names, self.split(marking))}
+
+
+def unique_modes(modes):
+    """
+    modes() without repetitions: SNAKES returns a binding once per way of matching
+    equal tokens, which would otherwise become parallel edges.
+    """
+    unique = {}
+    for binding in modes:
+        unique.setdefault(frozenset(binding.items()), binding)
+    return list(unique.values())
+
+
+class SuccessorGenerator:
+    """
+    Computes the successors of encoded markings. The net is only used to evaluate
+    modes(); successor markings are computed from the arc flows without firing, and
+    modes are memoized per transition by the segments of its input places.
+    Priorities are honoured: lower priority levels are only tried when no transition
+    of a higher level is enabled.
+    """
+
+    def __init__(self, net, codec=None):
+        self.net = net
+        self.codec = codec or MarkingCodec(net)
+        self.transitions = list(net.transition())
+        index = self.codec.place_index
+        self._inputs = []
+        self._arcs = []
+        for transition in self.transitions:
+            self._inputs.append([index[place.name] for place, _ in transition.input()])
+            self._arcs.append((
+                [(index[place.name], place, label) for place, label in transition.input()],
+                [(index[place.name], place, label) for place, label in transition.output()],
+            ))
+        self._loaded = [None] * len(self.codec.place_names)  # Segment currently set as tokens of each place
+        self._places = [net.place(name) for name in self.codec.place_names]
+        self._modes = [{} for _ in self.transitions]
+        levels = {}
+        for number, transition in enumerate(self.transitions):
+            levels.setdefault(transition_priority(transition), []).append(number)
+        self._levels = [levels[priority] for priority in sorted(levels)]
+
+    def load(self, segments, place_indices):
+        for index in place_indices:
+            if self._loaded[index] != segments[index]:
+                self._places[index].tokens = self.codec.decode_tokens(segments[index])
+                self._loaded[index] = segments[index]
+
+    def successors(self, marking):
+        """
+        Returns the list of (transition index, successor marking) of an encoded marking.
+        """
+        codec = self.codec
+        segments = codec.split(marking)
+        result = []
+        for level in self._levels:
+            if result:
+                break
+            for number in level:
+                transition = self.transitions[number]
+                inputs = self._inputs[number]
+                key = b"".join(segments[index] for index in inputs)
+                cache = self._modes[number]
+                modes = cache.get(key)
+                if modes is None:
+                    self.load(segments, inputs)
+                    modes = unique_modes(transition.modes())
+                    if len(cache) >= CACHE_LIMIT:
+                        cache.clear()
+                    cache[key] = modes
+                if not modes:
+                    continue
+
+                inputs_arcs, outputs_arcs = self._arcs[number]
+                for binding in modes:
+                    changed = {}
+                    for index, place, label in inputs_arcs:
+                        tokens = changed.get(index)
+                        if tokens is None:
+                            tokens = codec.decode_tokens(segments[index])
+                        changed[index] = tokens - label.flow(binding)
+                    for index, place, label in outputs_arcs:
+                        tokens = changed.get(index)
+                        if tokens is None:
+                            tokens = codec.decode_tokens(segments[index])
+                        flow = label.flow(binding)
+                        place.check(flow)
+                        changed[index] = tokens + flow
+                    successor = list(segments)
+                    for index, tokens in changed.items():
+                        successor[index] = codec.encode_tokens(tokens)
+                    result.append((number, b"".join(successor)))
+        return result
+
+
+class StateSpace:
+    """
+    Result of explore(). State 0 is the initial marking; edges are parallel integer
+    arrays (edge_sources[i] --edge_transitions[i]--> edge_targets[i]).
+    """
+
+    def __init__(self, codec, transition_names):
+        self.codec = codec
+        self.transition_names = transition_names
+        self.index = {}  # Encoded marking -> state number
+        self.markings = []
+        self.edge_sources = array('l')
+        self.edge_targets = array('l')
+        self.edge_transitions = array('l')
+        self.deadlocks = []
+        self.complete = False
+
+    def add_state(self, marking):
+        """
+        Returns (state number, True if the state is new).
+        """
+        state = self.index.get(marking)
+        if state is not None:
+            return state, False
+        state = self.index[marking] = len(self.markings)
+        self.markings.append(marking)
+        return state, True
+
+    def add_edge(self, source, target, transition):
+        self.edge_sources.append(source)
+        self.edge_targets.append(target)
+        self.edge_transitions.append(transition)
+
+    @property
+    def num_states(self):
+        return len(self.markings)
+
+    @property
+    def num_edges(self):
+        return len(self.edge_sources)
+
+    def marking(self, state):
+        return self.codec.decode(self.markings[state])
+
+    def successors(self, state):
+        """
+        Yields (transition name, target state) of all edges leaving state (linear scan).
+        """
+        for source, target, transition in zip(self.edge_sources, self.edge_targets, self.edge_transitions):
+            if source == state:
+                yield self.transition_names[transition], target
+
+    def statistics(self):
+        return {
+            'states': self.num_states,
+            'edges': self.num_edges,
+            'deadlocks': len(self.deadlocks),
+            'complete': self.complete,
+        }
+
+
+def explore(net, order="bfs", max_states=None, max_edges=None, progress=None, progress_every=10000):
+    """
+    Explores the reachability graph from the current marking of net, breadth-first
+    (order="bfs") or depth-first (order="dfs"). Exploration stops when max_states or
+    max_edges is reached, StateSpace.complete then stays False.
+    progress(states, edges, frontier) is called every progress_every new states.
+    The marking of net is restored afterwards.
+    """
+    if order not in ("bfs", "dfs"):
+        raise ValueError(f"Unknown exploration order '{order}', expected 'bfs' or 'dfs'.")
+    initial = {place.name: place.tokens for place in net.place()}
+    generator = SuccessorGenerator(net)
+    space = StateSpace(generator.codec, [transition.name for transition in generator.transitions])
+
+    frontier = deque()
+    pop = frontier.popleft if order == "bfs" else frontier.pop
+    start, _ = space.add_state(generator.codec.encode(net))
+    frontier.append(start)
+    limited = False
+
+    try:
+        while frontier:
+            state = pop()
+            successors = generator.successors(space.markings[state])
+            if not successors:
+                space.deadlocks.append(state)
+            for transition, marking in successors:
+                if max_edges is not None and space.num_edges >= max_edges:
+                    limited = True
+                    break
+                target, new = space.add_state(marking)
+                space.add_edge(state, target, transition)
+                if new:
+                    frontier.append(target)
+                    if progress is not None and space.num_states % progress_every == 0:
+                        progress(space.num_states, space.num_edges, len(frontier))
+                    if max_states is not None and space.num_states >= max_states:
+                        limited = True
+                        break
+            if limited:
+                break
+    finally:
+        for name, tokens in initial.items():
+            net.place(name).tokens = tokens
+
+    space.complete = not limited
+    return space
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Explore the state space of a .cpn model.")
+    parser.add_argument('model', help="Path to the .cpn file")
+    parser.add_argument('--order', choices=("bfs", "dfs"), default="bfs", help="Exploration order")
+    parser.add_argument('--max-states', type=int, default=None, help="Stop after this many states")
+    parser.add_argument('--max-edges', type=int, default=None, help="Stop after this many edges")
+    parser.add_argument('--remove-names', action='store_true', help="Drop the auxiliary 'Names' place")
+    args = parser.parse_args(argv)
+
+    _, net, _, _ = load_snakes_net(args.model, remove_names=args.remove_names)
+    started = time.perf_counter()
+
+    def report(states, edges, frontier):
+        print(f"  {states} states, {edges} edges, {frontier} waiting ({time.perf_counter() - started:.1f} s)")
+
+    space = explore(net, args.order, args.max_states, args.max_edges, report)
+    statistics = space.statistics()
+    print(f"{statistics['states']} states, {statistics['edges']} edges, {statistics['deadlocks']} dead markings "
+          f"in {time.perf_counter() - started:.2f} s" + ("" if space.complete else " (limit reached, incomplete)"))
+    return statistics
+
+
+if __name__ == "__main__":
+    main()
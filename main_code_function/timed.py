@@ -0,0 +1,212 @@
+"""
+Timed CPN simulation.
+
+The SNAKES net itself stays untimed: its places only hold the tokens that are ready,
+i.e. whose time stamp is not later than the current model time. Tokens produced
+with a delay ("@+ delay" on the transition or on an output arc) wait in a heap-based
+event queue and are put into their place when the clock reaches their time stamp.
+Enabling is therefore evaluated only at the current model time, and when nothing is
+enabled the clock jumps straight to the next event.
+
+An output arc may delay its whole multiset ("(1`x ++ 1`y)@+5") or each term on its own
+("1`x@+5 ++ 1`y@+3"); the terms of the latter are evaluated one by one when firing.
+
+Delays only apply to places of timed color sets; if a model declares no timed color
+set at all, they apply to every place.
+"""
+import builtins
+import heapq
+import itertools
+
+from main_code_function.ml_expressions import ml_to_python, split_time_delay, split_time_delays
+from main_code_function.simulator import Simulator
+from main_code_function.snakes_engine_main import parse_arc_expression
+
+
+def delay_text(inscription):
+    """
+    Delay part of a transition time inscription ("@+5" -> "5"), or None.
+    """
+    if not inscription:
+        return None
+    _, delay = split_time_delay(inscription.strip())
+    return delay
+
+
+class DelayExpression:
+    """
+    Delay evaluated against a binding; constant delays are evaluated only once.
+    """
+
+    def __init__(self, text, net, values):
+        self.text = text
+        self.code = compile(ml_to_python(text), f"<delay {text}>", "eval")
+        self.globals = dict(net.globals._env)
+        self.globals.setdefault("__builtins__", builtins)
+        self.values = values
+        self.constant = None
+        if not self.code.co_names or set(self.code.co_names) <= set(values):
+            self.constant = eval(self.code, self.globals, dict(values))
+
+    def __call__(self, binding):
+        if self.constant is not None:
+            return self.constant
+        env = dict(self.values)
+        env.update(binding.dict())
+        return eval(self.code, self.globals, env)
+
+
+class TimedSimulator(Simulator):
+    """
+    Simulator with a global clock (self.time) and an event queue of delayed tokens.
+    data is the parsed model (load_snakes_net/stream_all_data), which provides the
+    time inscriptions of transitions and arcs and the timed color sets. The other
+    arguments are those of Simulator.
+    """
+
+    def __init__(self, net, data, rng=None, start_time=0, record=False, trace_writer=None, lazy=False, profiler=None,
+                 logger=None):
+        super().__init__(net, rng, record, trace_writer, lazy, profiler, logger)
+        self.time = start_time
+        self._events = []  # Heap of (time stamp, sequence number, place name, token)
+        self._sequence = itertools.count()
+
+        values = {}
+        for value in data.get("values", []):
+            try:
+                values[value["name"]] = int(value["value"])
+            except (TypeError, ValueError):
+                continue
+
+        transitions = {t["transition_id"]: str(t["text"]) for t in data["transitions"]}
+        places = {p["place_id"]: (str(p["text"]), p["type"]) for p in data["places"]}
+        node_names = {transition.name for transition in self.transitions}
+
+        self._transition_delays = {}
+        for transition in data["transitions"]:
+            text = delay_text(transition.get("time"))
+            if text and str(transition["text"]) in node_names:
+                self._transition_delays[str(transition["text"])] = DelayExpression(text, net, values)
+
+        self._arc_delays = {}  # (place, transition) -> [(term label or None for the arc label, delay or None)]
+        for arc in data["arcs"]:
+            if arc["orientation"] not in ("TtoP", "BOTHDIR") or not arc["expression"]:
+                continue
+            terms = split_time_delays(arc["expression"].strip())
+            place = places.get(arc["placeend"])
+            transition_name = transitions.get(arc["transend"])
+            if not place or not transition_name or all(delay is None for _, delay in terms):
+                continue
+            self._arc_delays[(place[0], transition_name)] = [
+                (None if len(terms) == 1 else self._term_label(term, arc["orientation"]),
+                 DelayExpression(delay, net, values) if delay else None)
+                for term, delay in terms
+            ]
+
+        timed_colsets = {colset["name"] for colset in data.get("colsets", []) if colset.get("timed")}
+        self._timed_places = {
+            name for name, place_type in places.values() if not timed_colsets or place_type in timed_colsets
+        }
+
+    def _term_label(self, term, arc_type):
+        # Label of one term of a timed multiset, evaluated in the namespace of the net
+        label = parse_arc_expression(term, arc_type)
+        if hasattr(label, "globals"):
+            label.globals.attach(self.net.globals)
+        return label
+
+    @property
+    def pending(self):
+        """
+        Number of tokens waiting in the event queue.
+        """
+        return len(self._events)
+
+    def next_event_time(self):
+        return self._events[0][0] if self._events else None
+
+    def schedule(self, place_name, token, time_stamp):
+        """
+        Puts a token into place_name at time_stamp (immediately if it is not in the future).
+        """
+        if time_stamp <= self.time:
+            self.net.place(place_name).add([token])
+            self.invalidate([place_name])
+        else:
+            heapq.heappush(self._events, (time_stamp, next(self._sequence), place_name, token))
+
+    def advance(self):
+        """
+        Moves the clock to the next event and releases every token due at that time.
+        Returns False when the event queue is empty.
+        """
+        if not self._events:
+            return False
+        self.time = self._events[0][0]
+        released = set()
+        while self._events and self._events[0][0] <= self.time:
+            _, _, place_name, token = heapq.heappop(self._events)
+            self.net.place(place_name).add([token])
+            released.add(place_name)
+        self.invalidate(released)
+        return True
+
+    def available(self):
+        """
+        Bindings enabled at the current model time; when there are none, the clock
+        jumps to the next event until something is enabled or no event is left.
+        """
+        while True:
+            available = super().available()
+            if available or not self.advance():
+                return available
+
+    def choose(self, weights=None):
+        """
+        Simulator.choose() at the current model time, advancing the clock like available().
+        """
+        while True:
+            chosen = super().choose(weights)
+            if chosen is not None or not self.advance():
+                return chosen
+
+    def _fire(self, transition, binding):
+        """
+        Fires at the current model time: inputs are consumed now, outputs with a
+        positive delay are scheduled, the others are put into their places at once.
+        """
+        if not transition.enabled(binding):
+            raise ValueError(f"transition not enabled for {binding}")
+        for place, label in transition.input():
+            place.remove(label.flow(binding))
+
+        transition_delay = self._transition_delays.get(transition.name)
+        base_delay = transition_delay(binding) if transition_delay is not None else 0
+        for place, label in transition.output():
+            for term_label, arc_delay in self._arc_delays.get((place.name, transition.name), ((None, None),)):
+                tokens = (label if term_label is None else term_label).flow(binding)
+                delay = base_delay + (arc_delay(binding) if arc_delay is not None else 0)
+                if delay > 0 and place.name in self._timed_places:
+                    place.check(tokens)
+                    for token in tokens:
+                        heapq.heappush(self._events, (self.time + delay, next(self._sequence), place.name, token))
+                else:
+                    place.add(tokens)
+
+    def run_until(self, end_time, max_steps=None, on_step=None):
+        """
+        Runs random steps until the clock passes end_time, nothing is enabled or
+        max_steps is reached. on_step(step, time, transition, binding) is called after each firing.
+        Returns the number of steps performed.
+        """
+        steps = 0
+        while max_steps is None or steps < max_steps:
+            chosen = self.choose()
+            if chosen is None or self.time > end_time:
+                break
+            transition, binding = chosen
+            self.fire(transition, binding)
+            if on_step is not None:
+                on_step(steps, self.time, transition, binding)
+            steps += 1
+        return steps
@@ -0,0 +1,231 @@
+"""
+Compact binary format for simulation traces.
+
+A trace file starts with TRACE_MAGIC and a header (model path and load options),
+followed by a stream of records, each starting with a one-byte tag:
+
+    TAG_TRANSITION  name                        defines the next transition ID
+    TAG_VARIABLE    name                        defines the next variable ID
+    TAG_VALUE       pickled token value         defines the next value ID
+    TAG_RNG         pickled RNG state           state after the step that follows
+    TAG_STEP        step delta, transition ID, binding size, (variable ID, value ID)*
+
+Transitions, variable names and token values are interned: each one is written once,
+the first time it is used, and steps only refer to them by ID. All integers are
+unsigned LEB128 varints, so a typical step takes a few bytes.
+"""
+import pickle
+
+from main_code_function.model_cache import load_snakes_net
+from main_code_function.simulator import replay
+
+TRACE_MAGIC = b"PSTRC\x01"
+TRACE_SUFFIX = ".trace"
+
+TAG_TRANSITION = 1
+TAG_VARIABLE = 2
+TAG_VALUE = 3
+TAG_RNG = 4
+TAG_STEP = 5
+
+
+def encode_varint(number, out):
+    while number > 0x7F:
+        out.append((number & 0x7F) | 0x80)
+        number >>= 7
+    out.append(number)
+
+
+def decode_varint(data, offset):
+    number = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        number |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return number, offset
+        shift += 7
+
+
+def encode_bytes(blob, out):
+    encode_varint(len(blob), out)
+    out.extend(blob)
+
+
+def value_key(value):
+    """
+    Interning key of a token value. 1, 1.0 and True are equal in Python but must
+    not share an ID, so everything except plain ints and strings is keyed by its pickle.
+    """
+    if type(value) is int or type(value) is str:
+        return type(value), value
+    return pickle.dumps(value, protocol=4)
+
+
+class TraceWriter:
+    """
+    Streams steps to a trace file. With rng_state_every=N the RNG state is stored
+    after every Nth step, so a run can be continued from there after a replay.
+    """
+
+    def __init__(self, path, file_path=None, load_options=None, rng_state_every=0, buffer_size=1 << 20):
+        self.path = path
+        self.rng_state_every = rng_state_every
+        self._file = open(path, "wb", buffering=buffer_size)
+        self._transitions = {}
+        self._variables = {}
+        self._values = {}
+        self._last_step = 0
+        self.steps = 0
+
+        header = bytearray(TRACE_MAGIC)
+        encode_bytes(pickle.dumps({"file_path": file_path, "load_options": load_options or {}}, protocol=4), header)
+        self._file.write(header)
+
+    @staticmethod
+    def _define(table, key, tag, payload, out):
+        number = table[key] = len(table)
+        out.append(tag)
+        encode_bytes(payload, out)
+        return number
+
+    def write_step(self, step, transition_name, binding_items, rng=None):
+        out = bytearray()
+        transition_id = self._transitions.get(transition_name)
+        if transition_id is None:
+            transition_id = self._define(self._transitions, transition_name, TAG_TRANSITION,
+                                         transition_name.encode("utf-8"), out)
+        step_record = bytearray((TAG_STEP,))
+        encode_varint(step - self._last_step, step_record)
+        encode_varint(transition_id, step_record)
+        encode_varint(len(binding_items), step_record)
+        for name, value in binding_items:
+            variable_id = self._variables.get(name)
+            if variable_id is None:
+                variable_id = self._define(self._variables, name, TAG_VARIABLE, name.encode("utf-8"), out)
+            key = value_key(value)
+            value_id = self._values.get(key)
+            if value_id is None:
+                value_id = self._define(self._values, key, TAG_VALUE, pickle.dumps(value, protocol=4), out)
+            encode_varint(variable_id, step_record)
+            encode_varint(value_id, step_record)
+        out += step_record
+        self._last_step = step
+        self.steps += 1
+
+        if rng is not None and self.rng_state_every and self.steps % self.rng_state_every == 0:
+            out.append(TAG_RNG)
+            encode_bytes(pickle.dumps(rng.getstate(), protocol=4), out)
+        self._file.write(out)
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_trace_header(data):
+    if not data.startswith(TRACE_MAGIC):
+        raise ValueError("Not a trace file (bad header).")
+    length, offset = decode_varint(data, len(TRACE_MAGIC))
+    header = pickle.loads(data[offset:offset + length])
+    return header, offset + length
+
+
+def iter_trace(data):
+    """
+    Decodes the records of a trace file contents.
+    Yields (step, transition_name, binding_items, rng_state); rng_state is None
+    unless the state was stored after that step.
+    """
+    _, offset = read_trace_header(data)
+    transitions, variables, values = [], [], []
+    step = 0
+    pending = None  # Decoded step waiting for a possible TAG_RNG record
+    size = len(data)
+    while offset < size:
+        tag = data[offset]
+        offset += 1
+        if tag == TAG_STEP:
+            if pending is not None:
+                yield pending
+            # Step records are almost always single-byte varints, decode those inline
+            delta = data[offset]
+            if delta < 0x80:
+                offset += 1
+            else:
+                delta, offset = decode_varint(data, offset)
+            transition_id = data[offset]
+            if transition_id < 0x80:
+                offset += 1
+            else:
+                transition_id, offset = decode_varint(data, offset)
+            count, offset = decode_varint(data, offset)
+            items = []
+            for _ in range(count):
+                variable_id = data[offset]
+                if variable_id < 0x80:
+                    offset += 1
+                else:
+                    variable_id, offset = decode_varint(data, offset)
+                value_id = data[offset]
+                if value_id < 0x80:
+                    offset += 1
+                else:
+                    value_id, offset = decode_varint(data, offset)
+                items.append((variables[variable_id], values[value_id]))
+            step += delta
+            pending = (step, transitions[transition_id], tuple(items), None)
+            continue
+
+        length, offset = decode_varint(data, offset)
+        payload = data[offset:offset + length]
+        offset += length
+        if tag == TAG_TRANSITION:
+            transitions.append(payload.decode("utf-8"))
+        elif tag == TAG_VARIABLE:
+            variables.append(payload.decode("utf-8"))
+        elif tag == TAG_VALUE:
+            values.append(pickle.loads(payload))
+        elif tag == TAG_RNG:
+            pending = pending[:3] + (pickle.loads(payload),)
+        else:
+            raise ValueError(f"Unknown trace record tag {tag} at offset {offset}.")
+    if pending is not None:
+        yield pending
+
+
+def read_trace(path):
+    """
+    Reads a whole trace file. Returns (header, steps) with steps as in iter_trace.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    header, _ = read_trace_header(data)
+    return header, list(iter_trace(data))
+
+
+def replay_trace(path, net=None):
+    """
+    Replays a trace file deterministically, without calling modes().
+    Without net, the net is rebuilt from the model stored in the header.
+    Returns (net, last_rng_state).
+    """
+    header, steps = read_trace(path)
+    if net is None:
+        _, net, _, _ = load_snakes_net(header["file_path"], **header["load_options"])
+    entries = []
+    rng_state = None
+    for _, transition_name, items, state in steps:
+        entries.append((transition_name, items))
+        if state is not None:
+            rng_state = state
+    for _ in replay(net, entries):
+        pass
+    return net, rng_state
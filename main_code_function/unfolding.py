@@ -0,0 +1,369 @@
+"""
+Unfolding of nets with finite color sets into place/transition nets.
+
+Every (place, color) pair becomes a P/T place and every (transition, binding) pair
+whose guard holds becomes a P/T transition. A marking is then an integer NumPy vector,
+and the pre/post/incidence matrices are stored row-wise in compressed sparse (CSR)
+form, one row per P/T transition. Enabling and firing are array operations, which
+also work on a whole batch of markings at once (one row per marking).
+
+Finite color sets are unit, bool, enum, "int with a..b" and products/aliases of
+finite color sets. Any other color set can be made finite by passing its values
+in domains, e.g. {"NO": range(1, 8)}.
+
+Usage (from the repository root):
+    python -m main_code_function.unfolding CPN_models/1/2-1DeterministicProtocol.cpn \\
+        --domain "NO=1..7" --domain 'DATA=["COL ","OUR","ED ","PET","RI ","NET"]' --explore
+"""
+import argparse
+import itertools
+import re
+import time
+
+import numpy as np
+from snakes.data import Substitution
+
+from main_code_function.ml_expressions import evaluate_constant, parse_ml
+from main_code_function.model_cache import load_snakes_net
+from main_code_function.snakes_engine_main import (
+    create_variables, multiset_counts, normalize_subtype_contents, transition_priority
+)
+
+INT_RANGE = re.compile(r"\bwith\s+(~?-?\d+)\s*\.\.\s*(~?-?\d+)")
+
+
+def colset_domain(name, colsets, domains=None, resolving=()):
+    """
+    List of all values of a color set, or None if the color set is not finite.
+    colsets maps names to parsed colsets; domains gives values for other color sets.
+    """
+    if domains and name in domains:
+        return list(domains[name])
+    colset = colsets.get(name)
+    if colset is None or name in resolving:
+        return None
+    subtype = colset["subtype"]
+    contents = normalize_subtype_contents(colset.get("subtype_contents"))
+    if subtype == "unit":
+        return [()]
+    if subtype == "bool":
+        return [False, True]
+    if subtype == "enum" and colset.get("subtype_contents"):
+        return list(contents)
+    if subtype == "int":
+        match = INT_RANGE.search(colset.get("layout") or "")
+        if match:
+            low, high = (int(bound.replace("~", "-")) for bound in match.groups())
+            return list(range(low, high + 1))
+        return None
+    if subtype == "alias" and colset.get("subtype_contents"):
+        return colset_domain(contents[0], colsets, domains, resolving + (name,))
+    if subtype == "product" and colset.get("subtype_contents"):
+        components = [colset_domain(component, colsets, domains, resolving + (name,)) for component in contents]
+        if any(component is None for component in components):
+            return None
+        return list(itertools.product(*components))
+    return None
+
+
+def parse_domain(text):
+    """
+    Parses a command-line domain "NAME=VALUES", VALUES being "low..high" or an ML list.
+    """
+    name, _, values = text.partition("=")
+    match = re.fullmatch(r"\s*(-?\d+)\s*\.\.\s*(-?\d+)\s*", values)
+    if match:
+        return name.strip(), range(int(match.group(1)), int(match.group(2)) + 1)
+    return name.strip(), list(evaluate_constant(parse_ml(values)))
+
+
+class CSRMatrix:
+    """
+    Minimal row-compressed sparse integer matrix: the entries of row i are
+    data[indptr[i]:indptr[i + 1]] in the columns indices[indptr[i]:indptr[i + 1]].
+    """
+
+    def __init__(self, rows, shape):
+        indptr = [0]
+        indices = []
+        data = []
+        for row in rows:
+            for column, value in sorted(row.items()):
+                if value:
+                    indices.append(column)
+                    data.append(value)
+            indptr.append(len(indices))
+        self.shape = shape
+        self.indptr = np.array(indptr, dtype=np.int64)
+        self.indices = np.array(indices, dtype=np.int64)
+        self.data = np.array(data, dtype=np.int64)
+        self.lengths = np.diff(self.indptr)
+        self.entry_rows = np.repeat(np.arange(shape[0]), self.lengths)
+
+    @property
+    def nnz(self):
+        return len(self.data)
+
+    def toarray(self):
+        dense = np.zeros(self.shape, dtype=np.int64)
+        dense[self.entry_rows, self.indices] = self.data
+        return dense
+
+    def gather(self, rows):
+        """
+        Entries of the given rows: (position in rows, column, value) arrays.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        lengths = self.lengths[rows]
+        positions = np.repeat(np.arange(len(rows)), lengths)
+        starts = np.repeat(self.indptr[rows] - np.cumsum(lengths) + lengths, lengths)
+        entries = starts + np.arange(int(lengths.sum()))
+        return positions, self.indices[entries], self.data[entries]
+
+
+class PTNet:
+    """
+    Result of unfold(). places[i] is the (place name, color) of marking component i,
+    transitions[j] the (transition name, binding items) of P/T transition j.
+    """
+
+    dropped = ()
+
+    def __init__(self, places, transitions, priorities, pre, post, initial):
+        self.places = places
+        self.transitions = transitions
+        self.place_index = {place: index for index, place in enumerate(places)}
+        self.priorities = np.array(priorities, dtype=np.int64)
+        shape = (len(transitions), len(places))
+        self.pre = CSRMatrix(pre, shape)
+        self.post = CSRMatrix(post, shape)
+        self.incidence = CSRMatrix(
+            [{place: row_post.get(place, 0) - row_pre.get(place, 0) for place in set(row_pre) | set(row_post)}
+             for row_pre, row_post in zip(pre, post)], shape)
+        self.initial = np.array(initial, dtype=np.int64)
+
+    @property
+    def num_places(self):
+        return len(self.places)
+
+    @property
+    def num_transitions(self):
+        return len(self.transitions)
+
+    def enabled(self, markings):
+        """
+        Boolean mask of the enabled P/T transitions, for one marking (shape (P,)) or a
+        batch (shape (B, P)). Only the highest enabled priority level is kept.
+        """
+        markings = np.asarray(markings)
+        single = markings.ndim == 1
+        markings = np.atleast_2d(markings)
+        pre = self.pre
+        # Unsatisfied input entries, plus a zero column so that every row start is a valid index
+        missing = np.zeros((len(markings), pre.nnz + 1), dtype=np.int64)
+        missing[:, :pre.nnz] = markings[:, pre.indices] < pre.data
+        blocked = np.add.reduceat(missing, pre.indptr[:-1], axis=1)
+        blocked[:, pre.lengths == 0] = 0  # reduceat returns the entry itself for empty rows
+        enabled = blocked == 0
+
+        if len(np.unique(self.priorities)) > 1:
+            levels = np.where(enabled, self.priorities, np.iinfo(np.int64).max)
+            enabled &= self.priorities == levels.min(axis=1, keepdims=True)
+        return enabled[0] if single else enabled
+
+    def fire(self, markings, transitions):
+        """
+        Fires transitions[b] in markings[b] in place (one marking and one transition
+        index also work). Enabling is not checked; entries with transition -1 are skipped.
+        """
+        markings = np.asarray(markings)
+        if markings.ndim == 1:
+            positions, columns, values = self.incidence.gather([transitions])
+            np.add.at(markings, columns, values)
+            return markings
+        transitions = np.asarray(transitions)
+        rows = np.flatnonzero(transitions >= 0)
+        positions, columns, values = self.incidence.gather(transitions[rows])
+        np.add.at(markings, (rows[positions], columns), values)
+        return markings
+
+    def simulate(self, runs, max_steps, seed=None):
+        """
+        Advances runs copies of the initial marking by up to max_steps uniformly chosen
+        enabled P/T transitions each, all runs in lockstep.
+        Returns (final markings, steps per run, deadlock flags).
+        """
+        rng = np.random.default_rng(seed)
+        markings = np.tile(self.initial, (runs, 1))
+        steps = np.zeros(runs, dtype=np.int64)
+        dead = np.zeros(runs, dtype=bool)
+        for _ in range(max_steps):
+            enabled = self.enabled(markings)
+            dead |= ~enabled.any(axis=1)
+            if dead.all():
+                break
+            keys = np.where(enabled, rng.random(enabled.shape), -1.0)
+            chosen = np.where(dead, -1, keys.argmax(axis=1))
+            self.fire(markings, chosen)
+            steps += ~dead
+        return markings, steps, dead
+
+    def successors(self, markings):
+        """
+        All successors of a batch of markings: (source row, P/T transition, successor markings).
+        """
+        sources, transitions = np.nonzero(self.enabled(markings))
+        successors = markings[sources].copy()
+        self.fire(successors, transitions)
+        return sources, transitions, successors
+
+    def explore(self, max_states=None, batch_size=4096):
+        """
+        Breadth-first reachability exploration, expanding up to batch_size markings at once.
+        Returns the same statistics as state_space.StateSpace.statistics().
+        """
+        index = {self.initial.tobytes(): 0}
+        frontier = [self.initial]
+        edges = deadlocks = 0
+        limited = False
+        while frontier and not limited:
+            batch = np.array(frontier[:batch_size])
+            frontier = frontier[batch_size:]
+            sources, _, successors = self.successors(batch)
+            deadlocks += len(batch) - len(np.unique(sources))
+            edges += len(successors)
+            for successor in successors:
+                key = successor.tobytes()
+                if key not in index:
+                    index[key] = len(index)
+                    frontier.append(successor)
+                    if max_states is not None and len(index) >= max_states:
+                        limited = True
+                        break
+        return {'states': len(index), 'edges': edges, 'deadlocks': deadlocks, 'complete': not limited}
+
+    def marking_counts(self, marking):
+        """
+        {place name: [(color, count)]} of a marking vector.
+        """
+        result = {}
+        for index in np.flatnonzero(marking):
+            place, color = self.places[index]
+            result.setdefault(place, []).append((color, int(marking[index])))
+        return result
+
+
+def unfold(data, net, domains=None):
+    """
+    Unfolds a net built by create_snakes_net from the parsed model data. Raises
+    ValueError if a place or variable has a color set that is not finite.
+    Bindings producing a token outside the color set of its place (typically at the
+    bound of an int range) are left out and listed in PTNet.dropped as
+    (transition name, binding items, (place name, color)).
+    """
+    colsets = {colset["name"]: colset for colset in data["colsets"]}
+    place_types = {str(place["text"]): place["type"] for place in data["places"]}
+    variable_types = create_variables(data)
+
+    def domain(colset_name, what):
+        values = colset_domain(colset_name, colsets, domains)
+        if values is None:
+            raise ValueError(f"Cannot unfold {what}: color set '{colset_name}' is not finite (pass its values in domains).")
+        return values
+
+    places = []
+    for place in net.place():
+        for color in domain(place_types[place.name], f"place '{place.name}'"):
+            places.append((place.name, color))
+    place_index = {place: index for index, place in enumerate(places)}
+
+    initial = [0] * len(places)
+    for place in net.place():
+        for color, count in multiset_counts(place.tokens):
+            if (place.name, color) not in place_index:
+                raise ValueError(f"Initial token {color!r} of place '{place.name}' is outside its color set.")
+            initial[place_index[place.name, color]] = count
+
+    def flows(arcs, binding):
+        counts = {}
+        for place, label in arcs:
+            for color, count in multiset_counts(label.flow(binding)):
+                key = place_index.get((place.name, color))
+                if key is None:
+                    return None, (place.name, color)
+                counts[key] = counts.get(key, 0) + count
+        return counts, None
+
+    transitions = []
+    priorities = []
+    pre = []
+    post = []
+    dropped = []
+    for transition in net.transition():
+        names = sorted(transition.vars())
+        domains_of_vars = [domain(variable_types.get(name), f"variable '{name}' of '{transition.name}'") for name in names]
+        inputs = list(transition.input())
+        outputs = list(transition.output())
+        for values in itertools.product(*domains_of_vars):
+            binding = Substitution(zip(names, values))
+            if not transition.guard(binding):
+                continue
+            consumed, _ = flows(inputs, binding)
+            if consumed is None:
+                continue  # Needs a token outside the color set, never enabled
+            produced, outside = flows(outputs, binding)
+            if produced is None:
+                dropped.append((transition.name, tuple(binding.items()), outside))
+                continue
+            transitions.append((transition.name, tuple(binding.items())))
+            priorities.append(transition_priority(transition))
+            pre.append(consumed)
+            post.append(produced)
+
+    pt_net = PTNet(places, transitions, priorities, pre, post, initial)
+    pt_net.dropped = dropped
+    return pt_net
+
+
+def unfold_model(file_path, domains=None, **load_options):
+    data, net, _, _ = load_snakes_net(file_path, **load_options)
+    return unfold(data, net, domains)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Unfold a .cpn model with finite color sets into a P/T net.")
+    parser.add_argument('model', help="Path to the .cpn file")
+    parser.add_argument('--domain', action='append', default=[], metavar="COLSET=VALUES",
+                        help="Values of a color set that is not finite, e.g. NO=1..7 or 'DATA=[\"a\",\"b\"]'")
+    parser.add_argument('--remove-names', action='store_true', help="Drop the auxiliary 'Names' place")
+    parser.add_argument('--explore', action='store_true', help="Explore the state space of the unfolded net")
+    parser.add_argument('--max-states', type=int, default=None, help="Stop the exploration after this many states")
+    parser.add_argument('--runs', type=int, default=0, help="Number of random runs simulated as one batch")
+    parser.add_argument('--max-steps', type=int, default=1000, help="Step cap of each run")
+    parser.add_argument('--seed', type=int, default=None, help="Seed of the batch simulation")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    pt_net = unfold_model(args.model, dict(parse_domain(text) for text in args.domain), remove_names=args.remove_names)
+    print(f"{pt_net.num_places} places, {pt_net.num_transitions} transitions, {pt_net.incidence.nnz} incidence entries "
+          f"({time.perf_counter() - started:.2f} s)")
+    if pt_net.dropped:
+        print(f"{len(pt_net.dropped)} bindings left out, they produce tokens outside the color sets, e.g. "
+              f"{pt_net.dropped[0][0]} {dict(pt_net.dropped[0][1])} -> {pt_net.dropped[0][2]}")
+
+    if args.explore:
+        started = time.perf_counter()
+        statistics = pt_net.explore(args.max_states)
+        print(f"{statistics['states']} states, {statistics['edges']} edges, {statistics['deadlocks']} dead markings "
+              f"in {time.perf_counter() - started:.2f} s" + ("" if statistics['complete'] else " (limit reached, incomplete)"))
+    if args.runs:
+        started = time.perf_counter()
+        _, steps, dead = pt_net.simulate(args.runs, args.max_steps, args.seed)
+        seconds = time.perf_counter() - started
+        print(f"{args.runs} runs, {int(steps.sum())} steps in {seconds:.2f} s ({steps.sum() / seconds:.0f} steps/sec), "
+              f"{int(dead.sum())} ended in a deadlock")
+    return pt_net
+
+
+if __name__ == "__main__":
+    main()
@@ -21,14 +21,15 @@ if __name__ == "__main__":
     # Collecting all data into a dictionary
     all_data = collect_all_data(page_block, globbox_block)
 
-    # Data conversion to DataFrame
-    places_df = pd.DataFrame(all_data["places"])  # Place data
-    transitions_df = pd.DataFrame(all_data["transitions"])  # Transition data
-    arcs_df = pd.DataFrame(all_data["arcs"])  # Arc data
-    colsets_df = pd.DataFrame(all_data["colsets"])
-    values_df = pd.DataFrame(all_data["values"])
-    variables_df = pd.DataFrame(all_data["variables"])
-    functions_df = pd.DataFrame(all_data["functions"])
+    # Data conversion to DataFrame (columnar, categorical IDs and types)
+    frames = build_dataframes(all_data)
+    places_df = frames["places"]  # Place data
+    transitions_df = frames["transitions"]  # Transition data
+    arcs_df = frames["arcs"]  # Arc data
+    colsets_df = frames["colsets"]
+    values_df = frames["values"]
+    variables_df = frames["variables"]
+    functions_df = frames["functions"]
 
     # Loading a DataFrame into the console
     pd.set_option('display.max_colwidth', None)
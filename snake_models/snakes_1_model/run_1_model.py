@@ -2,21 +2,19 @@ import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
-from main_code_function.functions_for_parsing import collect_all_data, load_cpn_file, get_page_block, get_globbox_block
-from main_code_function.snakes_engine_main import create_snakes_net, create_colset_functions
+from main_code_function.model_cache import load_snakes_net
+from main_code_function.simulator import Simulator
+from main_code_function.snapshots import render_in_subprocess
+from main_code_function.trace_format import TraceWriter
 
 
 
 file_path = 'CPN_models\\1\\2-1DeterministicProtocol.cpn'
 
-root = load_cpn_file(file_path)
-page_block = get_page_block(root)
-globbox_block = get_globbox_block(root)
-data = collect_all_data(page_block, globbox_block)
+# Parsed and converted model is reused from the cache when the file has not changed
+data, net, places_info, variables = load_snakes_net(file_path)
 
 print("Declarations and data successfully loaded.")
-colset_functions = create_colset_functions(data["colsets"])
-net, places_info, variables = create_snakes_net(data, colset_functions)
 
 print("\nPetri Net Description:")
 print(net)
@@ -49,6 +47,10 @@ for transition in net.transition():
         print(f"Output Arc: {transition.name} -> {place.name}, Label: {arc_label}")
 
 print("\nStarting simulation loop...")
+# Every firing is streamed to a binary trace
+trace_path = "snake_models/snakes_1_model/run.trace"
+trace_writer = TraceWriter(trace_path, file_path)
+simulator = Simulator(net, trace_writer=trace_writer)  # modes are recomputed only for transitions next to changed places
 
 max_steps = 30  # let's restrict it in order not to get into an infinite loop
 step = 0
@@ -57,20 +59,14 @@ while step < max_steps:
     progress = False
     print(f"\n--- Step {step + 1} ---")
 
-    for transition in net.transition():
-        modes = transition.modes()
+    for transition in simulator.transitions:
+        modes = simulator.modes(transition)
         if modes:
             print(f"Transition '{transition.name}' can fire with {len(modes)} possible bindings.")
             binding = modes[0]  # take the first available binding
             print(f"Firing '{transition.name}' with binding: {binding}")
-            transition.fire(binding)
+            simulator.fire(transition, binding)
             progress = True
-
-            # Saving the picture after firing
-            output_path = f"snake_models/snakes_1_model/img/step_{step + 1}_{transition.name}.png"
-            print(f"Saving snapshot to {output_path}")
-            net.draw(output_path, engine="dot")
-
             break  # one firing per step
 
     if not progress:
@@ -84,3 +80,8 @@ for place in net.place():
     print(f"Place: {place.name}, Tokens: {list(place.tokens)}")
 
 net.draw("snake_models/snakes_1_model/ex2.png", engine="dot")
+
+# Step snapshots are rendered from the recorded trace after the simulation, in parallel
+trace_writer.close()
+print(f"Rendering step snapshots from {trace_path}...")
+render_in_subprocess(trace_path, "snake_models/snakes_1_model/img/step_{step}_{transition}.svg", fixed_layout=True)
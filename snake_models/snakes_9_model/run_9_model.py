@@ -7,26 +7,21 @@ import shutil
 # Add the parent directory to the module search path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
-from main_code_function.functions_for_parsing import collect_all_data, load_cpn_file, get_page_block, get_globbox_block
-from main_code_function.snakes_engine_main import create_snakes_net, create_colset_functions
-
-# --- Logger setup: output to console and write to file ---
+from main_code_function.event_log import start_log_writer
+from main_code_function.model_cache import load_snakes_net
+from main_code_function.simulator import Simulator
+from main_code_function.snapshots import render_in_subprocess
+from main_code_function.trace_format import TraceWriter
+
+# --- Logger setup: log file (overwritten on each run) and console ---
+# Records are formatted and written by a background thread in batches.
+# --verbose also logs the full net description, --quiet turns off the console echo.
 logger = logging.getLogger("simulation")
-logger.setLevel(logging.INFO)
-formatter = logging.Formatter('%(asctime)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
-
-# Log file for the model (overwritten on each run)
+logger.setLevel(logging.DEBUG if "--verbose" in sys.argv else logging.INFO)
 log_folder = os.path.join("snake_models/snakes_9_model")
 if not os.path.exists(log_folder):
     os.makedirs(log_folder)
-file_handler = logging.FileHandler(os.path.join(log_folder, "simulation_log.txt"), mode='w', encoding='utf-8')
-file_handler.setFormatter(formatter)
-logger.addHandler(file_handler)
-
-# Console output
-stream_handler = logging.StreamHandler()
-stream_handler.setFormatter(formatter)
-logger.addHandler(stream_handler)
+log_writer = start_log_writer(logger, os.path.join(log_folder, "simulation_log.txt"), console="--quiet" not in sys.argv)
 
 # --- Clearing the image folder ---
 img_folder = os.path.join("snake_models/snakes_9_model", "img")
@@ -36,78 +31,80 @@ os.makedirs(img_folder)
 
 # --- Loading and parsing the model ---
 file_path = 'CPN_models\\9\\RecoraList.cpn'
-root = load_cpn_file(file_path)
-page_block = get_page_block(root)
-globbox_block = get_globbox_block(root)
-data = collect_all_data(page_block, globbox_block)
+# Parsed and converted model is reused from the cache when the file has not changed
+# Specific requirements for this model: remove the “Names” location (and the arcs associated with it)
+data, net, places_info, variables = load_snakes_net(file_path, remove_names=True)
 
 logger.info("Declarations and data successfully loaded.")
-colset_functions = create_colset_functions(data["colsets"])
-
-# Specific requirements for this model: remove the “Names” location (and the arcs associated with it)
-net, places_info, variables = create_snakes_net(data, colset_functions, remove_names=True)
 
-logger.info("\nPetri Net Description:")
-logger.info(f"{net}")
+# The net description is only built and logged at the DEBUG level (--verbose)
+if logger.isEnabledFor(logging.DEBUG):
+    logger.debug("\nPetri Net Description:")
+    logger.debug("%s", net)
 
-logger.info("\nPlaces and their tokens:")
-for place_name, tokens, place_type in places_info:
-    logger.info(f"Place: {place_name}, Tokens: {list(tokens)}, CheckType: {place_type}")
+    logger.debug("\nPlaces and their tokens:")
+    for place_name, tokens, place_type in places_info:
+        logger.debug("Place: %s, Tokens: %s, CheckType: %s", place_name, list(tokens), place_type)
 
-logger.info("\nVariables:")
-for var_name, var_type in variables.items():
-    logger.info(f"Variable: {var_name}, Type: {var_type}")
+    logger.debug("\nVariables:")
+    for var_name, var_type in variables.items():
+        logger.debug("Variable: %s, Type: %s", var_name, var_type)
 
 net.draw("snake_models/snakes_9_model/ex1.png", engine="dot")
 
-logger.info("\n=== Full Petri Net Description ===")
-logger.info("\nPlaces:")
-for place in net.place():
-    logger.info(f"Place: {place.name}, Tokens: {list(place.tokens)}, Check: {place.check.__name__}")
-logger.info("\nTransitions:")
-for transition in net.transition():
-    logger.info(f"Transition: {transition.name}, Guard: {transition.guard}")
-logger.info("\nArcs:")
-for transition in net.transition():
-    for place, arc_label in transition.input():
-        logger.info(f"Input Arc: {place.name} -> {transition.name}, Label: {arc_label}")
-    for place, arc_label in transition.output():
-        logger.info(f"Output Arc: {transition.name} -> {place.name}, Label: {arc_label}")
+if logger.isEnabledFor(logging.DEBUG):
+    logger.debug("\n=== Full Petri Net Description ===")
+    logger.debug("\nPlaces:")
+    for place in net.place():
+        logger.debug("Place: %s, Tokens: %s, Check: %s", place.name, list(place.tokens), place.check.__name__)
+    logger.debug("\nTransitions:")
+    for transition in net.transition():
+        logger.debug("Transition: %s, Guard: %s", transition.name, transition.guard)
+    logger.debug("\nArcs:")
+    for transition in net.transition():
+        for place, arc_label in transition.input():
+            logger.debug("Input Arc: %s -> %s, Label: %s", place.name, transition.name, arc_label)
+        for place, arc_label in transition.output():
+            logger.debug("Output Arc: %s -> %s, Label: %s", transition.name, place.name, arc_label)
 
 # --- Select simulation mode ---
 mode = ""
 while mode not in ("a", "m"):
+    log_writer.flush()  # The console shows everything logged so far before the prompt
     mode = input("Select the simulation mode: (a) automatic, (m) manual: ").strip().lower()
 
-logger.info(f"Selected simulation mode: {'Automatic' if mode=='a' else 'Manual'}")
+logger.info("Selected simulation mode: %s", 'Automatic' if mode=='a' else 'Manual')
 
 # --- Simulation loop ---
 logger.info("\nStarting simulation loop...")
 max_steps = 30
 step = 0
+# Every firing is streamed to a binary trace, with the RNG state every 100 steps
+trace_path = "snake_models/snakes_9_model/run.trace"
+trace_writer = TraceWriter(trace_path, file_path, {"remove_names": True}, rng_state_every=100)
+simulator = Simulator(net, random, trace_writer=trace_writer, logger=logger)  # modes are recomputed only for transitions next to changed places
 
 while step < max_steps:
-    logger.info(f"\n--- Step {step + 1} ---")
-    available = []
-    for transition in net.transition():
-        modes = transition.modes()
-        if modes:
-            for mode_binding in modes:
-                available.append((transition, mode_binding))
-    if not available:
-        logger.info("No more transitions can fire.")
-        break
-
+    logger.info("\n--- Step %d ---", step + 1)
     # Selects the transition depending on the mode
     if mode == "a":
-        chosen = random.choice(available)
+        # Random pair, drawn without listing all of them
+        chosen = simulator.choose()
+        if chosen is None:
+            logger.info("No more transitions can fire.")
+            break
     else:
+        available = simulator.available()
+        if not available:
+            logger.info("No more transitions can fire.")
+            break
         logger.info("Available transitions:")
         for idx, (tr, binding) in enumerate(available):
-            logger.info(f"{idx}: {tr.name} with binding {binding}")
+            logger.info("%s: %s with binding %s", idx, tr.name, binding)
         valid_input = False
         while not valid_input:
             try:
+                log_writer.flush()
                 idx_choice = int(input("Enter the number of the selected transition: "))
                 if 0 <= idx_choice < len(available):
                     valid_input = True
@@ -119,15 +116,17 @@ while step < max_steps:
 
     transition, binding = chosen
 
-    logger.info(f"Selected transition '{transition.name}' with binding: {binding}")
     # Запускаем переход
-    transition.fire(binding)
-    output_path = f"snake_models/snakes_9_model/img/step_{step + 1}_{transition.name}.png"
-    logger.info(f"Saving snapshot to {output_path}")
-    net.draw(output_path, engine="dot")
+    simulator.fire(transition, binding)
     step += 1
 
 logger.info("\nFinal state of places:")
 for place in net.place():
-    logger.info(f"Place: {place.name}, Tokens: {list(place.tokens)}")
+    logger.info("Place: %s, Tokens: %s", place.name, list(place.tokens))
 net.draw("snake_models/snakes_9_model/ex2.png", engine="dot")
+
+# Step snapshots are rendered from the recorded trace after the simulation, in parallel
+trace_writer.close()
+logger.info("Rendering step snapshots from %s...", trace_path)
+render_in_subprocess(trace_path, "snake_models/snakes_9_model/img/step_{step}_{transition}.svg", fixed_layout=True)
+log_writer.stop()
@@ -2,21 +2,16 @@ import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
-from main_code_function.functions_for_parsing import collect_all_data, load_cpn_file, get_page_block, get_globbox_block
-from main_code_function.snakes_engine_main import create_snakes_net, create_colset_functions
+from main_code_function.model_cache import load_snakes_net
 
 
 
 file_path = 'parsing_models/parsing_AB_model/model_AB.cpn'
 
-root = load_cpn_file(file_path)
-page_block = get_page_block(root)
-globbox_block = get_globbox_block(root)
-data = collect_all_data(page_block, globbox_block)
+# Parsed and converted model is reused from the cache when the file has not changed
+data, net, places_info, variables = load_snakes_net(file_path)
 
 print("Declarations and data successfully loaded.")
-colset_functions = create_colset_functions(data["colsets"])
-net, places_info, variables = create_snakes_net(data, colset_functions)
 
 print("\nPetri Net Description:")
 print(net)
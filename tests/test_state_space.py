@@ -0,0 +1,67 @@
+"""
+Cross-checks of the state-space engines: explore() on the SNAKES net must find the
+same states, edges and dead markings as the unfolded P/T net, and the parallel
+explorer the same as explore().
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import pytest
+
+from main_code_function.model_cache import ModelCache, load_snakes_net
+from main_code_function.model_generator import generate
+from main_code_function.parallel_state_space import explore_parallel
+from main_code_function.state_space import MarkingCodec, explore
+from main_code_function.unfolding import unfold
+
+AB_MODEL = "snake_models/snakes_AB_model/model_AB.cpn"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ModelCache(str(tmp_path / "cache"))
+
+
+def philosophers(tmp_path, size):
+    path = str(tmp_path / f"philosophers_{size}.cpn")
+    generate("philosophers", size, path)
+    return path
+
+
+def explore_both(path, cache):
+    data, net, _, _ = load_snakes_net(path, cache=cache)
+    pt_net = unfold(data, net)
+    return explore(net).statistics(), pt_net.explore()
+
+
+def test_ab_model_matches_unfolding(cache):
+    statistics, unfolded = explore_both(AB_MODEL, cache)
+    assert statistics == unfolded
+    assert statistics["edges"] == 1
+
+
+@pytest.mark.parametrize("size", [3, 4, 5])
+def test_philosophers_match_unfolding(tmp_path, cache, size):
+    statistics, unfolded = explore_both(philosophers(tmp_path, size), cache)
+    assert statistics == unfolded
+    assert statistics["complete"]
+
+
+def test_parallel_matches_sequential(tmp_path, cache):
+    path = philosophers(tmp_path, 5)
+    _, net, _, _ = load_snakes_net(path, cache=cache)
+    expected = explore(net).statistics()
+    statistics = explore_parallel(path, workers=2)
+    assert {key: statistics[key] for key in expected} == expected
+
+
+def test_equal_values_of_different_types_do_not_collide():
+    class EmptyNet:
+        def place(self):
+            return []
+
+    codec = MarkingCodec(EmptyNet())
+    assert codec.encode_value((1,)) != codec.encode_value((True,))
+    assert codec.encode_value(frozenset([(1,)])) != codec.encode_value(frozenset([(1.0,)]))
+    [value] = list(codec.decode_tokens(codec.encode_tokens({(True,): 1})))
+    assert type(value[0]) is bool